@@ -0,0 +1,202 @@
+import asyncio
+import glob
+import hashlib
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pandas as pd
+
+from text2sql_rag_model.model_deployment.registry_cache import registry
+
+
+OUTPUT_COLUMNS = ["id", "question", "generated_sql", "prompt_tokens", "latency_s"]
+
+
+def question_id(question):
+    """Stable id of a question, used to skip questions already answered by a previous run."""
+    return hashlib.sha1(question.encode("utf-8")).hexdigest()
+
+
+def partition_of(row_id, num_partitions):
+    """Partition of a row, stable across runs so that a rerun finds each partition's checkpoint."""
+    return int(hashlib.sha1(str(row_id).encode("utf-8")).hexdigest(), 16) % num_partitions
+
+
+def prepare_questions(df, question_column="question", id_column=None):
+    """
+    Normalize an input table to `id` and `question` columns, deriving ids from the question text if
+    `id_column` isn't given. Duplicate ids are answered once.
+    """
+    ids = df[id_column].astype(str) if id_column else df[question_column].map(question_id)
+    questions = pd.DataFrame({"id": ids.values, "question": df[question_column].values})
+    return questions.drop_duplicates("id").reset_index(drop=True)
+
+
+def completed_ids(output_dir):
+    """Ids of the questions answered in the Parquet files written to output_dir by previous runs."""
+    files = glob.glob(os.path.join(output_dir, "**", "*.parquet"), recursive=True)
+    if not files:
+        return set()
+    return set(pd.concat(pd.read_parquet(f, columns=["id"]) for f in files)["id"])
+
+
+def read_results(output_dir):
+    """All answers written to output_dir, one row per question."""
+    files = glob.glob(os.path.join(output_dir, "**", "*.parquet"), recursive=True)
+    if not files:
+        return pd.DataFrame(columns=OUTPUT_COLUMNS)
+    return pd.concat(pd.read_parquet(f) for f in files).drop_duplicates("id").reset_index(drop=True)
+
+
+def _write_chunk(rows, output_dir, partition):
+    partition_dir = os.path.join(output_dir, f"partition={partition}")
+    os.makedirs(partition_dir, exist_ok=True)
+    path = os.path.join(partition_dir, f"part-{uuid.uuid4().hex}.parquet")
+    # write then rename, a killed run never leaves a partial file behind
+    pd.DataFrame(rows, columns=OUTPUT_COLUMNS).to_parquet(f"{path}.tmp", index=False)
+    os.replace(f"{path}.tmp", path)
+
+
+async def _predict_partition(predict_fn, questions, output_dir, partition, concurrency, flush_every):
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+    pending_rows = []
+    errors = []
+
+    async def answer(row_id, question):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                generated_sql, prompt_tokens = await loop.run_in_executor(None, predict_fn, question)
+            except Exception as e:
+                errors.append({"id": row_id, "question": question, "error": str(e)})
+                return
+            pending_rows.append(
+                {
+                    "id": row_id,
+                    "question": question,
+                    "generated_sql": generated_sql,
+                    "prompt_tokens": prompt_tokens,
+                    "latency_s": time.perf_counter() - start,
+                }
+            )
+            # single event loop thread, no lock needed around the buffer
+            if len(pending_rows) >= flush_every:
+                rows = pending_rows[:]
+                pending_rows.clear()
+                await loop.run_in_executor(None, _write_chunk, rows, output_dir, partition)
+
+    await asyncio.gather(*(answer(row_id, question) for row_id, question in questions))
+    if pending_rows:
+        await loop.run_in_executor(None, _write_chunk, pending_rows, output_dir, partition)
+    return errors
+
+
+def run_partition(predict_fn, questions, output_dir, partition, concurrency=16, flush_every=100):
+    """
+    Answer the questions of one partition with up to `concurrency` questions in flight, checkpointing every
+    `flush_every` answers to a new Parquet file under output_dir/partition=<partition>.
+
+    Args:
+        predict_fn (callable): question -> (generated_sql, prompt_tokens), see `evaluation.make_predict_fn`
+        questions (list): (id, question) tuples not answered yet
+        output_dir (str): directory of the Parquet answers, e.g. on a UC Volume when run on executors
+        partition (int): partition number
+        concurrency (int): questions in flight, bounded by what the serving endpoints absorb
+        flush_every (int): answers per checkpoint file
+
+    Returns:
+        dict: partition, number of answers written and the questions that failed (retried on the next run)
+    """
+    with ThreadPoolExecutor(max_workers=concurrency + 1) as executor:
+        loop = asyncio.new_event_loop()
+        loop.set_default_executor(executor)
+        try:
+            errors = loop.run_until_complete(
+                _predict_partition(predict_fn, questions, output_dir, partition, concurrency, flush_every)
+            )
+        finally:
+            loop.close()
+    return {"partition": partition, "answered": len(questions) - len(errors), "errors": errors}
+
+
+def pending_partitions(questions, output_dir, num_partitions):
+    """
+    Split the questions not answered yet into partitions.
+
+    Returns:
+        dict: {partition: [(id, question), ...]} for non-empty partitions
+    """
+    done = completed_ids(output_dir)
+    partitions = {}
+    for row_id, question in zip(questions["id"], questions["question"]):
+        if row_id not in done:
+            partitions.setdefault(partition_of(row_id, num_partitions), []).append((row_id, question))
+    return partitions
+
+
+def pin_model_version(model_uri, checkpoint_dir, registry_cache=None):
+    """
+    Resolve an alias (or latest) model URI once, for the whole run, and key the checkpoints by the version.
+
+    Checkpoints only record which questions were answered, not by which model: a run after the alias moved must
+    not skip the questions answered by the previous version, nor mix the answers of both versions.
+
+    Returns:
+        tuple: (models:/<name>/<version> URI, <checkpoint_dir>/<name>-v<version> directory)
+    """
+    name, version = (registry_cache or registry()).resolve(model_uri)
+    if version is None:
+        raise ValueError(f"{model_uri} has no registered version")
+    return f"models:/{name}/{version}", os.path.join(checkpoint_dir, f"{name}-v{version}")
+
+
+def pyfunc_predict_fn(model_uri):
+    """
+    Predict function of a logged text2sqlrag model, a `predict_fn_factory` when bound with functools.partial.
+
+    Workers on the same machine load the model from the local artifact cache, only the first one downloads it.
+    """
+    # imported here so that the workers only load mlflow when they run the model
+    from text2sql_rag_model.model_deployment.artifact_cache import load_model
+    from text2sql_rag_model.validation.evaluation import make_predict_fn
+
+    return make_predict_fn(load_model(model_uri))
+
+
+def load_and_run_partition(predict_fn_factory, questions, output_dir, partition, concurrency=16, flush_every=100):
+    """`run_partition` in a worker (process or Spark task) that loads its own model."""
+    return run_partition(predict_fn_factory(), questions, output_dir, partition, concurrency, flush_every)
+
+
+def run_batch_inference(
+    predict_fn_factory, questions, output_dir, num_partitions=8, num_workers=4, concurrency=16, flush_every=100
+):
+    """
+    Answer every question not answered by a previous run, `num_workers` partitions at a time in separate processes.
+
+    Args:
+        predict_fn_factory (callable): picklable function called once per worker returning a predict function,
+            e.g. loading the model with `mlflow.pyfunc.load_model`
+        questions (pd.DataFrame): `id` and `question` columns, see `prepare_questions`
+        output_dir (str): directory of the Parquet answers
+        num_partitions (int): number of partitions the questions are split into
+        num_workers (int): partitions processed in parallel
+        concurrency (int): questions in flight per partition
+        flush_every (int): answers per checkpoint file
+
+    Returns:
+        list: per partition summaries, see `run_partition`
+    """
+    partitions = pending_partitions(questions, output_dir, num_partitions)
+    print(f"{sum(len(p) for p in partitions.values())} of {len(questions)} questions left to answer")
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        futures = [
+            executor.submit(
+                load_and_run_partition, predict_fn_factory, rows, output_dir, partition, concurrency, flush_every
+            )
+            for partition, rows in sorted(partitions.items())
+        ]
+        return [future.result() for future in futures]
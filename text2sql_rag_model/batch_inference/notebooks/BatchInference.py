@@ -0,0 +1,83 @@
+# Databricks notebook source
+##################################################################################
+# Batch Inference Notebook
+#
+# Answers a table of natural language questions with the text2sqlrag model. Questions are split into
+# partitions processed in parallel on the cluster's workers, each loading the model once and keeping
+# `concurrency` questions in flight. The model alias is resolved once and answers are checkpointed to
+# Parquet files of that model version as they arrive, so a rerun after a failure only answers the remaining
+# questions, while a run after the alias moved answers every question again with the new version. Throughput scales with the number of workers until
+# the serving endpoints the model calls saturate.
+#
+# Parameters:
+# * input_table_name   - Delta table, or path of a Parquet dataset, with the questions.
+# * question_column    - Column of the questions.
+# * id_column          - Optional column identifying each question, the question text is hashed if empty.
+# * model_uri          - Model to answer the questions with, an alias is resolved to its current version.
+# * checkpoint_dir     - Directory of the Parquet answers, on a UC Volume so that workers can write to it. Each
+#                        model version checkpoints to its own <model name>-v<version> subdirectory.
+# * output_table_name  - Delta table the answers are written to once every question is answered.
+# * num_partitions     - Number of partitions, at least the number of worker cores.
+# * concurrency        - Questions in flight per partition.
+##################################################################################
+
+# COMMAND ----------
+
+dbutils.widgets.text("input_table_name", "asong_dev.llms.text2sql_batch_questions", label="Input Table Name")
+dbutils.widgets.text("question_column", "question", label="Question Column")
+dbutils.widgets.text("id_column", "", label="Id Column")
+dbutils.widgets.text("model_uri", "models:/asong_dev.llms.text2sqlrag@Champion", label="Model URI")
+dbutils.widgets.text("checkpoint_dir", "/Volumes/asong_dev/llms/batch_inference/text2sqlrag", label="Checkpoint Dir")
+dbutils.widgets.text("output_table_name", "asong_dev.llms.text2sql_batch_answers", label="Output Table Name")
+dbutils.widgets.text("num_partitions", "16", label="Number of Partitions")
+dbutils.widgets.text("concurrency", "8", label="Concurrency per Partition")
+
+# COMMAND ----------
+
+import sys
+import os
+from functools import partial
+
+sys.path.append(os.path.abspath('../..'))
+from text2sql_rag_model.batch_inference.batch_inference import (
+    load_and_run_partition,
+    pending_partitions,
+    pin_model_version,
+    prepare_questions,
+    pyfunc_predict_fn,
+    read_results,
+)
+
+input_table_name = dbutils.widgets.get("input_table_name")
+question_column = dbutils.widgets.get("question_column")
+id_column = dbutils.widgets.get("id_column") or None
+model_uri, checkpoint_dir = pin_model_version(dbutils.widgets.get("model_uri"), dbutils.widgets.get("checkpoint_dir"))
+print(f"Answering with {model_uri}, checkpoints in {checkpoint_dir}")
+output_table_name = dbutils.widgets.get("output_table_name")
+num_partitions = int(dbutils.widgets.get("num_partitions"))
+concurrency = int(dbutils.widgets.get("concurrency"))
+
+reader = spark.read.parquet if input_table_name.startswith("/") else spark.table
+columns = [question_column] + ([id_column] if id_column else [])
+questions = prepare_questions(reader(input_table_name).select(*columns).toPandas(), question_column, id_column)
+
+partitions = pending_partitions(questions, checkpoint_dir, num_partitions)
+print(f"{sum(len(p) for p in partitions.values())} of {len(questions)} questions left to answer")
+
+# COMMAND ----------
+
+if partitions:
+    predict_fn_factory = partial(pyfunc_predict_fn, model_uri)
+    summaries = (
+        spark.sparkContext.parallelize(sorted(partitions.items()), len(partitions))
+        .map(lambda item: load_and_run_partition(predict_fn_factory, item[1], checkpoint_dir, item[0], concurrency))
+        .collect()
+    )
+    errors = [error for summary in summaries for error in summary["errors"]]
+    print(f"Answered {sum(s['answered'] for s in summaries)} questions, {len(errors)} failed")
+    if errors:
+        raise Exception(f"{len(errors)} questions failed, rerun to retry them. First error: {errors[0]}")
+
+# COMMAND ----------
+
+spark.createDataFrame(read_results(checkpoint_dir)).write.mode("overwrite").saveAsTable(output_table_name)
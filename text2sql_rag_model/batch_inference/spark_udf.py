@@ -0,0 +1,138 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator
+
+import pandas as pd
+
+from text2sql_rag_model.validation.evaluation import endpoint_pool_size, make_predict_fn
+
+
+UDF_RESULT_TYPE = "generated_sql string, prompt_tokens long, error string"
+
+# models loaded by this Python worker, reused by every task and batch it runs (Spark reuses Python workers)
+_EXECUTOR_MODELS = {}
+_EXECUTOR_MODELS_LOCK = threading.Lock()
+
+
+class RetrievalCache:
+    """
+    Thread-safe LRU cache in front of a retrieval function of one question, with hit/miss counters.
+
+    Installed on the model of an executor, it is shared by every batch the executor scores. Further arguments are
+    passed through and part of the key, by their version if they have one: results retrieved from a schema
+    snapshot are not served once a newer snapshot is swapped in.
+    """
+
+    def __init__(self, fn, maxsize=10_000):
+        self.fn = fn
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def __call__(self, question, *args):
+        key = (question,) + tuple(getattr(arg, "version", arg) for arg in args)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return self._entries[key]
+            self.stats["misses"] += 1
+        # retrieve outside the lock, concurrent misses for the same question may both retrieve
+        value = self.fn(question, *args)
+        with self._lock:
+            self._entries[key] = value
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+
+def max_in_flight_per_task(workload_size="Small", num_endpoints=1, num_tasks=1):
+    """
+    Questions each concurrently running Spark task keeps in flight, so that the whole cluster saturates the
+    serving endpoints without exceeding their concurrency, see `evaluation.endpoint_pool_size`.
+    """
+    return max(endpoint_pool_size(workload_size, num_endpoints) // num_tasks, 1)
+
+
+def executor_predict_fn(model_uri, retrieval_cache_size=10_000, load_model=None):
+    """
+    Predict function of the model, loaded once per Python worker and kept for every later task and batch.
+
+    The text2sqlrag model's retrieval (schema search and exemplar lookup) is wrapped in a `RetrievalCache`
+    shared by every batch of the worker.
+
+    Args:
+        model_uri (str): model to load
+        retrieval_cache_size (int): questions whose retrieval results are kept, 0 disables the cache
+        load_model (callable, optional): model_uri -> pyfunc model, defaults to `artifact_cache.load_model` so
+            that the Python workers of an executor download the model once
+
+    Returns:
+        callable: question -> (generated_sql, prompt_tokens)
+    """
+    with _EXECUTOR_MODELS_LOCK:
+        if model_uri not in _EXECUTOR_MODELS:
+            if load_model is None:
+                # imported here so that the module can be imported where mlflow isn't installed
+                from text2sql_rag_model.model_deployment import artifact_cache
+
+                load_model = artifact_cache.load_model
+            model = load_model(model_uri)
+            python_model = model.unwrap_python_model() if hasattr(model, "unwrap_python_model") else model
+            if retrieval_cache_size and hasattr(python_model, "_retrieve_context"):
+                python_model._retrieve_context = RetrievalCache(python_model._retrieve_context, retrieval_cache_size)
+            _EXECUTOR_MODELS[model_uri] = make_predict_fn(model)
+        return _EXECUTOR_MODELS[model_uri]
+
+
+def predict_batch(predict_fn, questions, max_in_flight=8):
+    """
+    Answer a batch of questions with up to max_in_flight in flight. A failing question gets an error instead of
+    failing the Spark task, so that one bad question doesn't retry the whole partition.
+
+    Returns:
+        pd.DataFrame: generated_sql, prompt_tokens and error columns, in input order
+    """
+
+    def safe_predict(question):
+        try:
+            generated_sql, prompt_tokens = predict_fn(question)
+            return generated_sql, int(prompt_tokens), None
+        except Exception as e:
+            return None, 0, str(e)
+
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        outputs = list(executor.map(safe_predict, questions))
+    return pd.DataFrame(outputs, columns=["generated_sql", "prompt_tokens", "error"])
+
+
+def text_to_sql_udf(model_uri, max_in_flight=8, retrieval_cache_size=10_000, load_model=None):
+    """
+    Iterator of batches pandas UDF answering a column of questions, e.g.
+    `df.withColumn("answer", text_to_sql_udf(uri)("question"))`.
+
+    Drop-in for `mlflow.pyfunc.spark_udf(spark, model_uri, result_type=...)`: it's called the same way on the
+    question column, but the model is loaded once per Python worker instead of once per task, retrieval results
+    are cached across batches, and questions of a batch are answered concurrently. Results stream back one
+    Arrow batch at a time, so set `spark.sql.execution.arrow.maxRecordsPerBatch` to a few times max_in_flight.
+
+    Args:
+        model_uri (str): text2sqlrag model to score with
+        max_in_flight (int): questions in flight per task, see `max_in_flight_per_task`
+        retrieval_cache_size (int): questions whose retrieval results each worker keeps
+        load_model (callable, optional): picklable model_uri -> pyfunc model, see `executor_predict_fn`
+
+    Returns:
+        pandas UDF returning a struct of generated_sql, prompt_tokens and error
+    """
+    from pyspark.sql.functions import pandas_udf
+
+    @pandas_udf(UDF_RESULT_TYPE)
+    def answer_questions(batches: Iterator[pd.Series]) -> Iterator[pd.DataFrame]:
+        predict_fn = executor_predict_fn(model_uri, retrieval_cache_size, load_model)
+        for questions in batches:
+            yield predict_batch(predict_fn, questions.tolist(), max_in_flight)
+
+    return answer_questions
@@ -0,0 +1,318 @@
+import fcntl
+import json
+import os
+import re
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from text2sql_rag_model.model_deployment.checkpoint_packaging import hash_file
+from text2sql_rag_model.model_deployment.registry_cache import MODEL_VERSION_URI, registry
+
+
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "text2sql_artifact_cache")
+# files larger than this are downloaded as parallel ranged chunks
+CHUNK_SIZE = 64 * 1024 * 1024
+# MLmodel metadata {checkpoint relative path: sha256} of the packaged weights, see sqlcoder/log_and_register_model.py
+CHECKPOINT_DIGESTS_METADATA = "checkpoint_sha256"
+
+
+class LocalArtifactRepo:
+    """
+    Artifacts of a model version stored in a local (or FUSE mounted, e.g. /Volumes or /dbfs) directory.
+
+    Reads byte ranges, so large files are fetched by parallel chunks like from cloud storage.
+    """
+
+    supports_ranges = True
+
+    def __init__(self, root):
+        self.root = root
+
+    def list_files(self):
+        """[(relative path, size in bytes)] of every artifact."""
+        files = []
+        for root, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(root, name)
+                files.append((os.path.relpath(path, self.root), os.path.getsize(path)))
+        return files
+
+    def read_range(self, relative_path, start, end):
+        """Bytes [start, end) of an artifact."""
+        with open(os.path.join(self.root, relative_path), "rb") as f:
+            f.seek(start)
+            return f.read(end - start)
+
+    def download(self, relative_path, local_path):
+        shutil.copyfile(os.path.join(self.root, relative_path), local_path)
+
+
+class MlflowArtifactRepo:
+    """
+    Artifacts of a model version behind an MLflow artifact URI. The MLflow artifact repository downloads whole
+    files (the Databricks one already splits large files into parallel presigned URL requests).
+    """
+
+    supports_ranges = False
+
+    def __init__(self, artifact_uri):
+        # imported here so that the cache can be used where mlflow isn't installed
+        from mlflow.store.artifact.artifact_repository_registry import get_artifact_repository
+
+        self.repo = get_artifact_repository(artifact_uri)
+
+    def list_files(self, path=None):
+        files = []
+        for info in self.repo.list_artifacts(path):
+            if info.is_dir:
+                files.extend(self.list_files(info.path))
+            else:
+                files.append((info.path, info.file_size))
+        return files
+
+    def download(self, relative_path, local_path):
+        with tempfile.TemporaryDirectory(dir=os.path.dirname(local_path)) as tmp_dir:
+            shutil.move(self.repo.download_artifacts(relative_path, tmp_dir), local_path)
+
+
+@contextmanager
+def file_lock(path, shared=False):
+    """
+    Lock on path shared by every process of the machine, released when the block exits. Exclusive by default,
+    shared locks only exclude exclusive ones.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def download_ranges(read_range, relative_path, size, local_path, chunk_size=CHUNK_SIZE, max_workers=8):
+    """
+    Download a file as parallel byte ranges written in place into a preallocated local file.
+
+    Args:
+        read_range (callable): (relative_path, start, end) -> bytes
+        relative_path (str): file to download
+        size (int): bytes of the file
+        local_path (str): destination
+        chunk_size (int): bytes per range, memory use is about max_workers * chunk_size
+        max_workers (int): ranges downloaded at once
+    """
+    fd = os.open(local_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        os.ftruncate(fd, size)
+
+        def fetch(start):
+            end = min(start + chunk_size, size)
+            data = read_range(relative_path, start, end)
+            if len(data) != end - start:
+                raise IOError(f"Short read of {relative_path} [{start}, {end}): {len(data)} bytes")
+            os.pwrite(fd, data, start)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(fetch, range(0, size, chunk_size)))
+    finally:
+        os.close(fd)
+
+
+def model_metadata(mlmodel_path):
+    """`metadata` of a local MLmodel file."""
+    import yaml
+
+    with open(mlmodel_path) as f:
+        return (yaml.safe_load(f) or {}).get("metadata") or {}
+
+
+def known_digests(files, metadata):
+    """
+    {relative path: sha256} of the weights whose digest the model metadata records, known without downloading them.
+
+    A checkpoint path matches the artifact whose path ends with it, if exactly one does. Only safetensors files
+    are matched, they are copied into the artifacts byte for byte while MLflow may rewrite the configs.
+    """
+    digests = {}
+    for checkpoint_path, digest in (metadata.get(CHECKPOINT_DIGESTS_METADATA) or {}).items():
+        if not checkpoint_path.endswith(".safetensors"):
+            continue
+        matches = [path for path, _ in files if path == checkpoint_path or path.endswith("/" + checkpoint_path)]
+        if len(matches) == 1:
+            digests[matches[0]] = digest
+    return digests
+
+
+def version_key(name, version):
+    """Cache key of a model version, safe as a file name."""
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", f"{name}-v{version}")
+
+
+class ArtifactCache:
+    """
+    Content-addressed local cache of model version artifacts.
+
+    Files are stored once under `blobs/<sha256>` whichever versions they belong to. A manifest per version maps
+    its relative paths to digests, and `models/<key>` lays the version out with hard links to the blobs, so loading
+    a version already cached touches no network and copies no bytes.
+
+    The digest of a file is only known once it is downloaded, except for the weights whose sha256 the MLmodel
+    metadata records (`CHECKPOINT_DIGESTS_METADATA`): a new version repackaging the same base weights skips them
+    and only downloads the files that changed. Other files are downloaded again and deduplicated after hashing.
+
+    Files larger than chunk_size are downloaded as parallel byte ranges only from repos that support ranges
+    (`LocalArtifactRepo`), `MlflowArtifactRepo` downloads whole files, several files at a time.
+
+    Safe under concurrent processes: the version is fetched under a file lock and every file is downloaded to a
+    temporary name and renamed into place. Fetches hold the cache-wide lock `locks/.cache.lock` shared and prune
+    holds it exclusively, so prune never deletes the blobs of a version being fetched.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, chunk_size=CHUNK_SIZE, max_workers=8):
+        self.cache_dir = cache_dir
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers
+        for sub_dir in ("blobs", "manifests", "models", "locks", "tmp"):
+            os.makedirs(os.path.join(cache_dir, sub_dir), exist_ok=True)
+
+    def _blob_path(self, digest):
+        return os.path.join(self.cache_dir, "blobs", digest)
+
+    def _manifest_path(self, key):
+        return os.path.join(self.cache_dir, "manifests", key + ".json")
+
+    def _model_dir(self, key):
+        return os.path.join(self.cache_dir, "models", key)
+
+    def _cache_lock(self, shared):
+        return file_lock(os.path.join(self.cache_dir, "locks", ".cache.lock"), shared)
+
+    def cached_manifest(self, key):
+        """{relative path: sha256} of a fully cached version, None if it isn't (or a blob went missing)."""
+        try:
+            with open(self._manifest_path(key)) as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return None
+        if all(os.path.exists(self._blob_path(digest)) for digest in manifest.values()):
+            return manifest
+        return None
+
+    def _fetch_file(self, repo, relative_path, size, digest=None):
+        """
+        Download one file and move it into the blob store, returns its digest. A file whose digest is known and
+        already stored isn't downloaded.
+        """
+        if digest is not None and os.path.exists(self._blob_path(digest)):
+            return digest
+        tmp_fd, tmp_path = tempfile.mkstemp(dir=os.path.join(self.cache_dir, "tmp"))
+        os.close(tmp_fd)
+        try:
+            if repo.supports_ranges and size > self.chunk_size:
+                download_ranges(repo.read_range, relative_path, size, tmp_path, self.chunk_size, self.max_workers)
+            else:
+                repo.download(relative_path, tmp_path)
+            digest = hash_file(tmp_path)
+            # keep the stored blob, other versions hard link to it. If another process stores the same content
+            # in between, the rename atomically swaps in identical bytes
+            if not os.path.exists(self._blob_path(digest)):
+                os.chmod(tmp_path, 0o644)
+                os.replace(tmp_path, self._blob_path(digest))
+            return digest
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _link_model_dir(self, key, manifest):
+        """Lay the version out under models/<key> with hard links to the blobs, renamed into place when complete."""
+        staging_dir = tempfile.mkdtemp(dir=os.path.join(self.cache_dir, "tmp"))
+        for relative_path, digest in manifest.items():
+            destination = os.path.join(staging_dir, relative_path)
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            os.link(self._blob_path(digest), destination)
+        os.rename(staging_dir, self._model_dir(key))
+
+    def fetch(self, key, repo):
+        """
+        Local directory with every artifact of a model version, downloaded only if it isn't cached yet.
+
+        Args:
+            key (str): identifies the model version, see `version_key`. Must not be an alias, whose target changes
+            repo: artifacts of the version, a `LocalArtifactRepo` or `MlflowArtifactRepo`
+
+        Returns:
+            str: local model directory, e.g. for `mlflow.pyfunc.load_model`
+        """
+        with self._cache_lock(shared=True):
+            if self.cached_manifest(key) is not None and os.path.isdir(self._model_dir(key)):
+                return self._model_dir(key)
+            with file_lock(os.path.join(self.cache_dir, "locks", key + ".lock")):
+                # another process may have fetched the version while we waited for the lock
+                manifest = self.cached_manifest(key)
+                if manifest is None:
+                    files = sorted(repo.list_files(), key=lambda f: -f[1])
+                    known = {}
+                    mlmodel = next((f for f in files if f[0] == "MLmodel"), None)
+                    if mlmodel is not None:
+                        # fetched first, its metadata may record the digests of the weights
+                        known["MLmodel"] = self._fetch_file(repo, *mlmodel)
+                        known.update(known_digests(files, model_metadata(self._blob_path(known["MLmodel"]))))
+                    # large files download their own chunks in parallel, small ones run side by side
+                    with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                        digests = list(executor.map(lambda f: self._fetch_file(repo, *f, known.get(f[0])), files))
+                    manifest = {relative_path: digest for (relative_path, _), digest in zip(files, digests)}
+                    tmp_fd, tmp_path = tempfile.mkstemp(dir=os.path.join(self.cache_dir, "tmp"))
+                    with os.fdopen(tmp_fd, "w") as f:
+                        json.dump(manifest, f)
+                    os.replace(tmp_path, self._manifest_path(key))
+                if not os.path.isdir(self._model_dir(key)):
+                    self._link_model_dir(key, manifest)
+                return self._model_dir(key)
+
+    def prune(self, keep_keys):
+        """Remove the versions not in keep_keys and the blobs no remaining version uses."""
+        keep_keys = set(keep_keys)
+        used = set()
+        # waits for running fetches and keeps new ones out, their blobs aren't in any manifest yet
+        with self._cache_lock(shared=False):
+            for name in os.listdir(os.path.join(self.cache_dir, "manifests")):
+                key = name[: -len(".json")]
+                if key in keep_keys:
+                    with open(self._manifest_path(key)) as f:
+                        used.update(json.load(f).values())
+                else:
+                    os.remove(self._manifest_path(key))
+                    shutil.rmtree(self._model_dir(key), ignore_errors=True)
+            for digest in os.listdir(os.path.join(self.cache_dir, "blobs")):
+                if digest not in used:
+                    os.remove(self._blob_path(digest))
+
+
+def cached_model_path(model_uri, cache_dir=DEFAULT_CACHE_DIR, registry_cache=None):
+    """
+    Local directory of a registered model version, served from the artifact cache.
+
+    An alias is resolved to its version first (see `registry_cache.RegistryCache.resolve`), so the cache never
+    serves a version the alias moved away from.
+    """
+    registry_cache = registry_cache or registry()
+    name, version = registry_cache.resolve(model_uri)
+    # the repo is only read if the version isn't cached, but it is always passed: the version may be pruned
+    # between a check here and the fetch
+    repo = MlflowArtifactRepo(registry_cache.client.get_model_version_download_uri(name, version))
+    return ArtifactCache(cache_dir).fetch(version_key(name, version), repo)
+
+
+def load_model(model_uri, cache_dir=DEFAULT_CACHE_DIR, registry_cache=None):
+    """
+    `mlflow.pyfunc.load_model` of a registered model version, with its artifacts served from the local cache.
+    Other URIs (runs:/, local paths) are loaded directly.
+    """
+    import mlflow
+
+    if MODEL_VERSION_URI.fullmatch(model_uri) is None:
+        return mlflow.pyfunc.load_model(model_uri)
+    return mlflow.pyfunc.load_model(cached_model_path(model_uri, cache_dir, registry_cache))
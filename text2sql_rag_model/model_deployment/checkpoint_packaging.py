@@ -0,0 +1,125 @@
+import hashlib
+import json
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+
+# files of a Hugging Face checkpoint needed to serve it, weights only as safetensors
+CHECKPOINT_PATTERNS = ["*.json", "*.safetensors", "tokenizer*", "*.model", "*.txt"]
+CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def download_checkpoint(repo_id, cache_dir=None, max_workers=8):
+    """
+    Download a checkpoint into the local Hugging Face cache (or reuse it), without loading any weights.
+
+    Returns:
+        str: local snapshot directory
+    """
+    from huggingface_hub import snapshot_download
+
+    return snapshot_download(repo_id, cache_dir=cache_dir, allow_patterns=CHECKPOINT_PATTERNS, max_workers=max_workers)
+
+
+def read_safetensors_header(path):
+    """Tensor names, dtypes, shapes and offsets of a safetensors file, read without touching the weights."""
+    with open(path, "rb") as f:
+        (header_size,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(header_size))
+    header.pop("__metadata__", None)
+    return header
+
+
+def hash_file(path, chunk_size=CHUNK_SIZE):
+    """Streaming sha256 of a file, memory use is bounded by chunk_size."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def checkpoint_files(checkpoint_dir):
+    """Relative paths of every file of the checkpoint, largest first so that parallel work finishes together."""
+    files = []
+    for root, _, names in os.walk(checkpoint_dir):
+        files.extend(os.path.relpath(os.path.join(root, name), checkpoint_dir) for name in names)
+    return sorted(files, key=lambda f: -os.path.getsize(os.path.join(checkpoint_dir, f)))
+
+
+def verify_checkpoint(checkpoint_dir, max_workers=8, chunk_size=CHUNK_SIZE):
+    """
+    Check that the safetensors shards hold every tensor of the index and hash every file in parallel.
+
+    Args:
+        checkpoint_dir (str): local checkpoint, e.g. from `download_checkpoint`
+        max_workers (int): files hashed at once (hashlib releases the GIL on large reads)
+        chunk_size (int): bytes read at a time per file, memory use is about max_workers * chunk_size
+
+    Returns:
+        dict: manifest {relative path: {"sha256", "bytes"}}
+
+    Raises:
+        ValueError: if there are no safetensors weights or shards are missing tensors listed in the index
+    """
+    files = checkpoint_files(checkpoint_dir)
+    shards = [f for f in files if f.endswith(".safetensors")]
+    if not shards:
+        raise ValueError(f"No safetensors weights in {checkpoint_dir}")
+
+    index_path = os.path.join(checkpoint_dir, "model.safetensors.index.json")
+    if os.path.exists(index_path):
+        with open(index_path) as f:
+            weight_map = json.load(f)["weight_map"]
+        for shard in set(weight_map.values()):
+            shard_path = os.path.join(checkpoint_dir, shard)
+            if not os.path.exists(shard_path):
+                raise ValueError(f"Shard {shard} listed in the index is missing")
+            missing = {t for t, s in weight_map.items() if s == shard} - set(read_safetensors_header(shard_path))
+            if missing:
+                raise ValueError(f"Shard {shard} is missing tensors {sorted(missing)[:5]}")
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        hashes = executor.map(lambda f: hash_file(os.path.join(checkpoint_dir, f), chunk_size), files)
+        return {
+            f: {"sha256": sha256, "bytes": os.path.getsize(os.path.join(checkpoint_dir, f))}
+            for f, sha256 in zip(files, hashes)
+        }
+
+
+def generation_eos_token_id(checkpoint_dir):
+    """End of sequence token id from the checkpoint's generation or model config, no tokenizer needed."""
+    for name in ("generation_config.json", "config.json"):
+        path = os.path.join(checkpoint_dir, name)
+        if os.path.exists(path):
+            with open(path) as f:
+                eos_token_id = json.load(f).get("eos_token_id")
+            if eos_token_id is not None:
+                return eos_token_id
+    raise ValueError(f"No eos_token_id in the configs of {checkpoint_dir}")
+
+
+def upload_directory(local_dir, log_artifact, artifact_path, max_workers=8):
+    """
+    Upload every file of local_dir in parallel, keeping the directory layout.
+
+    Args:
+        local_dir (str): directory to upload, e.g. a model saved with `mlflow.transformers.save_model`
+        log_artifact (callable): (local_path, artifact_path) -> None, e.g.
+            `functools.partial(MlflowClient().log_artifact, run_id)`
+        artifact_path (str): destination of local_dir in the run's artifacts
+        max_workers (int): files uploaded at once
+
+    Returns:
+        list: relative paths of the uploaded files
+    """
+    files = checkpoint_files(local_dir)
+
+    def upload(relative_path):
+        destination = os.path.join(artifact_path, os.path.dirname(relative_path)).rstrip("/")
+        log_artifact(os.path.join(local_dir, relative_path), destination)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(upload, files))
+    return files
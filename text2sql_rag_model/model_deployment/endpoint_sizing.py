@@ -0,0 +1,239 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import requests
+
+
+# workload sizes of CPU/GPU model serving, from smallest to largest
+WORKLOAD_SIZES = ["Small", "Medium", "Large"]
+
+
+def synthetic_profile(payloads, rate_qps, duration_s, seed=0):
+    """
+    Generate a traffic profile with Poisson arrivals.
+
+    Args:
+        payloads (list): request payloads, sampled uniformly
+        rate_qps (float): mean arrival rate in queries per second
+        duration_s (float): length of the profile in seconds
+        seed (int): random seed
+
+    Returns:
+        list: (offset_s, payload) tuples sorted by offset
+    """
+    rng = np.random.default_rng(seed)
+    profile = []
+    offset = rng.exponential(1 / rate_qps)
+    while offset < duration_s:
+        profile.append((float(offset), payloads[rng.integers(len(payloads))]))
+        offset += rng.exponential(1 / rate_qps)
+    return profile
+
+
+def load_profile(path):
+    """
+    Load a recorded traffic profile from a JSON lines file of {"timestamp_ms": ..., "request": {...}},
+    e.g. exported from the endpoint's inference table. Offsets are relative to the first request.
+    """
+    with open(path) as f:
+        records = sorted((json.loads(line) for line in f if line.strip()), key=lambda r: r["timestamp_ms"])
+    if not records:
+        return []
+    start = records[0]["timestamp_ms"]
+    return [((r["timestamp_ms"] - start) / 1000, r["request"]) for r in records]
+
+
+def scale_profile(profile, factor):
+    """Replay the same requests `factor` times faster."""
+    return [(offset / factor, payload) for offset, payload in profile]
+
+
+def http_invoker(url, token=None, timeout_s=120):
+    """
+    Build a function that sends one payload to a serving endpoint invocation URL and raises on errors.
+    """
+    session = requests.Session()
+    if token:
+        session.headers["Authorization"] = f"Bearer {token}"
+
+    def invoke(payload):
+        response = session.post(url, json=payload, timeout=timeout_s)
+        response.raise_for_status()
+        return response.json()
+
+    return invoke
+
+
+def replay(invoke, profile, max_concurrency=64):
+    """
+    Send every request of the profile at its offset (open loop) and measure its latency.
+
+    Latency is measured from the scheduled send time, so client-side queueing when the endpoint
+    falls behind is included, like a real user would experience it.
+
+    Returns:
+        list: one {"latency_s": float, "ok": bool} per request
+    """
+
+    def send(scheduled, payload):
+        try:
+            invoke(payload)
+            ok = True
+        except Exception:
+            ok = False
+        return {"latency_s": time.perf_counter() - scheduled, "ok": ok}
+
+    start = time.perf_counter()
+    futures = []
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        for offset, payload in profile:
+            delay = start + offset - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(executor.submit(send, start + offset, payload))
+    return [future.result() for future in futures]
+
+
+def summarize(results, duration_s):
+    """
+    Reduce replay results to p50/p95 latency of successful requests, throughput and error rate.
+    """
+    latencies = [r["latency_s"] for r in results if r["ok"]]
+    return {
+        "requests": len(results),
+        "p50_latency_s": float(np.percentile(latencies, 50)) if latencies else float("inf"),
+        "p95_latency_s": float(np.percentile(latencies, 95)) if latencies else float("inf"),
+        "throughput_qps": len(latencies) / duration_s if duration_s else 0.0,
+        "error_rate": 1 - len(latencies) / len(results) if results else 0.0,
+    }
+
+
+def measure_curve(invoke, profile, rate_factors, max_concurrency=64):
+    """
+    Replay the profile at increasing speed-ups to measure the throughput/latency curve.
+
+    Returns:
+        list: summaries, with the speed-up under "rate_factor"
+    """
+    curve = []
+    for factor in rate_factors:
+        scaled = scale_profile(profile, factor)
+        duration_s = scaled[-1][0] if scaled else 0
+        curve.append({"rate_factor": factor, **summarize(replay(invoke, scaled, max_concurrency), duration_s)})
+    return curve
+
+
+def workload_size_candidates():
+    """Served entity settings for CPU/GPU model serving, smallest first."""
+    return [{"workload_size": size} for size in WORKLOAD_SIZES]
+
+
+def throughput_candidates(throughput_chunk_size, max_chunks=8):
+    """Served entity settings for provisioned throughput, one per number of throughput chunks, smallest first."""
+    return [
+        {"min_provisioned_throughput": 0, "max_provisioned_throughput": chunks * throughput_chunk_size}
+        for chunks in range(1, max_chunks + 1)
+    ]
+
+
+def choose_smallest(candidates, measure, p95_slo_s, max_error_rate=0.01):
+    """
+    Pick the first (smallest) candidate whose measured p95 latency and error rate meet the SLO.
+
+    Args:
+        candidates (list): served entity settings ordered from smallest to largest
+        measure (callable): candidate -> summary as returned by `summarize`, e.g. deploy the candidate
+            and replay the traffic profile against it
+        p95_slo_s (float): p95 latency objective in seconds
+        max_error_rate (float): maximum tolerated error rate
+
+    Returns:
+        tuple: (candidate, summary)
+
+    Raises:
+        ValueError: if no candidate meets the SLO
+    """
+    for candidate in candidates:
+        summary = measure(candidate)
+        print(f"{candidate}: {summary}")
+        if summary["p95_latency_s"] <= p95_slo_s and summary["error_rate"] <= max_error_rate:
+            return candidate, summary
+    raise ValueError(f"No candidate meets the p95 latency SLO of {p95_slo_s}s")
+
+
+def write_sizing_config(path, sizing, summary=None, p95_slo_s=None):
+    """Persist the chosen served entity settings for `create_or_update_model_endpoint`."""
+    with open(path, "w") as f:
+        json.dump({"served_entity": sizing, "measured": summary, "p95_slo_s": p95_slo_s}, f, indent=2)
+
+
+def apply_sizing_config(config, path):
+    """
+    Override the sizing settings of every served entity with the ones written by `write_sizing_config`.
+
+    The endpoint config is returned unchanged if no sizing has been written yet.
+    """
+    if not path or not os.path.exists(path):
+        return config
+    with open(path) as f:
+        return with_sizing(config, json.load(f)["served_entity"])
+
+
+def with_sizing(config, sizing):
+    """Override the sizing settings of every served entity of an endpoint config with the given ones."""
+    # workload size and provisioned throughput are mutually exclusive
+    sized_keys = {"workload_size", "min_provisioned_throughput", "max_provisioned_throughput"}
+    served_entities = [
+        {**{k: v for k, v in entity.items() if k not in sized_keys}, **sizing} for entity in config["served_entities"]
+    ]
+    return {**config, "served_entities": served_entities}
+
+
+class MockServingEndpoint:
+    """
+    Local HTTP server standing in for a serving endpoint in tests.
+
+    It serves `capacity` requests at once, each taking `service_time_s`; requests beyond that queue,
+    which reproduces the latency knee of an undersized endpoint.
+    """
+
+    def __init__(self, capacity=1, service_time_s=0.05):
+        self.service_time_s = service_time_s
+        self.set_capacity(capacity)
+        endpoint = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                with endpoint._slots:
+                    time.sleep(endpoint.service_time_s)
+                body = json.dumps({"choices": [{"text": "SELECT 1"}]}).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}/invocations"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def set_capacity(self, capacity):
+        self.capacity = capacity
+        self._slots = threading.Semaphore(capacity)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
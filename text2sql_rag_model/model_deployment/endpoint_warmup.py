@@ -0,0 +1,144 @@
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+
+# representative requests for the text2sqlrag endpoint, covering single table aggregations and joins
+TEXT2SQL_WARMUP_PAYLOADS = [
+    {"prompt": ["Return the maximum and minimum number of cows across all farms."]},
+    {"prompt": ["List the themes of farm competitions held after 2010, sorted by year."]},
+    {"prompt": ["How many competitions were hosted in each city?"]},
+]
+
+# representative requests for the sqlcoder endpoint
+SQLCODER_WARMUP_PAYLOADS = [
+    {
+        "prompt": [
+            "### Task\nGenerate a SQL query to answer [QUESTION]How many farms are there?[/QUESTION]\n"
+            "### Database Schema\nCREATE TABLE farm (Farm_ID BIGINT, Year BIGINT, Cows DOUBLE)\n"
+            "### Answer\nGiven the database schema, here is the SQL query that "
+            "[QUESTION]How many farms are there?[/QUESTION]\n[SQL]"
+        ]
+    }
+]
+
+
+def warm_up(invoke, payloads, timeout_s=900, retry_interval_s=10):
+    """
+    Prime a freshly deployed (or scaled from zero) endpoint with representative requests.
+
+    The first request is retried until it succeeds, since a cold endpoint answers with errors
+    while the container starts and the model loads. The remaining payloads then prime the
+    model's caches and clients (e.g. the VectorSearchClient handshake).
+
+    Args:
+        invoke (callable): payload -> response, raising on errors
+        payloads (list): representative request payloads
+        timeout_s (float): give up if the endpoint hasn't answered after this many seconds
+        retry_interval_s (float): wait between failed attempts
+
+    Returns:
+        dict: seconds until the first successful response (cold start) and latencies of the warm requests
+
+    Raises:
+        TimeoutError: if the endpoint doesn't answer within timeout_s
+    """
+    start = time.perf_counter()
+    while True:
+        try:
+            invoke(payloads[0])
+            break
+        except Exception as e:
+            if time.perf_counter() - start + retry_interval_s > timeout_s:
+                raise TimeoutError(f"Endpoint didn't answer within {timeout_s}s: {e}")
+            print(f"Endpoint not warm yet ({e}), retrying in {retry_interval_s}s")
+            time.sleep(retry_interval_s)
+    cold_start_s = time.perf_counter() - start
+
+    latencies = []
+    for payload in payloads:
+        request_start = time.perf_counter()
+        invoke(payload)
+        latencies.append(time.perf_counter() - request_start)
+    return {"cold_start_s": cold_start_s, "warm_latencies_s": latencies}
+
+
+class KeepWarmSchedule:
+    """
+    Business hours during which an endpoint with scale to zero enabled should be kept warm.
+
+    Outside these hours the endpoint is left to scale to zero, so the first user pays the cold start
+    only at night and on weekends.
+    """
+
+    def __init__(self, start_hour=8, end_hour=18, weekdays=(0, 1, 2, 3, 4), timezone="UTC", interval_s=600):
+        """
+        Args:
+            start_hour (int): first hour of the day, inclusive, during which the endpoint is kept warm
+            end_hour (int): hour of the day at which keeping warm stops, exclusive
+            weekdays (tuple): days of the week, Monday is 0
+            timezone (str): IANA timezone of the hours
+            interval_s (int): seconds between pings, must be shorter than the endpoint's scale to zero idle time
+        """
+        self.start_hour = start_hour
+        self.end_hour = end_hour
+        self.weekdays = tuple(weekdays)
+        self.timezone = timezone
+        self.interval_s = interval_s
+
+    def is_active(self, now=None):
+        """Whether the endpoint should be kept warm at `now` (timezone aware, defaults to the current time)."""
+        now = (now or datetime.now(ZoneInfo("UTC"))).astimezone(ZoneInfo(self.timezone))
+        return now.weekday() in self.weekdays and self.start_hour <= now.hour < self.end_hour
+
+    @property
+    def warm_hours_per_week(self):
+        return len(self.weekdays) * (self.end_hour - self.start_hour)
+
+    def quartz_cron_expression(self):
+        """Job schedule pinging every `interval_s` during the active hours, e.g. for a Databricks job."""
+        minutes = max(self.interval_s // 60, 1)
+        days = ",".join(["MON", "TUE", "WED", "THU", "FRI", "SAT", "SUN"][d] for d in self.weekdays)
+        return f"0 0/{minutes} {self.start_hour}-{self.end_hour - 1} ? * {days}"
+
+
+def keep_warm_cost(schedule, dbus_per_hour, dollars_per_dbu=0.07):
+    """
+    Weekly cost of keeping one replica warm during the schedule, compared to running always-on.
+
+    Args:
+        schedule (KeepWarmSchedule): keep warm schedule
+        dbus_per_hour (float): DBU consumption of one warm replica of the endpoint's workload size
+        dollars_per_dbu (float): price of a DBU
+
+    Returns:
+        dict: weekly dollars for keep warm and always-on, and the fraction saved
+    """
+    keep_warm = schedule.warm_hours_per_week * dbus_per_hour * dollars_per_dbu
+    always_on = 7 * 24 * dbus_per_hour * dollars_per_dbu
+    return {
+        "keep_warm_dollars_per_week": keep_warm,
+        "always_on_dollars_per_week": always_on,
+        "saved_fraction": 1 - keep_warm / always_on,
+    }
+
+
+def keep_warm_once(invoke, payload, schedule, now=None):
+    """
+    Ping the endpoint if the schedule is active. Meant to run from a job scheduled with
+    `schedule.quartz_cron_expression()`.
+
+    Returns:
+        dict: whether a ping was sent, its latency and whether it succeeded, or None outside active hours
+    """
+    if not schedule.is_active(now):
+        return None
+    start = time.perf_counter()
+    try:
+        invoke(payload)
+        ok = True
+    except Exception as e:
+        print(f"Keep warm ping failed: {e}")
+        ok = False
+    return {"latency_s": time.perf_counter() - start, "ok": ok}
+
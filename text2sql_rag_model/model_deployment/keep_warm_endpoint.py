@@ -0,0 +1,56 @@
+# Databricks notebook source
+##################################################################################
+# Keep Warm Notebook
+#
+# Pings a serving endpoint with scale to zero enabled during business hours, so that users don't pay the
+# cold start (container start, model load, VectorSearchClient handshake) while the endpoint still scales to
+# zero at night and on weekends. Scheduled by `keep_warm_job` in resources/keep-warm-workflow-resource.yml.
+#
+# Parameters:
+# * endpoint_name   - Name of the serving endpoint to keep warm.
+# * start_hour      - First hour of the day during which the endpoint is kept warm.
+# * end_hour        - Hour of the day at which keeping warm stops.
+# * timezone        - Timezone of the business hours.
+# * dbus_per_hour   - DBU consumption of one warm replica, used for the cost report.
+##################################################################################
+
+# COMMAND ----------
+
+dbutils.widgets.text("endpoint_name", "text2sqlrag_asong", "Endpoint Name")
+dbutils.widgets.text("start_hour", "8", "Start Hour")
+dbutils.widgets.text("end_hour", "18", "End Hour")
+dbutils.widgets.text("timezone", "UTC", "Timezone")
+dbutils.widgets.text("dbus_per_hour", "4", "DBUs per Hour")
+
+# COMMAND ----------
+
+import sys
+import os
+from mlflow.deployments import get_deploy_client
+
+sys.path.append(os.path.abspath('..'))
+from text2sql_rag_model.model_deployment.endpoint_warmup import (
+    TEXT2SQL_WARMUP_PAYLOADS,
+    KeepWarmSchedule,
+    keep_warm_cost,
+    keep_warm_once,
+)
+
+endpoint_name = dbutils.widgets.get("endpoint_name")
+schedule = KeepWarmSchedule(
+    start_hour=int(dbutils.widgets.get("start_hour")),
+    end_hour=int(dbutils.widgets.get("end_hour")),
+    timezone=dbutils.widgets.get("timezone"),
+)
+print(f"Keep warm schedule: {schedule.quartz_cron_expression()} ({schedule.timezone})")
+print(f"Weekly cost: {keep_warm_cost(schedule, float(dbutils.widgets.get('dbus_per_hour')))}")
+
+deploy_client = get_deploy_client("databricks")
+ping = keep_warm_once(
+    lambda payload: deploy_client.predict(endpoint=endpoint_name, inputs=payload), TEXT2SQL_WARMUP_PAYLOADS[0], schedule
+)
+if ping is None:
+    print("Outside of business hours, letting the endpoint scale to zero.")
+else:
+    # a slow ping means the endpoint had already scaled to zero, i.e. the ping interval is too long
+    print(f"Pinged {endpoint_name}: {ping}")
@@ -0,0 +1,220 @@
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+
+# registry metadata changes when a version is registered, tagged or promoted, a few times a day at most
+DEFAULT_TTL_S = 60
+MODEL_VERSION_URI = re.compile(r"models:/([^/@]+)(?:/(\d+)|@(\w+))")
+
+
+# message of the MlflowException (error code INTERNAL_ERROR) Unity Catalog raises for an ordered search
+UC_UNSUPPORTED_ARG_MESSAGE = "is unsupported for models in the Unity Catalog"
+
+
+def is_unity_catalog(client):
+    """Whether a registry client talks to Unity Catalog, which can't order version searches."""
+    return str(getattr(client, "_registry_uri", None) or "").startswith("databricks-uc")
+
+
+def order_by_unsupported(error):
+    """Whether a search failed because the registry can't order versions, see `UC_UNSUPPORTED_ARG_MESSAGE`."""
+    return "order_by" in str(error) and UC_UNSUPPORTED_ARG_MESSAGE in str(error)
+
+
+def parse_model_uri(model_uri):
+    """(name, version or None, alias or None) of a models:/<name>/<version> or models:/<name>@<alias> URI."""
+    match = MODEL_VERSION_URI.fullmatch(model_uri)
+    if match is None:
+        raise ValueError(f"Expected models:/<name>/<version> or models:/<name>@<alias>, got {model_uri}")
+    return match.groups()
+
+
+class TTLCache:
+    """Thread-safe cache whose entries expire ttl_s seconds after they were loaded."""
+
+    def __init__(self, ttl_s=DEFAULT_TTL_S, clock=time.monotonic):
+        self.ttl_s = ttl_s
+        self.clock = clock
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, key, load):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.clock() - entry[0] < self.ttl_s:
+                self.stats["hits"] += 1
+                return entry[1]
+            self.stats["misses"] += 1
+        value = load()
+        self.put(key, value)
+        return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (self.clock(), value)
+
+    def invalidate(self, match=lambda key: True):
+        with self._lock:
+            for key in [key for key in self._entries if match(key)]:
+                del self._entries[key]
+
+
+class RegistryCache:
+    """
+    Model registry lookups with short-lived caching.
+
+    The latest version is read from a single search result ordered by version number, aliases are resolved with
+    `get_model_version_by_alias` instead of scanning versions, and results are cached for ttl_s seconds so the
+    deploy, alias and validation steps of a job share them. Writes made through the cache (`set_alias`) update it
+    immediately.
+
+    Args:
+        client (MlflowClient, optional): defaults to an `MlflowClient` for the current registry URI, created on
+            first use so that `mlflow.set_registry_uri` can be called after the cache is built
+        ttl_s (float): seconds a lookup is reused
+        clock (callable): time source, for tests
+    """
+
+    def __init__(self, client=None, ttl_s=DEFAULT_TTL_S, clock=time.monotonic):
+        self._client = client
+        self._cache = TTLCache(ttl_s, clock)
+        self._ordered_search = True
+
+    @property
+    def client(self):
+        if self._client is None:
+            from mlflow import MlflowClient
+
+            self._client = MlflowClient()
+        return self._client
+
+    @property
+    def stats(self):
+        return self._cache.stats
+
+    def _search_latest(self, name):
+        if self._ordered_search and is_unity_catalog(self.client):
+            self._ordered_search = False
+        if self._ordered_search:
+            try:
+                versions = self.client.search_model_versions(
+                    f"name='{name}'", max_results=1, order_by=["version_number DESC"]
+                )
+                return max((int(mv.version) for mv in versions), default=None)
+            except Exception as e:
+                # registries that can't order versions (Unity Catalog behind another registry URI, e.g. the
+                # "databricks" default with a three-level name) are scanned instead, once per ttl_s. Other
+                # errors, e.g. a timeout, must not disable ordered searches for the rest of the process
+                if not order_by_unsupported(e):
+                    raise
+                self._ordered_search = False
+        versions = self.client.search_model_versions(f"name='{name}'")
+        return max((int(mv.version) for mv in versions), default=None)
+
+    def latest_version(self, name):
+        """Highest version number of a registered model, None if it has no versions."""
+        return self._cache.get(("latest", name), lambda: self._search_latest(name))
+
+    def version_by_alias(self, name, alias):
+        """Version number an alias points to."""
+        return self._cache.get(
+            ("alias", name, alias), lambda: int(self.client.get_model_version_by_alias(name, alias).version)
+        )
+
+    def model_version(self, name, version):
+        """ModelVersion entity (tags, source, run_id) of a version."""
+        return self._cache.get(("version", name, int(version)), lambda: self.client.get_model_version(name, version))
+
+    def resolve(self, model_uri):
+        """(name, version) of a models:/<name>/<version>, models:/<name>@<alias> or models:/<name>/latest URI."""
+        if model_uri.startswith("models:/") and model_uri.endswith("/latest"):
+            name = model_uri[len("models:/") : -len("/latest")]
+            return name, self.latest_version(name)
+        name, version, alias = parse_model_uri(model_uri)
+        if alias is not None:
+            return name, self.version_by_alias(name, alias)
+        return name, int(version)
+
+    def latest_versions(self, names, max_workers=8):
+        """{name: latest version} of many registered models, looked up concurrently and cached together."""
+        names = list(dict.fromkeys(names))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return dict(zip(names, executor.map(self.latest_version, names)))
+
+    def set_alias(self, name, alias, version):
+        """Point an alias at a version in the registry and in the cache."""
+        self.client.set_registered_model_alias(name=name, alias=alias, version=version)
+        self._cache.put(("alias", name, alias), int(version))
+
+    def invalidate(self, name=None):
+        """Forget cached lookups, of one registered model or of every model."""
+        self._cache.invalidate(lambda key: name is None or key[1] == name)
+
+
+_REGISTRY = None
+_REGISTRY_LOCK = threading.Lock()
+
+
+def registry():
+    """Registry cache shared by every lookup of the process."""
+    global _REGISTRY
+    with _REGISTRY_LOCK:
+        if _REGISTRY is None:
+            _REGISTRY = RegistryCache()
+        return _REGISTRY
+
+
+class FakeRegistryClient:
+    """
+    In-memory stand-in for the `MlflowClient` registry methods to test registry lookups locally.
+
+    Every call is kept in `calls`. With supports_order_by=False, ordered searches fail with the error Unity Catalog
+    raises, an MlflowException with the default INTERNAL_ERROR code.
+    """
+
+    def __init__(self, versions=None, supports_order_by=True):
+        self.versions = {name: list(numbers) for name, numbers in (versions or {}).items()}
+        self.aliases = {}
+        self.supports_order_by = supports_order_by
+        self.calls = []
+
+    def _version(self, name, version):
+        return SimpleNamespace(name=name, version=str(version), tags={}, aliases=[
+            alias for (model, alias), target in self.aliases.items() if model == name and target == int(version)
+        ])
+
+    def search_model_versions(self, filter_string, max_results=None, order_by=None):
+        self.calls.append(("search_model_versions", filter_string, max_results, order_by))
+        if order_by and not self.supports_order_by:
+            error = Exception(f"Argument 'order_by' {UC_UNSUPPORTED_ARG_MESSAGE}.")
+            error.error_code = "INTERNAL_ERROR"
+            raise error
+        name = filter_string.split("'")[1]
+        numbers = self.versions.get(name, [])
+        if order_by:
+            numbers = sorted(numbers, reverse=True)
+        return [self._version(name, n) for n in numbers[:max_results]]
+
+    def get_model_version(self, name, version):
+        self.calls.append(("get_model_version", name, version))
+        if int(version) not in self.versions.get(name, []):
+            raise Exception(f"RESOURCE_DOES_NOT_EXIST: version {version} of {name}")
+        return self._version(name, version)
+
+    def get_model_version_by_alias(self, name, alias):
+        self.calls.append(("get_model_version_by_alias", name, alias))
+        if (name, alias) not in self.aliases:
+            raise Exception(f"RESOURCE_DOES_NOT_EXIST: alias {alias} of {name}")
+        return self._version(name, self.aliases[(name, alias)])
+
+    def set_registered_model_alias(self, name, alias, version):
+        self.calls.append(("set_registered_model_alias", name, alias, version))
+        self.aliases[(name, alias)] = int(version)
+
+    def get_model_version_download_uri(self, name, version):
+        self.calls.append(("get_model_version_download_uri", name, version))
+        return f"fake:/{name}/{version}"
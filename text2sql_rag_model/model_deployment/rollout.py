@@ -0,0 +1,258 @@
+import copy
+import time
+
+import numpy as np
+
+
+# percentage of traffic sent to the new version at each step of a rollout
+TRAFFIC_STEPS = (5, 25, 50, 100)
+
+
+class RolloutError(Exception):
+    """Raised when a new version is rolled back because it is slower or fails more than the current one, or because
+    too few of its requests reached the inference table to judge it."""
+
+
+def served_entity_name(entity):
+    """Name of a served entity, `<model>-<version>` like the serving UI, unless one is set explicitly."""
+    return entity.get("name") or f"{entity['entity_name'].split('.')[-1]}-{entity['entity_version']}"
+
+
+def traffic_config(routes):
+    """Build a traffic config from {served_entity_name: traffic_percentage}."""
+    return {
+        "routes": [
+            {"served_model_name": name, "traffic_percentage": percentage} for name, percentage in routes.items()
+        ]
+    }
+
+
+def inference_table_query(payload_table, since_ms):
+    """
+    SQL reading the requests captured by `auto_capture_config` since `since_ms`, one row per request,
+    with the columns expected by `summarize_inference_logs`.
+    """
+    return f"""
+        SELECT
+          request_metadata['model_version'] AS model_version,
+          status_code,
+          execution_time_ms
+        FROM {payload_table}
+        WHERE timestamp_ms >= {int(since_ms)}
+    """
+
+
+def summarize_inference_logs(logs):
+    """
+    Per model version latency and error rate of captured requests.
+
+    Args:
+        logs (pd.DataFrame): columns model_version, status_code and execution_time_ms
+
+    Returns:
+        dict: {model_version (str): {"requests", "p95_latency_ms", "error_rate"}}
+    """
+    summary = {}
+    for version, requests in logs.groupby(logs["model_version"].astype(str)):
+        ok = requests[requests["status_code"] == 200]
+        summary[version] = {
+            "requests": len(requests),
+            "p95_latency_ms": float(np.percentile(ok["execution_time_ms"], 95)) if len(ok) else float("inf"),
+            "error_rate": 1 - len(ok) / len(requests),
+        }
+    return summary
+
+
+def compare_versions(current, candidate, max_latency_regression=0.1, max_error_rate_increase=0.01, min_requests=20):
+    """
+    Decide whether the candidate version can take more traffic.
+
+    Args:
+        current (dict): metrics of the current version, see `summarize_inference_logs`
+        candidate (dict): metrics of the new version
+        max_latency_regression (float): tolerated relative p95 latency increase
+        max_error_rate_increase (float): tolerated absolute error rate increase
+        min_requests (int): the candidate needs at least this many requests to be judged
+
+    Returns:
+        str: why the candidate must be rolled back, or None if it is healthy (or there isn't enough traffic to tell,
+            check `enough_traffic` first)
+    """
+    if not candidate or candidate["requests"] < min_requests or not current:
+        return None
+    if candidate["p95_latency_ms"] > (1 + max_latency_regression) * current["p95_latency_ms"]:
+        return f"p95 latency {candidate['p95_latency_ms']:.0f}ms vs {current['p95_latency_ms']:.0f}ms"
+    if candidate["error_rate"] > current["error_rate"] + max_error_rate_increase:
+        return f"error rate {candidate['error_rate']:.2%} vs {current['error_rate']:.2%}"
+    return None
+
+
+def enough_traffic(current, candidate, min_requests=20):
+    """Whether the inference table has metrics of the current version and min_requests requests of the candidate."""
+    return bool(current) and bool(candidate) and candidate["requests"] >= min_requests
+
+
+def wait_for_config_update(deploy_client, endpoint_name, timeout_s=3600, poll_interval_s=30, sleep=time.sleep):
+    """Wait until the endpoint has finished applying its latest config."""
+    waited = 0
+    while deploy_client.get_endpoint(endpoint_name)["state"].get("config_update") == "IN_PROGRESS":
+        if waited >= timeout_s:
+            raise TimeoutError(f"Config update of {endpoint_name} didn't finish within {timeout_s}s")
+        print(f"Waiting {poll_interval_s}s for the config update of {endpoint_name} to finish")
+        sleep(poll_interval_s)
+        waited += poll_interval_s
+
+
+def rollout(
+    deploy_client,
+    endpoint_name,
+    new_entity,
+    metrics_fn,
+    steps=TRAFFIC_STEPS,
+    bake_time_s=600,
+    max_latency_regression=0.1,
+    max_error_rate_increase=0.01,
+    min_requests=20,
+    max_bake_time_s=7200,
+    poll_interval_s=300,
+    warmup=None,
+    sleep=time.sleep,
+):
+    """
+    Blue/green rollout of a new served entity next to the current one, shifting traffic in steps.
+
+    The new entity is first deployed with no traffic and warmed up, so that its cold start doesn't skew its
+    latency. After each step the endpoint serves traffic for `bake_time_s`, then the new version's live p95
+    latency and error rate (from the inference table) are compared to the current version's. Inference tables
+    land up to about an hour late, so while there aren't enough requests to judge, the bake is extended by
+    `poll_interval_s` up to `max_bake_time_s`; the new version is never promoted unchecked. A regression, or
+    still too little data after `max_bake_time_s`, rolls all traffic back to the current version. Once the new
+    version takes 100% of traffic, the current version is removed.
+
+    Args:
+        deploy_client: MLflow deployment client for "databricks" (or `FakeDeployClient`)
+        endpoint_name (str): existing serving endpoint
+        new_entity (dict): served entity of the new version
+        metrics_fn (callable): since_ms -> {model_version: metrics}, see `summarize_inference_logs`
+        steps (tuple): traffic percentages of the new version
+        bake_time_s (float): seconds of live traffic before each comparison
+        max_latency_regression (float): tolerated relative p95 latency increase
+        max_error_rate_increase (float): tolerated absolute error rate increase
+        min_requests (int): requests of the new version needed to judge a step
+        max_bake_time_s (float): seconds a step waits for enough requests before the new version is rolled back
+        poll_interval_s (float): seconds between metric reads while waiting for enough requests
+        warmup (callable, optional): served entity name -> None, sends warmup requests to the new entity while it
+            has no traffic, e.g. with `endpoint_warmup.warm_up`
+        sleep (callable): sleep function, replaced in tests
+
+    Returns:
+        list: metrics observed at each step
+
+    Raises:
+        RolloutError: if the new version regressed, or couldn't be judged, and was rolled back
+    """
+    current_entity = copy.deepcopy(deploy_client.get_endpoint(endpoint_name)["config"]["served_entities"][0])
+    current_name, new_name = served_entity_name(current_entity), served_entity_name(new_entity)
+    current_version, new_version = str(current_entity["entity_version"]), str(new_entity["entity_version"])
+    if current_version == new_version:
+        print(f"Version {new_version} is already served by {endpoint_name}")
+        return []
+    new_entity = {**new_entity, "name": new_name}
+    current_entity = {**current_entity, "name": current_name}
+
+    def route(percentage):
+        deploy_client.update_endpoint(
+            endpoint=endpoint_name,
+            config={
+                "served_entities": [current_entity, new_entity],
+                "traffic_config": traffic_config({current_name: 100 - percentage, new_name: percentage}),
+            },
+        )
+        wait_for_config_update(deploy_client, endpoint_name, sleep=sleep)
+
+    def roll_back(percentage, reason):
+        print(f"Rolling back {new_name}: {reason}")
+        deploy_client.update_endpoint(
+            endpoint=endpoint_name,
+            config={"served_entities": [current_entity], "traffic_config": traffic_config({current_name: 100})},
+        )
+        wait_for_config_update(deploy_client, endpoint_name, sleep=sleep)
+        raise RolloutError(f"{new_name} was rolled back at {percentage}% of traffic: {reason}")
+
+    if warmup is not None:
+        print(f"Deploying {new_name} on {endpoint_name} without traffic to warm it up")
+        route(0)
+        try:
+            warmup(new_name)
+        except Exception as e:
+            roll_back(0, f"warmup failed: {e}")
+
+    history = []
+    for percentage in steps:
+        if percentage == 100:
+            break
+        print(f"Routing {percentage}% of {endpoint_name} traffic to {new_name}")
+        route(percentage)
+        since_ms = time.time() * 1000
+        sleep(bake_time_s)
+        baked_s = bake_time_s
+        metrics = metrics_fn(since_ms)
+        while not enough_traffic(metrics.get(current_version), metrics.get(new_version), min_requests):
+            if baked_s >= max_bake_time_s:
+                history.append({"traffic_percentage": percentage, "metrics": metrics})
+                roll_back(percentage, f"fewer than {min_requests} requests logged after {baked_s:.0f}s")
+            print(f"Not enough requests of {new_name} in the inference table yet, waiting {poll_interval_s}s")
+            sleep(poll_interval_s)
+            baked_s += poll_interval_s
+            metrics = metrics_fn(since_ms)
+        history.append({"traffic_percentage": percentage, "metrics": metrics})
+        regression = compare_versions(
+            metrics.get(current_version), metrics.get(new_version), max_latency_regression, max_error_rate_increase
+        )
+        if regression:
+            roll_back(percentage, regression)
+
+    print(f"Routing 100% of {endpoint_name} traffic to {new_name}")
+    deploy_client.update_endpoint(
+        endpoint=endpoint_name,
+        config={"served_entities": [new_entity], "traffic_config": traffic_config({new_name: 100})},
+    )
+    wait_for_config_update(deploy_client, endpoint_name, sleep=sleep)
+    return history
+
+
+class FakeDeployClient:
+    """
+    In-memory stand-in for `mlflow.deployments.get_deploy_client("databricks")` to test deployments locally.
+
+    Configs are applied immediately and every config sent is kept in `config_history`.
+    """
+
+    def __init__(self):
+        self.endpoints = {}
+        self.config_history = []
+
+    def create_endpoint(self, name, config):
+        if name in self.endpoints:
+            raise Exception(f"RESOURCE_ALREADY_EXISTS: endpoint {name} already exists")
+        return self._apply(name, config)
+
+    def update_endpoint(self, endpoint, config):
+        if endpoint not in self.endpoints:
+            raise Exception(f"RESOURCE_DOES_NOT_EXIST: endpoint {endpoint} does not exist")
+        return self._apply(endpoint, config)
+
+    def get_endpoint(self, endpoint):
+        if endpoint not in self.endpoints:
+            raise Exception(f"RESOURCE_DOES_NOT_EXIST: endpoint {endpoint} does not exist")
+        return copy.deepcopy(self.endpoints[endpoint])
+
+    def predict(self, endpoint, inputs):
+        self.get_endpoint(endpoint)
+        return {"choices": [{"text": "SELECT 1"}]}
+
+    def _apply(self, name, config):
+        config = copy.deepcopy(config)
+        self.config_history.append((name, config))
+        self.endpoints[name] = {"name": name, "config": config, "state": {"ready": "READY", "config_update": "NOT_UPDATING"}}
+        return self.get_endpoint(name)
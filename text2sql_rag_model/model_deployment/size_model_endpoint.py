@@ -0,0 +1,103 @@
+# Databricks notebook source
+##################################################################################
+# Endpoint Sizing Notebook
+#
+# Replays a recorded or synthetic traffic profile against a serving endpoint for each candidate size, from
+# smallest to largest, and writes the smallest size meeting the p95 latency SLO to a sizing config consumed
+# by `create_or_update_model_endpoint`. The config is only written once a size met the SLO; if none does, or the
+# run fails, the endpoint is restored to its original config.
+#
+# Parameters:
+# * endpoint_name       - Name of the serving endpoint to size. It is re-configured for every candidate.
+# * sizing_mode         - `workload_size` for CPU/GPU serving, `provisioned_throughput` for provisioned throughput.
+# * traffic_profile     - Path of a JSON lines traffic profile exported from the inference table. When empty, a
+#                         synthetic Poisson profile of `synthetic_qps` over `synthetic_duration_s` is used.
+# * p95_slo_s           - p95 latency objective in seconds.
+# * sizing_config_path  - Where the chosen sizing is written, e.g. text_to_sql/endpoint_sizing.json.
+##################################################################################
+
+# COMMAND ----------
+
+dbutils.widgets.text("endpoint_name", "text2sqlrag_asong", "Endpoint Name")
+dbutils.widgets.dropdown("sizing_mode", "workload_size", ["workload_size", "provisioned_throughput"], "Sizing Mode")
+dbutils.widgets.text("traffic_profile", "", "Traffic Profile")
+dbutils.widgets.text("synthetic_qps", "1", "Synthetic QPS")
+dbutils.widgets.text("synthetic_duration_s", "120", "Synthetic Duration (s)")
+dbutils.widgets.text("p95_slo_s", "10", "p95 Latency SLO (s)")
+dbutils.widgets.text("sizing_config_path", "text_to_sql/endpoint_sizing.json", "Sizing Config Path")
+
+# COMMAND ----------
+
+import sys
+import os
+import mlflow
+from mlflow.deployments import get_deploy_client
+
+sys.path.append(os.path.abspath('..'))
+from text2sql_rag_model.model_deployment.utils import get_optimizable_info, wait_for_endpoint
+from text2sql_rag_model.model_deployment.endpoint_sizing import (
+    choose_smallest,
+    http_invoker,
+    load_profile,
+    replay,
+    summarize,
+    synthetic_profile,
+    throughput_candidates,
+    with_sizing,
+    workload_size_candidates,
+    write_sizing_config,
+)
+
+EXAMPLE_PAYLOADS = [{"prompt": ["Return the maximum and minimum number of cows across all farms."]}]
+
+endpoint_name = dbutils.widgets.get("endpoint_name")
+sizing_mode = dbutils.widgets.get("sizing_mode")
+p95_slo_s = float(dbutils.widgets.get("p95_slo_s"))
+sizing_config_path = dbutils.widgets.get("sizing_config_path")
+traffic_profile = dbutils.widgets.get("traffic_profile")
+if traffic_profile:
+    profile = load_profile(traffic_profile)
+else:
+    profile = synthetic_profile(
+        EXAMPLE_PAYLOADS, float(dbutils.widgets.get("synthetic_qps")), float(dbutils.widgets.get("synthetic_duration_s"))
+    )
+assert profile, "traffic profile is empty"
+
+# COMMAND ----------
+
+deploy_client = get_deploy_client("databricks")
+host = "https://" + spark.conf.get("spark.databricks.workspaceUrl")
+token = mlflow.utils.databricks_utils.get_databricks_host_creds().token
+invoke = http_invoker(f"{host}/serving-endpoints/{endpoint_name}/invocations", token=token)
+endpoint_config = deploy_client.get_endpoint(endpoint_name)["config"]
+served_entity = endpoint_config["served_entities"][0]
+
+if sizing_mode == "workload_size":
+    candidates = workload_size_candidates()
+else:
+    optimizable_info = get_optimizable_info(served_entity["entity_name"], served_entity["entity_version"])
+    candidates = throughput_candidates(optimizable_info["throughput_chunk_size"])
+
+
+def measure(candidate):
+    # candidates are deployed directly, the sizing config only ever holds a size that met the SLO
+    config = with_sizing({"served_entities": [served_entity]}, candidate)
+    deploy_client.update_endpoint(endpoint=endpoint_name, config=config)
+    wait_for_endpoint(endpoint_name)
+    # warm up so that scale-from-zero doesn't count against the candidate
+    replay(invoke, profile[:5])
+    return summarize(replay(invoke, profile), profile[-1][0])
+
+
+try:
+    sizing, summary = choose_smallest(candidates, measure, p95_slo_s)
+except BaseException:
+    print(f"Sizing failed, restoring the original config of {endpoint_name}; {sizing_config_path} is unchanged")
+    original_config = {"served_entities": endpoint_config["served_entities"]}
+    if endpoint_config.get("traffic_config"):
+        original_config["traffic_config"] = endpoint_config["traffic_config"]
+    deploy_client.update_endpoint(endpoint=endpoint_name, config=original_config)
+    wait_for_endpoint(endpoint_name)
+    raise
+write_sizing_config(sizing_config_path, sizing, summary, p95_slo_s)
+print(f"Smallest size meeting a p95 of {p95_slo_s}s: {sizing} ({summary}), written to {sizing_config_path}")
@@ -3,4 +3,8 @@ CATALOG = "asong_dev"
 SCHEMA = "llms"
 MODEL_NAME = "sqlcoder_7b" 
 REGISTERED_MODEL_NAME = f"{CATALOG}.{SCHEMA}.{MODEL_NAME}"
-ENDPOINT_NAME = f"{MODEL_NAME}_asong"
\ No newline at end of file
+ENDPOINT_NAME = f"{MODEL_NAME}_asong"
+# written by model_deployment/size_model_endpoint.py, overrides the default endpoint sizing when present
+SIZING_CONFIG_PATH = "endpoint_sizing.json"
+# inference table filled by the endpoint's auto_capture_config, read to compare versions during rollouts
+INFERENCE_TABLE = f"{CATALOG}.{SCHEMA}.{ENDPOINT_NAME}_payload"
@@ -7,7 +7,14 @@ import mlflow
 
 sys.path.append(os.path.abspath('..'))
 from text2sql_rag_model.model_deployment.utils import get_latest_model_version, get_max_provisioned_throughput, create_or_update_model_endpoint
-from config import CATALOG, SCHEMA, MODEL_NAME, REGISTERED_MODEL_NAME, ENDPOINT_NAME
+from text2sql_rag_model.model_deployment.endpoint_warmup import SQLCODER_WARMUP_PAYLOADS
+from text2sql_rag_model.model_deployment.rollout import inference_table_query, summarize_inference_logs
+from config import CATALOG, SCHEMA, MODEL_NAME, REGISTERED_MODEL_NAME, ENDPOINT_NAME, SIZING_CONFIG_PATH, INFERENCE_TABLE
+
+
+def inference_table_metrics(since_ms):
+    """Per model version latency and error rate of the requests captured since since_ms."""
+    return summarize_inference_logs(spark.sql(inference_table_query(INFERENCE_TABLE, since_ms)).toPandas())
 
 
 def main():
@@ -34,7 +41,13 @@ def main():
         }
     }
 
-    create_or_update_model_endpoint(name=ENDPOINT_NAME, config=deployment_config)
+    create_or_update_model_endpoint(
+        name=ENDPOINT_NAME,
+        config=deployment_config,
+        sizing_config_path=SIZING_CONFIG_PATH,
+        warmup_payloads=SQLCODER_WARMUP_PAYLOADS,
+        rollout_metrics_fn=inference_table_metrics,
+    )
 
 
 if __name__ == "__main__":
@@ -3,6 +3,7 @@
 !pip install -U mlflow
 !pip install -U transformers
 !pip install -U accelerate
+!pip install -U huggingface_hub
 !pip install -U pytest
 dbutils.library.restartPython()
 
@@ -10,18 +11,29 @@ dbutils.library.restartPython()
 
 import sys
 import os
-import torch
+import tempfile
+from functools import partial
 import mlflow
 import numpy as np
 
 sys.path.append(os.path.abspath('..'))
 
-from text2sql_rag_model.model_deployment.utils import load_model_and_tokenizer
+from text2sql_rag_model.model_deployment.checkpoint_packaging import (
+    download_checkpoint,
+    generation_eos_token_id,
+    upload_directory,
+    verify_checkpoint,
+)
 from config import CATALOG, SCHEMA, MODEL_NAME, REGISTERED_MODEL_NAME
 
 
 
 HF_MODEL_NAME = "defog/sqlcoder-7b-2" 
+# candidates returned per prompt, the text2sqlrag model picks one by executing them against a local replica.
+# They come from beam search, which decodes NUM_RETURN_SEQUENCES beams as one batch: decoding is bound by reading
+# the weights, so 4 beams add far less than 4x the greedy latency, but the KV cache grows 4x and fewer requests
+# fit on the GPU at once. Compare the endpoint's p95 latency against 1 (greedy) before raising it
+NUM_RETURN_SEQUENCES = 4
 QUESTION="Return the maximum and minimum number of cows across all farms."
 EXAMPLE_PROMPT = f"""
 ### Task
@@ -43,38 +55,43 @@ EXAMPLE_MODEL_INPUT = {"prompt": np.array([EXAMPLE_PROMPT])}
 
 def main():
     """
-    Main function to load the model, set the model configuration, and log/register the MLflow model.
+    Main function to package the checkpoint, set the model configuration, and log/register the MLflow model.
+
+    The safetensors shards are streamed from the local Hugging Face cache into the model artifact: the weights
+    are never instantiated, so registration runs on a small cluster instead of needing ~14GB of RAM for the
+    float16 7B model.
     """
-    model, tokenizer = load_model_and_tokenizer(pretrained_model_name_or_path=HF_MODEL_NAME)
-    
+    checkpoint_dir = download_checkpoint(HF_MODEL_NAME)
+    manifest = verify_checkpoint(checkpoint_dir)
+    print(f"Packaging {len(manifest)} files, {sum(f['bytes'] for f in manifest.values()) / 1e9:.1f}GB")
+
     # Set the model configuration
-    eos_token_id = tokenizer.eos_token_id
+    eos_token_id = generation_eos_token_id(checkpoint_dir)
     model_config = {
-            "num_beams": 1,
+            "num_beams": NUM_RETURN_SEQUENCES, # greedy decoding can only return a single sequence
             "max_new_tokens": 400,
             "do_sample": False,
             "eos_token_id": eos_token_id,
             "pad_token_id": eos_token_id,
-            "num_return_sequences":1,
+            "num_return_sequences": NUM_RETURN_SEQUENCES,
         }
     
     mlflow.set_registry_uri("databricks-uc")
     
-    with mlflow.start_run() as run:
-        components = {
-            "model": model,
-            "tokenizer": tokenizer,
-        }
-        run = mlflow.transformers.log_model(
+    with mlflow.start_run() as run, tempfile.TemporaryDirectory() as tmp_dir:
+        # saving from a checkpoint path copies the files instead of loading and re-serializing the weights
+        model_dir = os.path.join(tmp_dir, "model")
+        mlflow.transformers.save_model(
+            transformers_model=checkpoint_dir,
+            path=model_dir,
             task="llm/v1/completions",
-            transformers_model=components,
             model_config=model_config,
-            artifact_path="model",
             input_example=EXAMPLE_MODEL_INPUT,
-            registered_model_name=REGISTERED_MODEL_NAME,
-            metadata={"task": "llm/v1/completions"},
+            metadata={"task": "llm/v1/completions", "checkpoint_sha256": {f: m["sha256"] for f, m in manifest.items()}},
             example_no_conversion=True, #the input example will not be converted to a Pandas DataFrame format when saving the model
         )
+        upload_directory(model_dir, partial(mlflow.MlflowClient().log_artifact, run.info.run_id), "model")
+        mlflow.register_model(f"runs:/{run.info.run_id}/model", REGISTERED_MODEL_NAME)
 
 
 if __name__ == "__main__":
@@ -82,7 +99,7 @@ if __name__ == "__main__":
 
 # COMMAND ----------
 
-import mlflow.pyfunc
+from text2sql_rag_model.model_deployment import artifact_cache
 from text2sql_rag_model.model_deployment.utils import get_latest_model_version
 
 # Name of the registered MLflow model
@@ -90,7 +107,8 @@ registered_model_name = f"{CATALOG}.{SCHEMA}.{MODEL_NAME}"
 
 
 lastest_version = get_latest_model_version(registered_model_name)
-loaded_model = mlflow.pyfunc.load_model(f"models:/{registered_model_name}/{lastest_version}")
+# served from the local artifact cache, reloading the same version doesn't download the weights again
+loaded_model = artifact_cache.load_model(f"models:/{registered_model_name}/{lastest_version}")
 # Make a prediction using the loaded model
 prediction = loaded_model.predict(
     {
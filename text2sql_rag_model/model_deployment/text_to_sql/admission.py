@@ -0,0 +1,246 @@
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+# dequeue order, interactive requests always go first
+PRIORITIES = (INTERACTIVE, BATCH)
+
+
+class AdmissionRejected(Exception):
+    """The request was shed because its queue is full or its estimated wait exceeds the SLO."""
+
+    def __init__(self, message, retry_after_s):
+        super().__init__(message)
+        self.retry_after_s = retry_after_s
+
+
+class DeadlineExceeded(Exception):
+    """The caller's deadline passed while the request was queued, its work was dropped."""
+
+
+class InvalidRequest(ValueError):
+    """The request's priority or timeout_s isn't valid, the client has to fix its request."""
+
+
+def _missing(value):
+    # absent fields of a pandas input are None or NaN
+    return value is None or value == "" or (isinstance(value, float) and math.isnan(value))
+
+
+# request params of the logged model signature, with their defaults: an empty priority is chosen from the number of
+# rows and a timeout of 0 means no deadline. Serving requests pass them as {"params": {"priority": ..., ...}}
+REQUEST_PARAMS = {"priority": "", "timeout_s": 0.0}
+
+
+def request_options(record, num_rows=1, params=None):
+    """
+    Priority class and deadline of a request from its "priority" and "timeout_s" params, or the optional fields of
+    the same name of its input.
+
+    Without a priority, single-question requests are interactive. Multi-row inputs (spark_udf or batch scoring)
+    are always batch, whatever priority they ask for, so that a large payload can't bypass the batch limits.
+    timeout_s is the caller's client timeout in seconds, a number or a numeric string, the deadline is
+    time.monotonic() based.
+
+    Raises:
+        InvalidRequest: if the priority is unknown or timeout_s isn't a number
+    """
+    params = params or {}
+    priority = params.get("priority")
+    if _missing(priority):
+        priority = record.get("priority")
+    if _missing(priority):
+        priority = INTERACTIVE
+    if not isinstance(priority, str) or priority.strip().lower() not in PRIORITIES:
+        raise InvalidRequest(f"Unknown priority {priority!r}, expected one of {PRIORITIES}")
+    priority = priority.strip().lower() if num_rows == 1 else BATCH
+
+    timeout_s = params.get("timeout_s")
+    if _missing(timeout_s) or timeout_s == 0:
+        timeout_s = record.get("timeout_s")
+    if _missing(timeout_s):
+        return priority, None
+    try:
+        timeout_s = float(timeout_s)
+    except (TypeError, ValueError):
+        raise InvalidRequest(f"timeout_s must be a number of seconds, got {timeout_s!r}") from None
+    if math.isnan(timeout_s) or timeout_s <= 0:
+        return priority, None
+    return priority, time.monotonic() + timeout_s
+
+
+class AdmissionController:
+    """
+    Bounded priority queues in front of the model's request handling.
+
+    At most max_concurrency requests run at once, of which at most max_batch_concurrency batch requests, so batch
+    jobs can't take the capacity interactive users need. Queued interactive requests are always started first.
+    A request is rejected immediately, with a retry-after, when its queue is full or when its estimated queue wait
+    exceeds the SLO of its class (or the time left before its deadline). A queued request whose deadline passes is
+    dropped before any work is done for it.
+
+    A slot is held per request, so the rows of multi-row (batch) requests run through `map_rows`, whose pool is
+    shared by every request: at most max_batch_concurrency rows run at once however many batch requests hold a
+    slot, and batch work never takes more than its share of the LLM and vector search capacity.
+
+    The wait estimate uses exponentially weighted averages of the observed duration per row of each priority, so
+    a long multi-row batch request doesn't inflate the estimates of interactive requests.
+    """
+
+    def __init__(
+        self,
+        max_concurrency=16,
+        max_batch_concurrency=8,
+        max_queue=None,
+        slo_s=None,
+        initial_service_s=2.0,
+        ewma_alpha=0.2,
+    ):
+        """
+        Args:
+            max_concurrency (int): requests running at once, about the concurrency of the LLM endpoints behind the
+                model, see `evaluation.endpoint_pool_size`
+            max_batch_concurrency (int): batch requests running at once, the rest is reserved for interactive ones
+            max_queue (dict, optional): {priority: queued requests}, defaults to 32 interactive and 128 batch
+            slo_s (dict, optional): {priority: longest acceptable queue wait}, defaults to 10s interactive and
+                300s batch
+            initial_service_s (float): duration per row assumed until durations are observed
+            ewma_alpha (float): weight of the latest duration in the averages
+        """
+        self.max_concurrency = max_concurrency
+        self.max_batch_concurrency = min(max_batch_concurrency, max_concurrency)
+        self.max_queue = {INTERACTIVE: 32, BATCH: 128, **(max_queue or {})}
+        self.slo_s = {INTERACTIVE: 10.0, BATCH: 300.0, **(slo_s or {})}
+        # seconds per row, by priority
+        self.service_s = {priority: initial_service_s for priority in PRIORITIES}
+        self.ewma_alpha = ewma_alpha
+        self._init_runtime()
+
+    def _init_runtime(self):
+        self._lock = threading.Lock()
+        self._queues = {priority: deque() for priority in PRIORITIES}
+        self._running = {priority: 0 for priority in PRIORITIES}
+        self._row_executor = ThreadPoolExecutor(max_workers=self.max_batch_concurrency)
+        self.stats = {priority: {"admitted": 0, "rejected": 0, "expired": 0} for priority in PRIORITIES}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for key in ("_lock", "_queues", "_running", "_row_executor", "stats"):
+            state.pop(key)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_runtime()
+
+    def _can_run(self, priority):
+        if sum(self._running.values()) >= self.max_concurrency:
+            return False
+        return priority == INTERACTIVE or self._running[BATCH] < self.max_batch_concurrency
+
+    def _ahead(self, priority):
+        """Priorities of the queues whose requests start before a new request of this priority."""
+        return PRIORITIES[: PRIORITIES.index(priority) + 1]
+
+    def _estimated_wait_s(self, priority):
+        ahead = self._ahead(priority)
+        if not any(self._queues[p] for p in ahead) and self._can_run(priority):
+            return 0.0
+        slots = self.max_concurrency if priority == INTERACTIVE else self.max_batch_concurrency
+        # queued work spread over the slots, plus about one row of a running request to free a slot
+        queued_s = sum(rows * self.service_s[p] for p in ahead for _, rows in self._queues[p])
+        return queued_s / slots + self.service_s[priority]
+
+    def estimated_wait_s(self, priority=INTERACTIVE):
+        """Estimated queue wait of a request arriving now."""
+        with self._lock:
+            return self._estimated_wait_s(priority)
+
+    def queue_depths(self):
+        with self._lock:
+            return {priority: len(queue) for priority, queue in self._queues.items()}
+
+    def _release(self, priority, duration_s=None, rows=1):
+        with self._lock:
+            self._running[priority] -= 1
+            if duration_s is not None:
+                self.service_s[priority] += self.ewma_alpha * (duration_s / max(rows, 1) - self.service_s[priority])
+            for next_priority in PRIORITIES:
+                queue = self._queues[next_priority]
+                while queue and self._can_run(next_priority):
+                    self._running[next_priority] += 1
+                    queue.popleft()[0].set()
+
+    def _count(self, priority, key):
+        with self._lock:
+            self.stats[priority][key] += 1
+
+    @contextmanager
+    def admit(self, priority=INTERACTIVE, deadline=None, rows=1):
+        """
+        Run the block once the request holds a slot.
+
+        Args:
+            priority (str): INTERACTIVE or BATCH
+            deadline (float, optional): time.monotonic() after which the caller has given up
+            rows (int): rows (questions) of the request
+
+        Raises:
+            AdmissionRejected: immediately, if the queue is full or the estimated wait exceeds the SLO or deadline
+            DeadlineExceeded: if the deadline passes while the request is queued
+        """
+        if priority not in PRIORITIES:
+            raise InvalidRequest(f"Unknown priority {priority}, expected one of {PRIORITIES}")
+
+        waiter = None
+        with self._lock:
+            wait_s = self._estimated_wait_s(priority)
+            budget_s = self.slo_s[priority]
+            if deadline is not None:
+                budget_s = min(budget_s, deadline - time.monotonic())
+                if budget_s <= 0:
+                    self.stats[priority]["expired"] += 1
+                    raise DeadlineExceeded("Deadline passed before the request was admitted, request dropped")
+            if wait_s == 0.0:
+                self._running[priority] += 1
+            elif len(self._queues[priority]) >= self.max_queue[priority] or wait_s > budget_s:
+                self.stats[priority]["rejected"] += 1
+                raise AdmissionRejected(
+                    f"Overloaded: estimated {priority} queue wait {wait_s:.1f}s, retry after {math.ceil(wait_s)}s",
+                    retry_after_s=math.ceil(wait_s),
+                )
+            else:
+                waiter = threading.Event()
+                self._queues[priority].append((waiter, rows))
+
+        if waiter is not None:
+            timeout_s = None if deadline is None else max(deadline - time.monotonic(), 0.0)
+            if not waiter.wait(timeout_s):
+                with self._lock:
+                    granted = waiter.is_set()
+                    if not granted:
+                        self._queues[priority].remove((waiter, rows))
+                    self.stats[priority]["expired"] += 1
+                if granted:
+                    # granted just as the deadline passed, hand the slot to the next request
+                    self._release(priority)
+                raise DeadlineExceeded(f"Deadline passed after queueing {timeout_s:.1f}s, request dropped")
+
+        self._count(priority, "admitted")
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(priority, time.monotonic() - start, rows)
+
+    def map_rows(self, fn, rows):
+        """
+        [fn(row) for row in rows], computed concurrently on the shared row pool of max_batch_concurrency threads.
+        """
+        return list(self._row_executor.map(fn, rows))
@@ -0,0 +1,137 @@
+import sqlite3
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import sqlglot
+from sqlglot.errors import SqlglotError
+
+from text2sql_rag_model.model_deployment.text_to_sql.sql_validation import SQL_DIALECT, parse_schema
+
+
+# stop a candidate that runs longer than this on the local replica, e.g. a cross join on sampled rows
+CANDIDATE_TIMEOUT_S = 2.0
+# rows of each table shipped with the model and loaded into the replica, enough for candidates to disagree on
+# their results while keeping the replica build well under CANDIDATE_TIMEOUT_S
+SAMPLE_ROWS_PER_TABLE = 20
+
+
+def _quote(identifier):
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def _sqlite_value(value):
+    # NaN and NaT are the only values different from themselves
+    if value is None or value != value:
+        return None
+    if isinstance(value, (str, bytes, int, float)):
+        return value
+    if isinstance(value, Decimal):
+        return float(value)
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+def sample_rows_of(df):
+    """
+    Rows of a sampled table as {column: value} dicts of types SQLite can store, e.g. decimals become floats and
+    timestamps ISO strings.
+    """
+    return [{column: _sqlite_value(value) for column, value in row.items()} for row in df.to_dict("records")]
+
+
+def build_sqlite_replica(create_table_statements, sample_rows=None):
+    """
+    Create an in-memory SQLite replica of the retrieved schema.
+
+    Columns are created untyped, SQLite keeps the type of whatever value is inserted.
+
+    Args:
+        create_table_statements (list): Databricks CREATE TABLE statements
+        sample_rows (dict, optional): {table_name: list of {column: value} dicts} to load into the replica.
+            Tables without samples are left empty.
+
+    Returns:
+        sqlite3.Connection: connection to the replica
+    """
+    connection = sqlite3.connect(":memory:", check_same_thread=False)
+    sample_rows = {name.split(".")[-1].lower(): rows for name, rows in (sample_rows or {}).items()}
+    for table, columns in parse_schema(create_table_statements).items():
+        columns = sorted(columns)
+        connection.execute(f"CREATE TABLE {_quote(table)} ({', '.join(_quote(c) for c in columns)})")
+        rows = sample_rows.get(table, [])
+        if rows:
+            connection.executemany(
+                f"INSERT INTO {_quote(table)} VALUES ({', '.join('?' for _ in columns)})",
+                [[{k.lower(): v for k, v in row.items()}.get(c) for c in columns] for row in rows],
+            )
+    connection.commit()
+    return connection
+
+
+def execute_candidate(sql, create_table_statements, sample_rows=None, timeout_s=CANDIDATE_TIMEOUT_S):
+    """
+    Run one candidate against its own replica.
+
+    Returns:
+        tuple: (result, error) where result is an order-insensitive signature of the returned rows,
+        and error is the exception message or None
+    """
+    try:
+        sqlite_sql = sqlglot.transpile(sql, read=SQL_DIALECT, write="sqlite")[0]
+    except SqlglotError as e:
+        return None, str(e)
+
+    connection = build_sqlite_replica(create_table_statements, sample_rows)
+    deadline = time.perf_counter() + timeout_s
+    # a non-zero return value interrupts the running statement
+    connection.set_progress_handler(lambda: int(time.perf_counter() > deadline), 10000)
+    try:
+        rows = connection.execute(sqlite_sql).fetchall()
+        return tuple(sorted(Counter(map(repr, rows)).items())), None
+    except sqlite3.Error as e:
+        return None, str(e)
+    finally:
+        connection.close()
+
+
+def select_candidate(candidates, create_table_statements, sample_rows=None, max_workers=None):
+    """
+    Pick the best of several generated queries by executing them against a local replica.
+
+    Candidates that fail to execute are discarded. Among those that succeed, the one whose result
+    is shared by the most candidates wins, ties going to the candidate the LLM ranked first.
+    If every candidate fails, the first candidate is returned so downstream validation can repair it.
+
+    Without sample_rows the replica is empty and nearly every query returns the same (empty) result, so the
+    selection is only an executability filter: the first candidate that runs wins.
+
+    Args:
+        candidates (list): generated SQL strings, in the order returned by the LLM
+        create_table_statements (list): Databricks CREATE TABLE statements of the retrieved tables
+        sample_rows (dict, optional): sampled rows to load into the replica, see `build_sqlite_replica`
+        max_workers (int, optional): number of candidates executed in parallel. Defaults to one per candidate.
+
+    Returns:
+        str: the selected SQL
+    """
+    candidates = [c for c in candidates if c]
+    if len(candidates) <= 1:
+        return candidates[0] if candidates else ""
+
+    with ThreadPoolExecutor(max_workers=max_workers or len(candidates)) as executor:
+        outcomes = list(
+            executor.map(lambda sql: execute_candidate(sql, create_table_statements, sample_rows), candidates)
+        )
+
+    results = [result for result, error in outcomes if error is None]
+    if not results:
+        return candidates[0]
+    votes = Counter(results)
+    for sql, (result, error) in zip(candidates, outcomes):
+        if error is None and votes[result] == max(votes.values()):
+            return sql
@@ -3,4 +3,6 @@ CATALOG = "asong_dev"
 SCHEMA = "llms"
 MODEL_NAME = "text2sqlrag" 
 REGISTERED_MODEL_NAME = f"{CATALOG}.{SCHEMA}.{MODEL_NAME}"
-ENDPOINT_NAME = f"{MODEL_NAME}_asong"
\ No newline at end of file
+ENDPOINT_NAME = f"{MODEL_NAME}_asong"
+# written by model_deployment/size_model_endpoint.py, overrides the default endpoint sizing when present
+SIZING_CONFIG_PATH = "endpoint_sizing.json"
@@ -11,7 +11,9 @@ import mlflow
 from mlflow import MlflowClient
 
 from mlflow.deployments import get_deploy_client
-from config import CATALOG, SCHEMA, MODEL_NAME, REGISTERED_MODEL_NAME, ENDPOINT_NAME
+from text2sql_rag_model.model_deployment.endpoint_warmup import TEXT2SQL_WARMUP_PAYLOADS
+from text2sql_rag_model.model_deployment.text_to_sql.schema_snapshot import SCHEMA_SNAPSHOT_ENV_VAR
+from config import CATALOG, SCHEMA, MODEL_NAME, REGISTERED_MODEL_NAME, ENDPOINT_NAME, SIZING_CONFIG_PATH
 
 
 latest_model_version = get_latest_model_version(REGISTERED_MODEL_NAME)
@@ -23,7 +25,12 @@ deployment_config = {
             "entity_version": latest_model_version,
             "workload_size": "Small",
             "scale_to_zero_enabled": True,
-            "environment_vars": {"DATABRICKS_HOST": host, "DATABRICKS_TOKEN": mlflow.utils.databricks_utils.get_databricks_host_creds().token}
+            "environment_vars": {
+                "DATABRICKS_HOST": host,
+                "DATABRICKS_TOKEN": mlflow.utils.databricks_utils.get_databricks_host_creds().token,
+                # serving replicas search a local schema snapshot hot reloaded on index syncs
+                SCHEMA_SNAPSHOT_ENV_VAR: "true",
+            }
         }
     ],
     # "auto_capture_config": {
@@ -35,7 +42,12 @@ deployment_config = {
 
 
 def main():
-    create_or_update_model_endpoint(name=ENDPOINT_NAME, config=deployment_config)
+    create_or_update_model_endpoint(
+        name=ENDPOINT_NAME,
+        config=deployment_config,
+        sizing_config_path=SIZING_CONFIG_PATH,
+        warmup_payloads=TEXT2SQL_WARMUP_PAYLOADS,
+    )
 
 if __name__ == "__main__":
     main()
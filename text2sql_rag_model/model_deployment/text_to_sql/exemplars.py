@@ -0,0 +1,181 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from text2sql_rag_model.model_deployment.text_to_sql.sql_validation import validate_sql
+from text2sql_rag_model.vector_db.embedding_store import EmbeddingStore
+
+
+def estimate_tokens(text):
+    """Rough token count of English and SQL text, about 4 characters per token."""
+    return len(text) // 4 + 1
+
+
+def select_within_budget(blocks, budget_tokens, min_blocks=0):
+    """
+    Keep the longest prefix of `blocks` (ordered by priority) whose estimated tokens fit in the budget.
+
+    Returns:
+        tuple: (kept blocks, tokens left in the budget)
+    """
+    kept = []
+    for block in blocks:
+        tokens = estimate_tokens(block)
+        if tokens > budget_tokens and len(kept) >= min_blocks:
+            break
+        kept.append(block)
+        budget_tokens -= tokens
+    return kept, budget_tokens
+
+
+def format_exemplar(exemplar):
+    return f"Question: {exemplar['question']}\nSQL: {exemplar['sql']}\n"
+
+
+class EndpointEmbedder:
+    """Embed texts with an embedding serving endpoint, e.g. the one the schema index is built with."""
+
+    def __init__(self, client, endpoint, batch_size=150, rate_limiter=None):
+        """
+        Args:
+            client: deployment client with a `predict(endpoint, inputs)` method
+            endpoint (str): embedding endpoint name, e.g. "databricks-bge-large-en"
+            batch_size (int): texts per request
+            rate_limiter (RateLimiter, optional): paces requests and retries 429s, see `vector_db.rate_limiter`
+        """
+        self.client = client
+        self.endpoint = endpoint
+        self.batch_size = batch_size
+        self.rate_limiter = rate_limiter
+
+    def __call__(self, texts):
+        """Returns a float32 matrix with one embedding per text."""
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            inputs = {"input": texts[start : start + self.batch_size]}
+            if self.rate_limiter is None:
+                response = self.client.predict(endpoint=self.endpoint, inputs=inputs)
+            else:
+                response = self.rate_limiter.call(self.client.predict, endpoint=self.endpoint, inputs=inputs)
+            vectors.extend(item["embedding"] for item in response["data"])
+        return np.asarray(vectors, dtype=np.float32)
+
+
+class CachedEmbedder:
+    """
+    LRU cache of embeddings by text hash in front of an embedding function.
+
+    A call embeds the texts not cached yet in one batched call, so embedding the questions of a whole request batch
+    up front makes every later lookup of the request a cache hit.
+    """
+
+    def __init__(self, embed, maxsize=10_000):
+        """
+        Args:
+            embed (callable): list of texts -> embedding matrix, e.g. `EndpointEmbedder`
+            maxsize (int): embeddings kept
+        """
+        self.embed = embed
+        self.maxsize = maxsize
+        self._init_runtime()
+
+    def _init_runtime(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "calls": 0}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for key in ("_entries", "_lock", "stats"):
+            state.pop(key)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_runtime()
+
+    @staticmethod
+    def _key(text):
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def __call__(self, texts):
+        """Returns a float32 matrix with one embedding per text."""
+        keys = [self._key(text) for text in texts]
+        with self._lock:
+            cached = {}
+            for key in keys:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    cached[key] = self._entries[key]
+            missing = {key: text for key, text in zip(keys, texts) if key not in cached}
+            self.stats["hits"] += len(keys) - len(missing)
+            self.stats["misses"] += len(missing)
+        if missing:
+            # embedded outside the lock, in one call for every missing text
+            vectors = self.embed(list(missing.values()))
+            with self._lock:
+                self.stats["calls"] += 1
+                for key, vector in zip(missing, vectors):
+                    cached[key] = self._entries[key] = np.asarray(vector, dtype=np.float32)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return np.stack([cached[key] for key in keys]) if keys else np.empty((0, 0), dtype=np.float32)
+
+
+class ExemplarStore:
+    """
+    Validated question/SQL pairs searchable by question similarity, for few-shot prompts.
+
+    Question embeddings are computed once when the store is built and kept in a local `EmbeddingStore`,
+    so a lookup costs one matrix multiply and the store ships with the pickled model.
+    """
+
+    def __init__(self, questions, sqls, embeddings, dtype="float16"):
+        """
+        Args:
+            questions (list): past user questions
+            sqls (list): validated SQL answering each question
+            embeddings (np.ndarray): question embeddings, one row per question
+            dtype (str): storage representation of the embeddings, see `EmbeddingStore`
+        """
+        self.questions = list(questions)
+        self.sqls = list(sqls)
+        self.store = EmbeddingStore(list(range(len(self.questions))), embeddings, dtype=dtype) if self.questions else None
+
+    @classmethod
+    def build(cls, questions, sqls, embed, schema=None, dtype="float16"):
+        """
+        Build a store from historical queries, keeping only pairs whose SQL passes `validate_sql`.
+
+        Args:
+            questions (list): past user questions
+            sqls (list): SQL answering each question
+            embed (callable): list of texts -> embedding matrix, e.g. `EndpointEmbedder`
+            schema (dict, optional): schema to validate against, see `parse_schema`
+            dtype (str): storage representation of the embeddings
+        """
+        pairs = [(q, s) for q, s in zip(questions, sqls) if q and s and validate_sql(s, schema) is None]
+        if not pairs:
+            return cls([], [], np.empty((0, 0), dtype=np.float32), dtype)
+        valid_questions, valid_sqls = zip(*pairs)
+        return cls(valid_questions, valid_sqls, embed(list(valid_questions)), dtype)
+
+    def __len__(self):
+        return len(self.questions)
+
+    def search(self, query_vector, k=3, min_score=0.5):
+        """
+        Returns:
+            list: up to k {"question", "sql", "score"} dicts with a similarity of at least min_score,
+                most similar first
+        """
+        if self.store is None:
+            return []
+        indices, scores = self.store.search_indices(query_vector, k)
+        return [
+            {"question": self.questions[i], "sql": self.sqls[i], "score": float(score)}
+            for i, score in zip(indices[0], scores[0])
+            if score >= min_score
+        ]
@@ -1,6 +1,7 @@
 # Databricks notebook source
 !pip install databricks-vectorsearch
 !pip install -U mlflow
+!pip install "sqlglot>=23.0.0,<31"
 dbutils.library.restartPython()
 
 # COMMAND ----------
@@ -10,21 +11,107 @@ import pandas as pd
 from mlflow.deployments import get_deploy_client
 from databricks.vector_search.client import VectorSearchClient
 from mlflow.models import infer_signature
+from mlflow.exceptions import MlflowException
+from mlflow.protos.databricks_pb2 import DEADLINE_EXCEEDED, INVALID_PARAMETER_VALUE, REQUEST_LIMIT_EXCEEDED
 import sys
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import text2sql_rag_model
+from text2sql_rag_model.model_deployment.text_to_sql.admission import (
+    AdmissionController,
+    AdmissionRejected,
+    DeadlineExceeded,
+    InvalidRequest,
+    REQUEST_PARAMS,
+    request_options,
+)
+from text2sql_rag_model.model_deployment.text_to_sql.candidate_selection import (
+    SAMPLE_ROWS_PER_TABLE,
+    sample_rows_of,
+    select_candidate,
+)
+from text2sql_rag_model.model_deployment.text_to_sql.exemplars import (
+    CachedEmbedder,
+    EndpointEmbedder,
+    ExemplarStore,
+    format_exemplar,
+    select_within_budget,
+)
+from text2sql_rag_model.model_deployment.text_to_sql.resilient_invoker import ResilientInvoker
+from text2sql_rag_model.model_deployment.text_to_sql.routing import LARGE, SMALL, QueryRouter, mean_token_logprob
+from text2sql_rag_model.model_deployment.text_to_sql.schema_snapshot import (
+    SCHEMA_COLUMNS,
+    SCHEMA_SNAPSHOT_ENV_VAR,
+    SchemaSnapshot,
+    SnapshotRefresher,
+    embedding_endpoint_name,
+    embedding_source_column,
+    index_version,
+    scan_rows,
+    snapshot_enabled,
+)
+from text2sql_rag_model.model_deployment.text_to_sql.single_flight import SingleFlight, normalize_question
+from text2sql_rag_model.model_deployment.text_to_sql.sql_validation import (
+    build_repair_prompt,
+    extract_sql,
+    parse_schema,
+    validate_sql,
+)
+from text2sql_rag_model.vector_db.rate_limiter import limiter
 
 
 EXAMPLE_QUESTION="Return the maximum and minimum number of cows across all farms."
 EXAMPLE_MODEL_INPUT = {"prompt": [EXAMPLE_QUESTION]} 
 VSC_INDEX = {"endpoint_name": "one-env-shared-endpoint-0", "index_name": "asong_demo.data.table_metadata_index"}
 LLM_ENDPOINT="va_sqlcoder_7b_2"
+# secondary deployment of sqlcoder, used when LLM_ENDPOINT errors or times out
+FALLBACK_LLM_ENDPOINT="sqlcoder_7b_asong"
+# smaller, faster completions endpoint tried first for simple questions, e.g. a sqlcoder 1b/3b deployment.
+# routing is disabled while None and every question goes to LLM_ENDPOINT
+SMALL_LLM_ENDPOINT=None
 REGISTERED_MODEL_NAME = "asong_dev.llms.text2sqlrag"
+# maximum end-to-end seconds for a request before we stop re-prompting the LLM to repair invalid SQL
+REPAIR_LATENCY_BUDGET_S = 20
+# validated historical question/SQL pairs (question, sql) used as few-shot exemplars, the prompt is zero-shot if missing
+EXEMPLAR_TABLE = "asong_dev.llms.text2sql_exemplars"
+# schema of the tables described by the schema index, sampled into the replica SQL candidates are executed against
+SAMPLE_SCHEMA = "asong_demo.data"
+# embedding endpoint of the schema index, questions are embedded with it once and the vector is used for the schema
+# and exemplar searches. The model checks it against the endpoint the index reports when it is built
+EMBEDDING_ENDPOINT = "databricks-bge-large-en"
+# maximum estimated tokens of retrieved tables and exemplars in the prompt, tables are kept first
+PROMPT_TOKEN_BUDGET = 1500
+# seconds between checks of the schema index's source table version by a serving replica, a synced index is
+# copied into a new local snapshot in the background and swapped in. None searches the index on every request.
+# Only replicas with SCHEMA_SNAPSHOT_ENV_VAR set keep a snapshot, see deploy_model_endpoint
+SCHEMA_REFRESH_INTERVAL_S = 60
+# same range as requirements.txt: exp.Query, used to validate generated SQL, exists since 23.0 and the dialect
+# APIs change between major versions
+SQLGLOT_REQUIREMENT = "sqlglot>=23.0.0,<31"
+# ship the package with the model so helper modules are importable in the serving container
+CODE_PATH = [os.path.dirname(text2sql_rag_model.__file__)]
 
 host = "https://" + spark.conf.get("spark.databricks.workspaceUrl")
 # os.environ['DATABRICKS_TOKEN']=mlflow.utils.databricks_utils.get_databricks_host_creds().token
 
 class TextToSQLRAGModel(mlflow.pyfunc.PythonModel):
-    def __init__(self, vsc_index, llm_endpoint="sqlcoder_7b"):
+    def __init__(
+        self,
+        vsc_index,
+        llm_endpoint="sqlcoder_7b",
+        repair_latency_budget_s=REPAIR_LATENCY_BUDGET_S,
+        fallback_llm_endpoint=None,
+        small_llm_endpoint=None,
+        exemplar_store=None,
+        embedding_endpoint=EMBEDDING_ENDPOINT,
+        prompt_token_budget=PROMPT_TOKEN_BUDGET,
+        num_exemplars=3,
+        admission_controller=None,
+        schema_refresh_interval_s=SCHEMA_REFRESH_INTERVAL_S,
+        sample_rows=None,
+    ):
         """
         Initialize the TextToSQLRAGModel.
 
@@ -33,26 +120,129 @@ class TextToSQLRAGModel(mlflow.pyfunc.PythonModel):
             - endpoint_name (str): The name of the Vector Search endpoint.
             - index_name (str): The name of the index in the Vector Search endpoint.
         llm_endpoint (str, optional): The name of the Language Model endpoint. Defaults to "sqlcoder_7b".
+        repair_latency_budget_s (float, optional): Latency budget in seconds within which an invalid
+            generated query is re-prompted once with the validation error. Defaults to REPAIR_LATENCY_BUDGET_S.
+        fallback_llm_endpoint (str, optional): The name of a secondary Language Model endpoint, called when
+            llm_endpoint errors or doesn't answer within its adaptive timeout. Defaults to None.
+        small_llm_endpoint (str, optional): The name of a smaller, faster Language Model endpoint. When set, simple
+            questions are answered by it first and escalated to llm_endpoint on invalid or low confidence SQL.
+            Defaults to None.
+        exemplar_store (ExemplarStore, optional): Validated question/SQL pairs. The most similar ones are added to
+            the prompt as few-shot examples. Defaults to None (zero-shot).
+        embedding_endpoint (str, optional): The name of the embedding endpoint the schema index is built with. Each
+            question is embedded once with it and the vector is reused by the schema and exemplar searches.
+            Raises a ValueError if the index reports a different endpoint. Defaults to EMBEDDING_ENDPOINT.
+        prompt_token_budget (int, optional): Maximum estimated tokens of retrieved tables and exemplars in the prompt.
+            Defaults to PROMPT_TOKEN_BUDGET.
+        num_exemplars (int, optional): Maximum number of exemplars in the prompt. Defaults to 3.
+        admission_controller (AdmissionController, optional): Bounded interactive and batch queues in front of
+            predict, shedding load with a retry-after when the estimated queue wait exceeds the SLO. Defaults to
+            AdmissionController().
+        schema_refresh_interval_s (float, optional): Seconds between checks of the schema index's source table
+            version once the model is loaded by a serving replica (SCHEMA_SNAPSHOT_ENV_VAR set to "true"). The
+            index is searched from a local snapshot rebuilt in the background whenever the index syncs a new
+            version, and with similarity_search until the first snapshot is ready and in every other process
+            (Spark workers, validation). None always uses similarity_search. Defaults to SCHEMA_REFRESH_INTERVAL_S.
+        sample_rows (dict, optional): {table name: list of {column: value} dicts} loaded into the local replica
+            that several generated candidates are executed against, see load_sample_rows. Defaults to None, the
+            replica is empty and candidates are only checked to execute.
         """
         self.llm_endpoint = llm_endpoint
+        self.repair_latency_budget_s = repair_latency_budget_s
         self.client = get_deploy_client("databricks")
+        # hedges slow calls and fails over to the secondary endpoint, see ResilientInvoker
+        self.llm = ResilientInvoker(self.client, [llm_endpoint, fallback_llm_endpoint])
+        self.small_llm = ResilientInvoker(self.client, [small_llm_endpoint]) if small_llm_endpoint else None
+        self.router = QueryRouter()
         self.vsc = VectorSearchClient(disable_notice=True,
                                       workspace_url=host, 
                                       personal_access_token=mlflow.utils.databricks_utils.get_databricks_host_creds().token)
         self.vsc_endpoint = vsc_index.get("endpoint_name")
         self.index_name = vsc_index.get("index_name")
         self.index = self.vsc.get_index(self.vsc_endpoint, self.index_name)
+        # vector search and embedding calls of every worker on the node share one rate limit per API family
+        self.vector_search_api = limiter("vector_search_query")
+        # question vectors are only comparable to the index's if both come from the same embedding model
+        index_embedding_endpoint = embedding_endpoint_name(self.vector_search_api.call(self.index.describe))
+        if index_embedding_endpoint is not None and index_embedding_endpoint != embedding_endpoint:
+            raise ValueError(
+                f"{self.index_name} is embedded with {index_embedding_endpoint}, "
+                f"but embedding_endpoint is {embedding_endpoint}"
+            )
+        self.exemplar_store = exemplar_store
+        # embeddings are cached by question hash, see CachedEmbedder
+        self.embedder = CachedEmbedder(
+            EndpointEmbedder(self.client, embedding_endpoint, rate_limiter=limiter("serving_query"))
+        )
+        self.prompt_token_budget = prompt_token_budget
+        self.num_exemplars = num_exemplars
+        # concurrent requests for the same question share one retrieval and generation, see SingleFlight
+        self.single_flight = SingleFlight()
+        self.admission = admission_controller or AdmissionController()
+        self.schema_refresh_interval_s = schema_refresh_interval_s
+        self.sample_rows = sample_rows
+        self._init_runtime()
+
+    def _init_runtime(self):
+        # schema and exemplar lookups of a request run concurrently
+        self._retrieval_executor = ThreadPoolExecutor(max_workers=16)
+        # local copy of the schema index, started by load_context so that only loaded replicas poll the index
+        self.schema_refresher = None
+        if self.schema_refresh_interval_s:
+            self.schema_refresher = SnapshotRefresher(
+                self._schema_index_version, self._load_schema_snapshot, self.schema_refresh_interval_s
+            )
+
+    def __getstate__(self):
+        # executors and the schema snapshot can't be pickled with the model, recreate them on load
+        state = self.__dict__.copy()
+        state.pop("_retrieval_executor")
+        state.pop("schema_refresher")
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_runtime()
+
+    def load_context(self, context):
+        """
+        This method starts the background refresh of the schema snapshot when the model is loaded by a serving
+        replica. Other loads, e.g. one per Spark Python worker, keep using similarity_search instead of each
+        re-embedding the whole index after every sync.
+        """
+        if self.schema_refresher is None:
+            return
+        if snapshot_enabled():
+            self.schema_refresher.start()
+        else:
+            print(f"{SCHEMA_SNAPSHOT_ENV_VAR} isn't set, searching the schema index with similarity_search")
+
+    def _schema_index_version(self):
+        """
+        This method returns the source table version the schema index last synced.
+        """
+        return index_version(self.vector_search_api.call(self.index.describe))
+
+    def _load_schema_snapshot(self, version):
+        """
+        This method copies every row of the schema index and embeds it with the index's embedding endpoint, off
+        the request path. Tables unchanged since the last snapshot hit the embedding cache.
+        """
+        source_column = embedding_source_column(self.vector_search_api.call(self.index.describe))
+        rows = scan_rows(
+            lambda **kwargs: self.vector_search_api.call(self.index.scan, **kwargs), SCHEMA_COLUMNS + [source_column]
+        )
+        return SchemaSnapshot.build(version, rows, self.embedder, source_column)
 
-    def _build_prompt(self, question):
+    def _build_prompt(self, question, database_schema, exemplars=""):
         """
-        This method generates the prompt for the model.
+        This method generates the prompt for the model, with an examples section when exemplars are given.
         """
         TASK_KEY = "### Task"
         TASK = f"Generate a SQL query to answer [QUESTION]{question}[/QUESTION]"
         DATABASE_SCHEMA_KEY = "### Database Schema"
-        DATABASE_SCHEMA = self._retrieve_database_context(
-            question
-        )  # todo retrieve from vector database
+        DATABASE_SCHEMA = database_schema
+        EXAMPLES = f"### Examples\n{exemplars}" if exemplars else ""
         ANSWER_KEY = "### Answer"
         ANSWER = f"Given the database schema, here is the SQL query that [QUESTION]{question}[/QUESTION]\n[SQL]"
 
@@ -60,37 +250,218 @@ class TextToSQLRAGModel(mlflow.pyfunc.PythonModel):
 {TASK}
 {DATABASE_SCHEMA_KEY}
 {DATABASE_SCHEMA}
-{ANSWER_KEY}
+{EXAMPLES}{ANSWER_KEY}
 {ANSWER}
         """
 
-    def _retrieve_database_context(self, question):
+    def _retrieve_database_context(self, query_vector, schema_snapshot=None):
         """
-        This method retrieves the database context for the given question.
-        """
-        results = self.index.similarity_search(
-            query_text=question,
-            columns=["TableName", "CreateTableStatement", "TableDescription"],
-            num_results=5,
-        )
+        This method retrieves the database context for the given question embedding, from the schema snapshot when
+        one is given and with similarity_search otherwise.
 
-        context = ""
-        for res in results.get("result").get("data_array"):
-            context += f"""TableName: {res[0]}
+        Returns the context of each table to put in the prompt, the retrieved CREATE TABLE statements and their
+        retrieval scores, most relevant table first. Table descriptions are the compact ones written at index build
+        time by compress_table_descriptions.
+        """
+        if schema_snapshot is not None:
+            rows = schema_snapshot.search(query_vector, k=5)
+        else:
+            results = self.vector_search_api.call(
+                self.index.similarity_search,
+                query_vector=query_vector.tolist(),
+                columns=SCHEMA_COLUMNS,
+                num_results=5,
+            )
+            rows = results.get("result").get("data_array")
+        tables = [
+            f"""TableName: {res[0]}
             CreateTableStatement: {res[1]}
             TableDescription: {res[2]}
             """
-        return context
+            for res in rows
+        ]
+        # the similarity score is appended after the requested columns
+        return tables, [res[1] for res in rows], [res[-1] for res in rows]
+
+    def _retrieve_exemplars(self, query_vector):
+        """
+        This method returns the validated question/SQL pairs most similar to the question embedding, most similar first.
+        """
+        if not self.exemplar_store:
+            return []
+        return self.exemplar_store.search(query_vector, k=self.num_exemplars)
+
+    def _retrieve_context(self, question, schema_snapshot=None):
+        """
+        This method embeds the question once, runs the schema and exemplar lookups with that vector concurrently and
+        caps their size to the prompt token budget. Tables are kept first, the most relevant table always, then
+        exemplars fill the remaining budget.
+
+        Returns the database schema and exemplars to put in the prompt, and the CREATE TABLE statements and
+        retrieval scores of the kept tables.
+        """
+        query_vector = self.embedder([question])[0]
+        exemplars_future = self._retrieval_executor.submit(self._retrieve_exemplars, query_vector)
+        tables, create_table_statements, scores = self._retrieve_database_context(query_vector, schema_snapshot)
+        exemplars = [format_exemplar(e) for e in exemplars_future.result()]
+
+        tables, remaining_tokens = select_within_budget(tables, self.prompt_token_budget, min_blocks=1)
+        exemplars, _ = select_within_budget(exemplars, remaining_tokens)
+        return "".join(tables), "".join(exemplars), create_table_statements[: len(tables)], scores[: len(tables)]
 
-    def predict(self, context, model_input):
+    def _generate_sql(self, prompt, create_table_statements, llm=None, logprobs=False):
         """
-        This method generates a prediction for the given input.
+        This method calls the LLM endpoint (the large one unless llm is given) and extracts the generated SQL,
+        the number of prompt tokens and the mean token log-probability of the SQL, if logprobs is set and the
+        endpoint returns them.
+
+        When the endpoint returns several candidates (num_return_sequences > 1), they are executed against a
+        local replica of the retrieved schema, loaded with the sampled rows, and the best one is selected.
+        """
+        inputs = {"prompt": [prompt], "logprobs": 1} if logprobs else {"prompt": [prompt]}
+        generated_response = (llm or self.llm).predict(inputs=inputs)
+        choices = generated_response["choices"]
+        candidates = [extract_sql(choice["text"]) for choice in choices]
+        prompt_tokens = generated_response.get("usage", {}).get("prompt_tokens", 0)
+        generated_sql = select_candidate(candidates, create_table_statements, self.sample_rows)
+        mean_logprob = mean_token_logprob(choices[candidates.index(generated_sql)]) if generated_sql in candidates else None
+        return generated_sql, prompt_tokens, mean_logprob
+
+    def _route_and_generate(self, question, prompt, create_table_statements, scores):
+        """
+        This method sends simple questions to the small LLM first and escalates to the large LLM when the small
+        model errors, or its SQL is invalid or low confidence. The decision and the latency saved are logged.
+
+        Returns the SQL and the number of prompt tokens spent.
+        """
+        if self.small_llm is None:
+            generated_sql, prompt_tokens, _ = self._generate_sql(prompt, create_table_statements)
+            return generated_sql, prompt_tokens
+
+        route, features = self.router.route(question, scores)
+        if route == LARGE:
+            generated_sql, prompt_tokens, _ = self._generate_sql(prompt, create_table_statements)
+            self.router.log_decision(route, features)
+            return generated_sql, prompt_tokens
+
+        small_start = time.perf_counter()
+        try:
+            generated_sql, prompt_tokens, mean_logprob = self._generate_sql(
+                prompt, create_table_statements, llm=self.small_llm, logprobs=True
+            )
+        except Exception as e:
+            # a failing or timed out small endpoint costs latency, not the request
+            generated_sql, prompt_tokens, escalation = None, 0, f"small model error: {e!r}"
+        else:
+            escalation = self.router.escalation_reason(
+                generated_sql, parse_schema(create_table_statements), mean_logprob
+            )
+        small_seconds = time.perf_counter() - small_start
+        if escalation is None:
+            # saved latency is relative to the typical latency of the large model
+            large_p50 = self.llm.trackers[self.llm.endpoints[0]].percentile(50) or small_seconds
+            self.router.log_decision(SMALL, features, latency_saved_s=large_p50 - small_seconds)
+            return generated_sql, prompt_tokens
+
+        large_sql, large_prompt_tokens, _ = self._generate_sql(prompt, create_table_statements)
+        self.router.log_decision(SMALL, features, escalation, latency_saved_s=-small_seconds)
+        return large_sql, prompt_tokens + large_prompt_tokens
+
+    def _validate_and_repair(
+        self, prompt, generated_sql, create_table_statements, start_time, generation_seconds, deadline=None
+    ):
+        """
+        This method validates the generated SQL against the retrieved schema and, if it is invalid,
+        re-prompts the LLM once with the error, provided another generation fits in the latency budget and
+        before the caller's deadline.
+
+        Returns the SQL and the number of prompt tokens spent on the repair.
+        """
+        schema = parse_schema(create_table_statements)
+        error = validate_sql(generated_sql, schema)
+        if error is None:
+            return generated_sql, 0
+
+        elapsed = time.perf_counter() - start_time
+        if elapsed + generation_seconds > self.repair_latency_budget_s:
+            print(f"generated SQL is invalid ({error}), skipping repair: latency budget exhausted")
+            return generated_sql, 0
+        if deadline is not None and time.monotonic() + generation_seconds > deadline:
+            print(f"generated SQL is invalid ({error}), skipping repair: the caller's deadline would pass")
+            return generated_sql, 0
+
+        print(f"generated SQL is invalid ({error}), re-prompting once")
+        repaired_sql, prompt_tokens, _ = self._generate_sql(
+            build_repair_prompt(prompt, generated_sql, error), create_table_statements
+        )
+        repair_error = validate_sql(repaired_sql, schema)
+        if repair_error is not None:
+            print(f"repaired SQL is still invalid ({repair_error}), returning the original query")
+            return generated_sql, prompt_tokens
+        return repaired_sql, prompt_tokens
+
+    def predict(self, context, model_input, params=None):
+        """
+        This method generates a prediction for every row of the given input, in input order.
+
+        The request goes through admission control first: the optional "priority" ("interactive" or "batch") and
+        "timeout_s" (the caller's timeout) params select its queue and deadline, e.g.
+        {"inputs": {"prompt": [...]}, "params": {"priority": "batch", "timeout_s": 60}}. An overloaded model rejects
+        the request right away with REQUEST_LIMIT_EXCEEDED (HTTP 429) and a retry-after in the message, an unknown
+        priority or a non-numeric timeout_s with INVALID_PARAMETER_VALUE (HTTP 400). Multi-row inputs are always batch.
         """
 
         # NOTE: mlflow automatically converts dict inputs to a pandas dataframes so we must
         # convert the input back to a dict. this is expected to change in mlflow 3.0
-        model_input = model_input.to_dict(orient="records")[0]
-        question = model_input["prompt"][0]
+        records = model_input.to_dict(orient="records")
+        # serving requests carry a list of prompts per row, spark_udf batches one string per row
+        questions = [r["prompt"] if isinstance(r["prompt"], str) else r["prompt"][0] for r in records]
+        try:
+            priority, deadline = request_options(records[0], len(records), params)
+        except InvalidRequest as e:
+            raise MlflowException(str(e), error_code=INVALID_PARAMETER_VALUE)
+        try:
+            with self.admission.admit(priority, deadline, rows=len(records)):
+                if len(questions) == 1:
+                    outputs = [self._answer_coalesced(questions[0], deadline)]
+                else:
+                    # one embedding call for the whole batch, the retrieval of each question then hits the cache
+                    self.embedder(list(dict.fromkeys(questions)))
+                    # the rows of all batch requests share max_batch_concurrency threads, in a separate pool from the
+                    # retrieval lookups so that they never wait on their own lookups
+                    outputs = self.admission.map_rows(lambda q: self._answer_coalesced(q, deadline), questions)
+        except AdmissionRejected as e:
+            print(f"admission: rejected {priority} request, {self.admission.stats}")
+            raise MlflowException(f"{e} (retry_after_s={e.retry_after_s})", error_code=REQUEST_LIMIT_EXCEEDED)
+        except DeadlineExceeded as e:
+            raise MlflowException(str(e), error_code=DEADLINE_EXCEEDED)
+        return {
+            "generated_sql": [generated_sql for generated_sql, _ in outputs],
+            "prompt_tokens": [prompt_tokens for _, prompt_tokens in outputs],
+        }
+
+    def _answer_coalesced(self, question, deadline=None):
+        """
+        This method answers the question, sharing one retrieval and generation with the concurrent requests for the
+        same normalized question against the same schema index version. Each request gets its own copy of the
+        result.
+        """
+        # read once, the request uses this snapshot even if a newer one is swapped in meanwhile
+        schema_snapshot = self.schema_refresher.current if self.schema_refresher is not None else None
+        schema_version = schema_snapshot.version if schema_snapshot is not None else None
+        key = (normalize_question(question), self.index_name, schema_version)
+        (generated_sql, prompt_tokens), coalesced = self.single_flight.do(
+            key, lambda: self._answer(question, deadline, schema_snapshot)
+        )
+        if coalesced:
+            print(f"coalesced with an in-flight request for the same question: {self.single_flight.stats}")
+        return generated_sql, prompt_tokens
+
+    def _answer(self, question, deadline=None, schema_snapshot=None):
+        """
+        This method generates the SQL for one question and returns it with the number of prompt tokens spent.
+        """
+        start_time = time.perf_counter()
         print(f"question:{question}")
 
         # Build the prompt
@@ -98,17 +469,19 @@ class TextToSQLRAGModel(mlflow.pyfunc.PythonModel):
         ### 
         #Brian Comment: Add a breakpoint here and log out to make sure the question isn't being reformated? 
         ###
-        prompt = self._build_prompt(question)
+        database_schema, exemplars, create_table_statements, scores = self._retrieve_context(question, schema_snapshot)
+        prompt = self._build_prompt(question, database_schema, exemplars)
 
         # Generate response
-        generated_response = self.client.predict(
-            endpoint=self.llm_endpoint, inputs={"prompt": [prompt]}
+        generation_start = time.perf_counter()
+        generated_sql, prompt_tokens = self._route_and_generate(question, prompt, create_table_statements, scores)
+        generation_seconds = time.perf_counter() - generation_start
+
+        # Validate the SQL in-process before it ever reaches a warehouse
+        generated_sql, repair_prompt_tokens = self._validate_and_repair(
+            prompt, generated_sql, create_table_statements, start_time, generation_seconds, deadline
         )
-        generated_response = generated_response["choices"][0]["text"]
-        generated_sql = generated_response[
-            generated_response.find("[SQL]\n") + 7 : generated_response.find("</s>")
-        ].strip()
-        return {"generated_sql": [generated_sql]}
+        return generated_sql, prompt_tokens + repair_prompt_tokens
 
     
 # def log_and_register_mlflow_model(model):
@@ -128,11 +501,53 @@ class TextToSQLRAGModel(mlflow.pyfunc.PythonModel):
 #             # example_no_conversion=True,
 #         )
 
+def load_exemplar_store(table_name=EXEMPLAR_TABLE, embedding_endpoint=EMBEDDING_ENDPOINT):
+    """
+    Build the exemplar store from the validated historical queries table, or return None if it doesn't exist.
+    """
+    if not spark.catalog.tableExists(table_name):
+        print(f"{table_name} doesn't exist, the model will prompt zero-shot")
+        return None
+    exemplars = spark.table(table_name).select("question", "sql").toPandas()
+    store = ExemplarStore.build(
+        exemplars["question"].tolist(),
+        exemplars["sql"].tolist(),
+        EndpointEmbedder(get_deploy_client("databricks"), embedding_endpoint, rate_limiter=limiter("serving_query")),
+    )
+    print(f"Built exemplar store with {len(store)} of {len(exemplars)} historical queries")
+    return store
+
+
+def load_sample_rows(model, schema=SAMPLE_SCHEMA, rows_per_table=SAMPLE_ROWS_PER_TABLE):
+    """
+    Read the first rows of every table in the schema index, shipped with the model so that SQL candidates are
+    compared on their results rather than on empty tables. Tables that can't be read are left empty.
+    """
+    rows = scan_rows(lambda **kwargs: model.vector_search_api.call(model.index.scan, **kwargs), ["TableName"])
+    sample_rows = {}
+    for table_name in sorted({row["TableName"] for row in rows if row["TableName"]}):
+        full_name = table_name if "." in table_name else f"{schema}.{table_name}"
+        if not spark.catalog.tableExists(full_name):
+            print(f"{full_name} doesn't exist, candidates run on an empty {table_name}")
+            continue
+        sample_rows[table_name] = sample_rows_of(spark.table(full_name).limit(rows_per_table).toPandas())
+    print(f"Sampled {sum(len(r) for r in sample_rows.values())} rows of {len(sample_rows)} tables")
+    return sample_rows
+
+
 def main():
 
-    model = TextToSQLRAGModel(vsc_index=VSC_INDEX, llm_endpoint=LLM_ENDPOINT)
+    model = TextToSQLRAGModel(
+        vsc_index=VSC_INDEX,
+        llm_endpoint=LLM_ENDPOINT,
+        fallback_llm_endpoint=FALLBACK_LLM_ENDPOINT,
+        small_llm_endpoint=SMALL_LLM_ENDPOINT,
+        exemplar_store=load_exemplar_store(),
+    )
+    model.sample_rows = load_sample_rows(model)
     prediction = model.predict(context=None,model_input=pd.DataFrame(EXAMPLE_MODEL_INPUT))
-    signature = infer_signature(EXAMPLE_MODEL_INPUT, prediction)
+    # priority and timeout_s are optional request params, extra input columns would be dropped by the signature
+    signature = infer_signature(EXAMPLE_MODEL_INPUT, prediction, params=REQUEST_PARAMS)
     
     mlflow.set_registry_uri("databricks-uc")
     # mlflow.set_experiment("Workspace/Users/april@databricks.com/sqlcoder-7b")
@@ -144,6 +559,8 @@ def main():
             input_example=EXAMPLE_MODEL_INPUT,
             signature=signature,
             registered_model_name=REGISTERED_MODEL_NAME, 
+            code_path=CODE_PATH,
+            extra_pip_requirements=[SQLGLOT_REQUIREMENT],
             # example_no_conversion=True,
         )
 
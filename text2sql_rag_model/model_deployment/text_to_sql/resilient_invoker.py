@@ -0,0 +1,235 @@
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+
+from text2sql_rag_model.vector_db.rate_limiter import is_rate_limited
+
+
+# status in the message of requests' HTTPError and of MLflow REST errors
+_STATUS_PATTERN = re.compile(r"\b([1-5]\d\d) (?:Client|Server) Error|error code (\d{3})|status_code (\d{3})")
+
+
+class EndpointSaturatedError(Exception):
+    """Raised when an endpoint already has the maximum number of calls outstanding, e.g. calls that timed out but
+    still hold their thread until the endpoint answers."""
+
+
+def status_code_of(error):
+    """HTTP status of a failed call, None if it didn't get a response (e.g. a connection error)."""
+    for status in (getattr(error, "status_code", None), getattr(getattr(error, "response", None), "status_code", None)):
+        if isinstance(status, int):
+            return status
+    match = _STATUS_PATTERN.search(str(error))
+    return int(next(group for group in match.groups() if group)) if match else None
+
+
+def should_fail_over(error):
+    """
+    Whether another endpoint may answer a call that failed with error: timeouts, saturated endpoints, 429 and 5xx
+    responses, and errors without a response. Other 4xx errors, e.g. a malformed request, would fail the same way.
+    """
+    if isinstance(error, (TimeoutError, EndpointSaturatedError)) or is_rate_limited(error):
+        return True
+    status = status_code_of(error)
+    return status is None or status >= 500
+
+
+class LatencyTracker:
+    """Sliding window of recent successful call latencies for one endpoint."""
+
+    def __init__(self, window=200):
+        self.window = window
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # locks can't be pickled with the model, recreate it on load
+        return {"window": self.window, "latencies": list(self._latencies)}
+
+    def __setstate__(self, state):
+        self.__init__(state["window"])
+        self._latencies.extend(state["latencies"])
+
+    def record(self, latency_s):
+        with self._lock:
+            self._latencies.append(latency_s)
+
+    def __len__(self):
+        return len(self._latencies)
+
+    def percentile(self, q):
+        """The q-th percentile of the window, or None if it is empty."""
+        with self._lock:
+            latencies = list(self._latencies)
+        return float(np.percentile(latencies, q)) if latencies else None
+
+
+class ResilientInvoker:
+    """
+    Call an LLM serving endpoint with adaptive timeouts, request hedging and failover.
+
+    * Timeouts are derived from the observed latency of each endpoint: `timeout_multiplier` times its p99,
+      clamped to [min_timeout_s, max_timeout_s]. Until `min_samples` calls have been observed, max_timeout_s applies.
+    * When a call hasn't answered after the endpoint's p95 latency, a duplicate request is sent to the same
+      endpoint (which will likely land on another replica) and the first answer wins. Hedges are capped to
+      `max_hedge_fraction` of calls, so the extra load stays bounded.
+    * If the endpoint times out, is rate limited (429) or fails (5xx, no response), the call fails over to the next
+      endpoint. Other client errors (4xx) are raised right away.
+    * A call that timed out keeps its thread until the endpoint answers, so each endpoint may only have
+      `max_outstanding` calls in flight: a hung endpoint fails fast with `EndpointSaturatedError` instead of
+      taking every thread of the pool from the other endpoints.
+    """
+
+    def __init__(
+        self,
+        client,
+        endpoints,
+        hedge_percentile=95,
+        timeout_multiplier=3.0,
+        min_timeout_s=5.0,
+        max_timeout_s=120.0,
+        max_hedge_fraction=0.1,
+        min_samples=20,
+        max_workers=32,
+        max_outstanding=None,
+    ):
+        """
+        Args:
+            client: deployment client with a `predict(endpoint, inputs)` method, e.g. `get_deploy_client("databricks")`
+            endpoints (list): endpoint names, primary first, then failover endpoints in order
+            hedge_percentile (float): latency percentile after which a hedged request is sent
+            timeout_multiplier (float): timeout as a multiple of the endpoint's p99 latency
+            min_timeout_s (float): lower bound of the adaptive timeout
+            max_timeout_s (float): upper bound of the adaptive timeout, also used until enough samples are observed
+            max_hedge_fraction (float): maximum fraction of calls that send a hedged request
+            min_samples (int): observed calls needed before timeouts adapt and hedging starts
+            max_workers (int): threads available for in-flight calls
+            max_outstanding (int, optional): calls in flight per endpoint, hedges and calls that timed out included.
+                Defaults to an equal share of max_workers per endpoint
+        """
+        self.client = client
+        self.endpoints = [e for e in endpoints if e]
+        self.hedge_percentile = hedge_percentile
+        self.timeout_multiplier = timeout_multiplier
+        self.min_timeout_s = min_timeout_s
+        self.max_timeout_s = max_timeout_s
+        self.max_hedge_fraction = max_hedge_fraction
+        self.min_samples = min_samples
+        self.max_workers = max_workers
+        self.max_outstanding = max_outstanding or max(max_workers // max(len(self.endpoints), 1), 1)
+        self.trackers = {endpoint: LatencyTracker() for endpoint in self.endpoints}
+        self._init_runtime()
+
+    def _init_runtime(self):
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        self._lock = threading.Lock()
+        self._outstanding = {endpoint: 0 for endpoint in self.endpoints}
+        self.stats = {"calls": 0, "hedges": 0, "hedge_wins": 0, "timeouts": 0, "failovers": 0, "saturated": 0}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for key in ("_executor", "_lock", "_outstanding", "stats"):
+            state.pop(key)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_runtime()
+
+    def timeout_s(self, endpoint):
+        tracker = self.trackers[endpoint]
+        if len(tracker) < self.min_samples:
+            return self.max_timeout_s
+        return min(max(self.timeout_multiplier * tracker.percentile(99), self.min_timeout_s), self.max_timeout_s)
+
+    def hedge_delay_s(self, endpoint):
+        """Seconds after which a hedged request is sent, or None if hedging isn't possible yet."""
+        tracker = self.trackers[endpoint]
+        if len(tracker) < self.min_samples:
+            return None
+        return tracker.percentile(self.hedge_percentile)
+
+    def _can_hedge(self):
+        with self._lock:
+            return self.stats["hedges"] < self.max_hedge_fraction * self.stats["calls"]
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _call(self, endpoint, inputs):
+        start = time.perf_counter()
+        response = self.client.predict(endpoint=endpoint, inputs=inputs)
+        self.trackers[endpoint].record(time.perf_counter() - start)
+        return response
+
+    def _release(self, endpoint):
+        with self._lock:
+            self._outstanding[endpoint] -= 1
+
+    def _submit(self, endpoint, inputs):
+        """Start a call, or return None if the endpoint already has max_outstanding calls in flight."""
+        with self._lock:
+            if self._outstanding[endpoint] >= self.max_outstanding:
+                return None
+            self._outstanding[endpoint] += 1
+        future = self._executor.submit(self._call, endpoint, inputs)
+        future.add_done_callback(lambda _: self._release(endpoint))
+        return future
+
+    def _invoke_endpoint(self, endpoint, inputs):
+        deadline = time.perf_counter() + self.timeout_s(endpoint)
+        primary = self._submit(endpoint, inputs)
+        if primary is None:
+            self._count("saturated")
+            raise EndpointSaturatedError(f"{endpoint} already has {self.max_outstanding} calls outstanding")
+        pending = {primary}
+
+        hedge_delay = self.hedge_delay_s(endpoint)
+        if hedge_delay is not None:
+            done, _ = wait(pending, timeout=max(min(hedge_delay, deadline - time.perf_counter()), 0))
+            if not done and self._can_hedge():
+                hedge = self._submit(endpoint, inputs)
+                if hedge is not None:
+                    self._count("hedges")
+                    pending.add(hedge)
+
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=max(deadline - time.perf_counter(), 0), return_when=FIRST_COMPLETED)
+            if not done:
+                self._count("timeouts")
+                raise TimeoutError(f"{endpoint} didn't answer within {self.timeout_s(endpoint):.1f}s")
+            for future in done:
+                if future.exception() is None:
+                    if future is not primary:
+                        self._count("hedge_wins")
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def predict(self, inputs):
+        """
+        Same as `client.predict(endpoint=..., inputs=inputs)`, trying endpoints in order until one answers.
+
+        Raises:
+            the error of the last endpoint if none of them answers, or the first error that another endpoint
+            wouldn't answer differently, see `should_fail_over`
+        """
+        self._count("calls")
+        error = None
+        for i, endpoint in enumerate(self.endpoints):
+            if i > 0:
+                self._count("failovers")
+                print(f"failing over to {endpoint} after error: {error}")
+            try:
+                return self._invoke_endpoint(endpoint, inputs)
+            except Exception as e:
+                if not should_fail_over(e):
+                    raise
+                error = e
+        raise error
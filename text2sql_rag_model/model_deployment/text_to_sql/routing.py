@@ -0,0 +1,106 @@
+import json
+import threading
+
+import numpy as np
+
+from text2sql_rag_model.model_deployment.text_to_sql.sql_validation import validate_sql
+
+
+SMALL = "small"
+LARGE = "large"
+
+
+def mean_token_logprob(choice):
+    """Mean log-probability of the generated tokens of a completion choice, or None if the endpoint didn't return them."""
+    token_logprobs = (choice.get("logprobs") or {}).get("token_logprobs")
+    if not token_logprobs:
+        return None
+    return float(np.mean([lp for lp in token_logprobs if lp is not None]))
+
+
+class QueryRouter:
+    """
+    Route simple questions to a smaller, faster LLM and escalate to the large one when its answer looks wrong.
+
+    A question is simple when it is short, and retrieval points clearly at few tables: the top table wins
+    by a margin and only a few tables score close to it. The small model's SQL is escalated when it
+    fails validation against the retrieved schema or its mean token log-probability is low.
+    """
+
+    def __init__(self, max_question_words=20, max_relevant_tables=2, relevant_score_ratio=0.9, min_score_margin=0.02, min_mean_logprob=-0.5):
+        """
+        Args:
+            max_question_words (int): longer questions go to the large model
+            max_relevant_tables (int): questions with more tables scoring within relevant_score_ratio
+                of the top score go to the large model
+            relevant_score_ratio (float): a table is relevant if its score is at least this fraction of the top score
+            min_score_margin (float): minimum gap between the top two retrieval scores for a simple question
+            min_mean_logprob (float): small model answers with a lower mean token log-probability are escalated
+        """
+        self.max_question_words = max_question_words
+        self.max_relevant_tables = max_relevant_tables
+        self.relevant_score_ratio = relevant_score_ratio
+        self.min_score_margin = min_score_margin
+        self.min_mean_logprob = min_mean_logprob
+        self._init_runtime()
+
+    def _init_runtime(self):
+        self._lock = threading.Lock()
+        self.stats = {"small": 0, "large": 0, "escalated": 0, "latency_saved_s": 0.0}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop("_lock")
+        state.pop("stats")
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_runtime()
+
+    def route(self, question, scores):
+        """
+        Args:
+            question (str): the user question
+            scores (list): retrieval scores of the retrieved tables
+
+        Returns:
+            tuple: (SMALL or LARGE, dict of the features the decision is based on)
+        """
+        scores = sorted(scores, reverse=True)
+        features = {
+            "question_words": len(question.split()),
+            "relevant_tables": sum(s >= self.relevant_score_ratio * scores[0] for s in scores) if scores else 0,
+            # None when a single table was retrieved, nothing competes with it
+            "score_margin": scores[0] - scores[1] if len(scores) > 1 else None,
+        }
+        simple = (
+            bool(scores)
+            and features["question_words"] <= self.max_question_words
+            and features["relevant_tables"] <= self.max_relevant_tables
+            and (features["score_margin"] is None or features["score_margin"] >= self.min_score_margin)
+        )
+        return (SMALL if simple else LARGE), features
+
+    def escalation_reason(self, sql, schema, mean_logprob=None):
+        """Why the small model's SQL should be regenerated by the large model, or None if it is acceptable."""
+        error = validate_sql(sql, schema)
+        if error is not None:
+            return f"invalid SQL: {error}"
+        if mean_logprob is not None and mean_logprob < self.min_mean_logprob:
+            return f"low confidence: mean token logprob {mean_logprob:.2f}"
+        return None
+
+    def log_decision(self, route, features, escalation=None, latency_saved_s=0.0):
+        """Print the routing decision as a JSON line and update the counters."""
+        with self._lock:
+            self.stats[route] += 1
+            if escalation:
+                self.stats["escalated"] += 1
+            self.stats["latency_saved_s"] += latency_saved_s
+        print(
+            "routing: "
+            + json.dumps(
+                {"route": route, "escalation": escalation, "latency_saved_s": round(latency_saved_s, 3), **features}
+            )
+        )
@@ -0,0 +1,215 @@
+import os
+import threading
+
+import numpy as np
+
+from text2sql_rag_model.vector_db.description_compression import COMPACT_DESCRIPTION_COLUMN
+from text2sql_rag_model.vector_db.embedding_store import EmbeddingStore
+
+
+# columns of a schema index row put in the prompt, in the order similarity_search returns them
+SCHEMA_COLUMNS = ["TableName", "CreateTableStatement", COMPACT_DESCRIPTION_COLUMN]
+# set to "true" in the environment of the serving endpoint only: every loaded copy of the model (Spark Python
+# workers, validation jobs) would otherwise scan and re-embed the whole index after each sync
+SCHEMA_SNAPSHOT_ENV_VAR = "TEXT2SQL_SCHEMA_SNAPSHOT"
+
+
+def snapshot_enabled():
+    """Whether this process keeps a schema snapshot, see `SCHEMA_SNAPSHOT_ENV_VAR`."""
+    return os.environ.get(SCHEMA_SNAPSHOT_ENV_VAR, "").lower() == "true"
+
+
+def index_version(description):
+    """
+    Commit version of the source table the index last synced, from `VectorSearchIndex.describe()`, or None if the
+    index doesn't report one.
+    """
+    status = description.get("status") or {}
+    for update_status in ("triggered_update_status", "continuous_update_status"):
+        for container in (status, description):
+            version = (container.get(update_status) or {}).get("last_processed_commit_version")
+            if version is not None:
+                return int(version)
+    return None
+
+
+def embedding_source_column(description, default="TableName"):
+    """Column the index computes its embeddings from, from `VectorSearchIndex.describe()`."""
+    columns = (description.get("delta_sync_index_spec") or {}).get("embedding_source_columns") or []
+    return columns[0]["name"] if columns else default
+
+
+def embedding_endpoint_name(description):
+    """
+    Embedding endpoint the index computes its embeddings with, from `VectorSearchIndex.describe()`, or None for
+    an index with self-managed embeddings.
+    """
+    columns = (description.get("delta_sync_index_spec") or {}).get("embedding_source_columns") or []
+    return columns[0].get("embedding_model_endpoint_name") if columns else None
+
+
+def _field_value(value):
+    # scan returns typed values, e.g. {"string_value": "..."}
+    return next(iter(value.values()), None) if isinstance(value, dict) else value
+
+
+def scan_rows(scan, columns, page_size=100):
+    """
+    Every row of an index as {column: value} dicts, paging through `VectorSearchIndex.scan`.
+
+    Args:
+        scan (callable): scan(num_results=..., last_primary_key=...) -> page, e.g. index.scan
+        columns (list): columns to keep
+        page_size (int): rows per scan call
+    """
+    rows, last_primary_key = [], None
+    while True:
+        page = scan(num_results=page_size, last_primary_key=last_primary_key)
+        data = page.get("data") or []
+        for entry in data:
+            fields = {field["key"]: _field_value(field.get("value")) for field in entry.get("fields", [])}
+            rows.append({column: fields.get(column) for column in columns})
+        last_primary_key = page.get("last_primary_key")
+        if not data or last_primary_key is None:
+            return rows
+
+
+def index_score(cosine):
+    """
+    Vector search score of a cosine similarity between normalized embeddings: the index reports
+    1 / (1 + squared L2 distance), and the squared distance of unit vectors is 2 - 2 * cosine.
+    """
+    return 1.0 / (3.0 - 2.0 * cosine)
+
+
+class SchemaSnapshot:
+    """
+    In-memory copy of the schema index at one source table version, searched locally instead of calling
+    similarity_search.
+
+    Rows are embedded with the index's embedding endpoint, so local scores rank tables like the index does, and
+    they are reported on the index's score scale for the query router. A snapshot is never modified, a new source
+    version gets a new snapshot, see `SnapshotRefresher`.
+    """
+
+    def __init__(self, version, rows, embeddings):
+        """
+        Args:
+            version (int): source table version of the rows
+            rows (list): {column: value} dicts with the `SCHEMA_COLUMNS`
+            embeddings (np.ndarray): embedding of each row
+        """
+        self.version = version
+        self.rows = [[row.get(column) for column in SCHEMA_COLUMNS] for row in rows]
+        self.store = EmbeddingStore(list(range(len(self.rows))), embeddings) if self.rows else None
+
+    @classmethod
+    def build(cls, version, rows, embed, source_column="TableName"):
+        """
+        Args:
+            version (int): source table version of the rows
+            rows (list): {column: value} dicts with the `SCHEMA_COLUMNS` and the source column
+            embed (callable): list of texts -> embedding matrix, the index's embedding endpoint
+            source_column (str): column the index computes its embeddings from
+        """
+        if not rows:
+            return cls(version, [], np.empty((0, 0), dtype=np.float32))
+        return cls(version, rows, embed([str(row.get(source_column) or "") for row in rows]))
+
+    def __len__(self):
+        return len(self.rows)
+
+    def search(self, query_vector, k=5):
+        """
+        Returns:
+            list: up to k rows like similarity_search's data_array, the `SCHEMA_COLUMNS` followed by the score,
+                most similar first
+        """
+        if self.store is None:
+            return []
+        indices, scores = self.store.search_indices(query_vector, k)
+        return [self.rows[i] + [index_score(float(score))] for i, score in zip(indices[0], scores[0])]
+
+
+class SnapshotRefresher:
+    """
+    Keeps the latest snapshot of a versioned source, rebuilt by a background thread off the request path.
+
+    Every interval_s the thread reads the source version and, when it changed, loads a new snapshot and swaps it
+    in with a single reference assignment. A request reads `current` once and uses that snapshot until it finishes,
+    so the previous snapshot lives on only as long as the requests already holding it. A failed check or load
+    keeps the current snapshot and is retried at the next interval.
+
+    `current` is None until the first load completes. `stats` counts checks, reloads and failures.
+    """
+
+    def __init__(self, current_version, load, interval_s=60):
+        """
+        Args:
+            current_version (callable): () -> version of the source
+            load (callable): version -> snapshot with a `version` attribute
+            interval_s (float): seconds between version checks
+        """
+        self.current_version = current_version
+        self.load = load
+        self.interval_s = interval_s
+        self._init_runtime()
+
+    def _init_runtime(self):
+        self.current = None
+        # one refresh at a time, requests never take it
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        self.stats = {"checks": 0, "reloads": 0, "failures": 0}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for key in ("current", "_lock", "_stopped", "_thread", "stats"):
+            state.pop(key)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_runtime()
+
+    @property
+    def version(self):
+        snapshot = self.current
+        return None if snapshot is None else snapshot.version
+
+    def refresh(self):
+        """Check the source version once and swap in a new snapshot if it changed. Returns whether it swapped."""
+        with self._lock:
+            self.stats["checks"] += 1
+            try:
+                version = self.current_version()
+                if self.current is not None and version == self.current.version:
+                    return False
+                snapshot = self.load(version)
+            except Exception as e:
+                self.stats["failures"] += 1
+                print(f"snapshot refresh failed, still serving version {self.version}: {e!r}")
+                return False
+            previous_version = self.version
+            self.current = snapshot
+            self.stats["reloads"] += 1
+        print(f"swapped in snapshot version {version}, replacing version {previous_version}")
+        return True
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self.refresh()
+            self._stopped.wait(self.interval_s)
+
+    def start(self):
+        """Load the first snapshot and check for new versions in a daemon thread. Does nothing if already started."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="snapshot-refresher", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout_s=None):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout_s)
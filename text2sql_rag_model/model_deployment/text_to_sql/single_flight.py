@@ -0,0 +1,70 @@
+import copy
+import re
+import threading
+from concurrent.futures import Future
+
+
+def normalize_question(question):
+    """Coalescing key of a question: case, surrounding whitespace and punctuation, and repeated spaces don't matter."""
+    return re.sub(r"\s+", " ", question).strip(" ?.!").lower()
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one execution.
+
+    The first caller of a key runs the function, callers arriving while it is in flight wait for its result instead
+    of running it again, and every caller gets its own deep copy of the result (or the same exception). Once the
+    call completes the key is forgotten, so later calls run again: this deduplicates, it doesn't cache.
+
+    `stats` counts calls, executions and coalesced calls.
+    """
+
+    def __init__(self):
+        self._init_runtime()
+
+    def _init_runtime(self):
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self.stats = {"calls": 0, "executions": 0, "coalesced": 0}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for key in ("_lock", "_in_flight", "stats"):
+            state.pop(key)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_runtime()
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._in_flight)
+
+    def do(self, key, fn):
+        """
+        fn() shared with every concurrent call of the same key.
+
+        Returns:
+            tuple: (result, coalesced), coalesced is True when the result came from another caller's execution
+        """
+        with self._lock:
+            self.stats["calls"] += 1
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[key] = Future()
+                self.stats["executions"] += 1
+            else:
+                self.stats["coalesced"] += 1
+
+        if leader:
+            try:
+                future.set_result(fn())
+            except BaseException as e:
+                future.set_exception(e)
+            finally:
+                with self._lock:
+                    del self._in_flight[key]
+        return copy.deepcopy(future.result()), not leader
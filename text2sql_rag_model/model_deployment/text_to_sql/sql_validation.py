@@ -0,0 +1,127 @@
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import ParseError
+
+
+SQL_DIALECT = "databricks"
+
+
+def extract_sql(generated_text):
+    """
+    Extract the SQL statement from an LLM completion.
+
+    The completion may or may not echo the ``[SQL]`` marker and the ``</s>`` end of sequence token.
+    """
+    start = generated_text.find("[SQL]")
+    if start != -1:
+        generated_text = generated_text[start + len("[SQL]") :]
+    end = generated_text.find("</s>")
+    if end != -1:
+        generated_text = generated_text[:end]
+    return generated_text.strip()
+
+
+def _table_key(table_name):
+    """Lower-cased unqualified table name, so `catalog.schema.farm` and `farm` match."""
+    return table_name.split(".")[-1].strip("`").lower()
+
+
+def parse_schema(create_table_statements):
+    """
+    Build a {table_name: set(column_names)} mapping from CREATE TABLE statements.
+
+    Names are lower-cased and unqualified. Statements that cannot be parsed are skipped.
+
+    Args:
+        create_table_statements (list): CREATE TABLE statements, e.g. the `CreateTableStatement`
+            column returned by the vector search index.
+
+    Returns:
+        dict: mapping of table name to the set of its column names
+    """
+    schema = {}
+    for statement in create_table_statements:
+        try:
+            create = sqlglot.parse_one(statement, read=SQL_DIALECT)
+        except ParseError:
+            continue
+        table = create.find(exp.Table)
+        if not isinstance(create, exp.Create) or table is None:
+            continue
+        schema[_table_key(table.name)] = {column.name.lower() for column in create.find_all(exp.ColumnDef)}
+    return schema
+
+
+def validate_sql(sql, schema=None):
+    """
+    Check that the SQL parses and only references tables and columns of the retrieved schema.
+
+    Args:
+        sql (str): generated SQL
+        schema (dict, optional): {table_name: set(column_names)} as returned by `parse_schema`.
+            When empty or None, only syntax is checked.
+
+    Returns:
+        str: a description of the first problem found, or None if the SQL is valid
+    """
+    if not sql:
+        return "The query is empty."
+    try:
+        statements = [s for s in sqlglot.parse(sql, read=SQL_DIALECT) if s is not None]
+    except ParseError as e:
+        return f"The query does not parse: {e}"
+    if len(statements) != 1:
+        return f"Expected a single SQL statement, got {len(statements)}."
+    statement = statements[0]
+    if not isinstance(statement, (exp.Query, exp.Select)):
+        return "Only read-only SELECT queries are allowed."
+    if not schema:
+        return None
+
+    # names defined inside the query itself: CTEs, derived tables and projection aliases
+    derived_tables = {cte.alias_or_name.lower() for cte in statement.find_all(exp.CTE)}
+    derived_tables |= {sub.alias_or_name.lower() for sub in statement.find_all(exp.Subquery) if sub.alias_or_name}
+    derived_columns = {alias.alias.lower() for alias in statement.find_all(exp.Alias)}
+    derived_columns |= {
+        column.name.lower() for table_alias in statement.find_all(exp.TableAlias) for column in table_alias.columns
+    }
+
+    aliases = {}
+    for table in statement.find_all(exp.Table):
+        name = _table_key(table.name)
+        if name in derived_tables:
+            continue
+        if name not in schema:
+            return f"Table `{table.name}` is not in the database schema. Available tables: {', '.join(sorted(schema))}."
+        aliases[table.alias_or_name.lower()] = name
+        aliases[name] = name
+
+    referenced_columns = set().union(*(schema[name] for name in aliases.values())) if aliases else set()
+    for column in statement.find_all(exp.Column):
+        column_name = column.name.lower()
+        if not column_name or column_name == "*" or column_name in derived_columns:
+            continue
+        qualifier = column.table.lower()
+        if qualifier and qualifier not in aliases:
+            if qualifier in derived_tables:
+                continue
+            return f"Column `{column.sql()}` references unknown table `{column.table}`."
+        columns = schema[aliases[qualifier]] if qualifier else referenced_columns
+        if column_name not in columns:
+            return f"Column `{column.sql()}` does not exist in the referenced tables."
+    return None
+
+
+def build_repair_prompt(prompt, sql, error):
+    """
+    Extend the original prompt with the rejected query and the validation error so the model can fix it.
+    """
+    feedback = f"""### Previous Attempt
+The following query is invalid and must be fixed:
+{sql}
+Error: {error}
+"""
+    answer_position = prompt.rfind("### Answer")
+    if answer_position == -1:
+        return f"{feedback}{prompt}"
+    return f"{prompt[:answer_position]}{feedback}{prompt[answer_position:]}"
@@ -1,24 +1,70 @@
 # Databricks notebook source
 import sys
 import os
-from mlflow.tracking import MlflowClient
 import mlflow
 # from utils import get_latest_model_version
 
 sys.path.append(os.path.abspath('..'))
 
+from text2sql_rag_model.model_deployment.registry_cache import registry
 from text2sql_rag_model.model_deployment.utils import get_latest_model_version
+from text2sql_rag_model.validation.evaluation import check_thresholds
+from text2sql_rag_model.validation.validation import baseline_tolerances, validation_thresholds
 from config import REGISTERED_MODEL_NAME
 
-def main():
-    # Instantiate the client
-    client = MlflowClient()
 
+def get_validation_metrics(model_version):
+    """Metrics tagged on a model version by the ModelValidation notebook."""
+    return {
+        key[len("validation_"):]: float(value)
+        for key, value in model_version.tags.items()
+        if key.startswith("validation_") and key != "validation_run_mode"
+    }
+
+
+def get_champion_metrics(registry_cache):
+    """Validation metrics of the current Champion, or None if there is no Champion yet."""
+    try:
+        champion_version = registry_cache.version_by_alias(REGISTERED_MODEL_NAME, "Champion")
+    except mlflow.exceptions.MlflowException:
+        return None
+    return get_validation_metrics(registry_cache.model_version(REGISTERED_MODEL_NAME, champion_version))
+
+
+def main():
     mlflow.set_registry_uri("databricks-uc")
+    registry_cache = registry()
 
     # Retrieve the latest model version number
     latest_model_version = get_latest_model_version(REGISTERED_MODEL_NAME)
-    client.set_registered_model_alias(name=REGISTERED_MODEL_NAME, alias="Champion", version=latest_model_version)
+
+    # Only promote versions whose validation metrics pass the thresholds, so a slower or
+    # less accurate model than the Champion can't become Champion. Versions validated in dry run mode, or
+    # explicitly not validated (disabled mode tags the version and exits), don't block promotion. A version
+    # that never went through ModelValidation has no tag and is refused.
+    candidate = registry_cache.model_version(REGISTERED_MODEL_NAME, latest_model_version)
+    run_mode = candidate.tags.get("validation_run_mode")
+    if run_mode is None:
+        raise Exception(
+            f"Version {latest_model_version} of {REGISTERED_MODEL_NAME} has no validation_run_mode tag, run "
+            "ModelValidation on it (in disabled mode to skip validation) before promoting it to Champion"
+        )
+    if run_mode in ("disabled", "dry_run"):
+        print(f"Validation of version {latest_model_version} ran in {run_mode} mode, skipping the gate")
+    else:
+        failures = check_thresholds(
+            get_validation_metrics(candidate),
+            validation_thresholds(),
+            get_champion_metrics(registry_cache),
+            baseline_tolerances(),
+        )
+        if failures:
+            raise Exception(
+                f"Version {latest_model_version} of {REGISTERED_MODEL_NAME} failed validation ({run_mode} mode) "
+                "and can't be promoted to Champion:\n" + "\n".join(failures)
+            )
+
+    registry_cache.set_alias(REGISTERED_MODEL_NAME, "Champion", latest_model_version)
 
 if __name__ == "__main__":
     main()
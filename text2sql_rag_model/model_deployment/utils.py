@@ -1,18 +1,23 @@
-from mlflow import MlflowClient
+# Heavy dependencies (torch, transformers, mlflow) and Databricks runtime lookups (dbutils, spark, credentials)
+# are imported on first use, so that importing this module is fast and works off-cluster.
+# tests/model_deployment/utils_import_test.py guards the import time.
+import functools
 import requests
 import json
 import time
-import torch
-from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
-from mlflow.deployments import get_deploy_client
-from mlflow.utils.databricks_utils import get_databricks_host_creds
-from databricks.sdk.runtime import *
+from text2sql_rag_model.model_deployment.endpoint_sizing import apply_sizing_config
+from text2sql_rag_model.model_deployment.endpoint_warmup import warm_up
+from text2sql_rag_model.model_deployment.registry_cache import registry
+from text2sql_rag_model.model_deployment.rollout import rollout
 
 
 def load_model_and_tokenizer(pretrained_model_name_or_path):
     """
     Load the pretrained model and tokenizer from Hugging Face.
     """
+    import torch
+    from transformers import AutoTokenizer, AutoModelForCausalLM
+
     model = AutoModelForCausalLM.from_pretrained(
         pretrained_model_name_or_path=pretrained_model_name_or_path, 
         torch_dtype=torch.float16
@@ -25,21 +30,17 @@ def load_model_and_tokenizer(pretrained_model_name_or_path):
 def get_latest_model_version(model_name):
     """Get latest model version, used for POC demo.
 
+    Looked up through the process wide `registry_cache.registry()`, so repeated calls within its TTL reuse the
+    result instead of querying the registry again.
+
     Args:
         model_name (str): Name of ML model
 
     Returns:
         int: latest version of model for given name
     """
-    latest_version = 1
-    mlflow_client = MlflowClient()
-    for mv in mlflow_client.search_model_versions(f"name='{model_name}'"):
-        version_int = int(mv.version)
-        if version_int > latest_version:
-            latest_version = version_int
-    return latest_version
-
-
+    latest_version = registry().latest_version(model_name)
+    return latest_version if latest_version is not None else 1
 
 
 def get_api_root_and_token():
@@ -50,6 +51,8 @@ def get_api_root_and_token():
     - API_ROOT (str): The API root URL.
     - API_TOKEN (str): The API token.
     """
+    from databricks.sdk.runtime import dbutils
+
     API_ROOT = dbutils.notebook.entry_point.getDbutils().notebook().getContext().apiUrl().get() 
     API_TOKEN = dbutils.notebook.entry_point.getDbutils().notebook().getContext().apiToken().get()
     return API_ROOT, API_TOKEN
@@ -96,9 +99,43 @@ def get_max_provisioned_throughput(registered_model_name, latest_model_version):
 
 
 
-def create_or_update_model_endpoint(name, config):
+def create_or_update_model_endpoint(name, config, sizing_config_path=None, warmup_payloads=None, rollout_metrics_fn=None, **rollout_kwargs):
+    """
+    Create the serving endpoint, or update its config if it already exists.
+
+    Args:
+    - name (str): The name of the serving endpoint.
+    - config (dict): The endpoint config.
+    - sizing_config_path (str, optional): Sizing config written by the size_model_endpoint notebook. When it exists,
+      its workload size or provisioned throughput overrides the one of every served entity.
+    - warmup_payloads (list, optional): Representative requests. When given, wait for the endpoint to be ready and
+      send them so that the first user request doesn't pay the cold start. During a rollout they are sent to the
+      new served entity before it takes any traffic.
+    - rollout_metrics_fn (callable, optional): since_ms -> per model version metrics read from the inference table,
+      see `rollout.summarize_inference_logs`. When given and the endpoint exists, the new version is rolled out
+      next to the current one with stepped traffic shifts and rolled back if it regresses, instead of replacing
+      the config at once. rollout_kwargs are passed to `rollout.rollout`.
+    """
+    from mlflow.deployments import get_deploy_client
+
+    config = apply_sizing_config(config, sizing_config_path)
     deploy_client = get_deploy_client("databricks")
 
+    if rollout_metrics_fn is not None and endpoint_exists(name):
+        warmup = None
+        if warmup_payloads:
+            wait_for_endpoint(name)
+
+            def warmup(served_name):
+                report = warm_up(lambda payload: invoke_served_model(name, served_name, payload), warmup_payloads)
+                print(f"Served entity {served_name} of {name} warmed up: {report}")
+
+        history = rollout(
+            deploy_client, name, config["served_entities"][0], rollout_metrics_fn, warmup=warmup, **rollout_kwargs
+        )
+        print(f"Rolled out {name}: {history}")
+        return
+
     try:
         print(f"""Attempting to create endpoint {name} with model version {config.get('served_entities')[0].get("entity_version")}""")
         endpoint = deploy_client.create_endpoint(
@@ -112,32 +149,42 @@ def create_or_update_model_endpoint(name, config):
                 endpoint=name,
                 config=config
             )
-            #todo: wait for endpoint to be ready
         except Exception as e:
             print(f"Endpoint update failed with error: {e}")
             raise e
-        #todo: wait for endpoint to be ready
+
+    if warmup_payloads:
+        wait_for_endpoint(name)
+        report = warm_up(lambda payload: deploy_client.predict(endpoint=name, inputs=payload), warmup_payloads)
+        print(f"Endpoint {name} warmed up: {report}")
 
 
 
 
 
 
-# gather other inputs the API needs - they are used as environment variables in the
-serving_host = spark.conf.get("spark.databricks.workspaceUrl")
-creds = get_databricks_host_creds()
+@functools.lru_cache(maxsize=None)
+def get_serving_host():
+  """Workspace host of the serving API, looked up from the Spark conf on first use"""
+  from databricks.sdk.runtime import spark
+  return spark.conf.get("spark.databricks.workspaceUrl")
+
+def get_auth_headers():
+  """Authorization header with the current Databricks token, not cached since tokens expire"""
+  from mlflow.utils.databricks_utils import get_databricks_host_creds
+  return { 'Authorization': f'Bearer {get_databricks_host_creds().token}' }
 
 def endpoint_exists(serving_endpoint_name):
   """Check if an endpoint with the serving_endpoint_name exists"""
-  url = f"https://{serving_host}/api/2.0/serving-endpoints/{serving_endpoint_name}"
-  headers = { 'Authorization': f'Bearer {creds.token}' }
+  url = f"https://{get_serving_host()}/api/2.0/serving-endpoints/{serving_endpoint_name}"
+  headers = get_auth_headers()
   response = requests.get(url, headers=headers)
   return response.status_code == 200
 
 def wait_for_endpoint(serving_endpoint_name):
   """Wait until deployment is ready, then return endpoint config"""
-  headers = { 'Authorization': f'Bearer {creds.token}' }
-  endpoint_url = f"https://{serving_host}/api/2.0/serving-endpoints/{serving_endpoint_name}"
+  headers = get_auth_headers()
+  endpoint_url = f"https://{get_serving_host()}/api/2.0/serving-endpoints/{serving_endpoint_name}"
   response = requests.request(method='GET', headers=headers, url=endpoint_url)
   while response.json()["state"]["ready"] == "NOT_READY" or response.json()["state"]["config_update"] == "IN_PROGRESS" : # if the endpoint isn't ready, or undergoing config update
     print("Waiting 30s for deployment or update to finish")
@@ -146,11 +193,22 @@ def wait_for_endpoint(serving_endpoint_name):
     response.raise_for_status()
   return response.json()
 
+def invoke_served_model(serving_endpoint_name, served_model_name, payload):
+  """Query one served model of an endpoint directly, whatever its traffic percentage"""
+  url = (
+    f"https://{get_serving_host()}/serving-endpoints/{serving_endpoint_name}"
+    f"/served-models/{served_model_name}/invocations"
+  )
+  response = requests.post(url, json=payload, headers=get_auth_headers())
+  response.raise_for_status()
+  return response.json()
+
 def create_endpoint(serving_endpoint_name, served_models):
   """Create serving endpoint and wait for it to be ready"""
   print(f"Creating new serving endpoint: {serving_endpoint_name}")
-  endpoint_url = f'https://{serving_host}/api/2.0/serving-endpoints'
-  headers = { 'Authorization': f'Bearer {creds.token}' }
+  from databricks.sdk.runtime import displayHTML
+  endpoint_url = f'https://{get_serving_host()}/api/2.0/serving-endpoints'
+  headers = get_auth_headers()
   request_data = {"name": serving_endpoint_name, "config": {"served_models": served_models}}
   json_bytes = json.dumps(request_data).encode('utf-8')
   response = requests.post(endpoint_url, data=json_bytes, headers=headers)
@@ -158,12 +216,15 @@ def create_endpoint(serving_endpoint_name, served_models):
   wait_for_endpoint(serving_endpoint_name)
   displayHTML(f"""Created the <a href="/#mlflow/endpoints/{serving_endpoint_name}" target="_blank">{serving_endpoint_name}</a> serving endpoint""")
   
-def update_endpoint(serving_endpoint_name, served_models):
-  """Update serving endpoint and wait for it to be ready"""
+def update_endpoint(serving_endpoint_name, served_models, traffic_config=None):
+  """Update serving endpoint and wait for it to be ready. Without traffic_config, the endpoint splits traffic evenly."""
   print(f"Updating existing serving endpoint: {serving_endpoint_name}")
-  endpoint_url = f"https://{serving_host}/api/2.0/serving-endpoints/{serving_endpoint_name}/config"
-  headers = { 'Authorization': f'Bearer {creds.token}' }
-  request_data = { "served_models": served_models, "traffic_config": traffic_config }
+  from databricks.sdk.runtime import displayHTML
+  endpoint_url = f"https://{get_serving_host()}/api/2.0/serving-endpoints/{serving_endpoint_name}/config"
+  headers = get_auth_headers()
+  request_data = { "served_models": served_models }
+  if traffic_config is not None:
+    request_data["traffic_config"] = traffic_config
   json_bytes = json.dumps(request_data).encode('utf-8')
   response = requests.put(endpoint_url, data=json_bytes, headers=headers)
   response.raise_for_status()
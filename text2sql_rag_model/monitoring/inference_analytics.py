@@ -0,0 +1,198 @@
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+
+HOUR_MS = 3600 * 1000
+# inference tables land requests up to about an hour late, the hours before the last aggregated one are
+# re-aggregated for this long so that late requests are counted
+LATE_ARRIVAL_HOURS = 3
+QUESTION_PATTERN = re.compile(r"\[QUESTION\](.*?)\[/QUESTION\]", re.DOTALL)
+
+AGGREGATE_COLUMNS = [
+    "hour",
+    "last_timestamp_ms",
+    "requests",
+    "error_rate",
+    "p50_latency_ms",
+    "p95_latency_ms",
+    "mean_prompt_tokens",
+    "p95_prompt_tokens",
+    "mean_completion_tokens",
+    "p95_completion_tokens",
+    "duplicate_fraction",
+]
+
+
+def _load_json(value):
+    if isinstance(value, dict):
+        return value
+    try:
+        return json.loads(value) if value else {}
+    except (TypeError, ValueError):
+        return {}
+
+
+def extract_question(request):
+    """
+    The user question of a captured request: the [QUESTION] of a sqlcoder prompt, or the prompt itself,
+    normalized so that identical questions compare equal.
+    """
+    prompt = _load_json(request).get("prompt", "")
+    if isinstance(prompt, list):
+        prompt = prompt[0] if prompt else ""
+    match = QUESTION_PATTERN.search(prompt)
+    question = match.group(1) if match else prompt
+    return " ".join(question.lower().split())
+
+
+def parse_requests(logs):
+    """
+    Flatten rows of an inference (payload) table to one row per request.
+
+    Args:
+        logs (pd.DataFrame): columns timestamp_ms, status_code, execution_time_ms, request and response (JSON strings)
+
+    Returns:
+        pd.DataFrame: hour (epoch ms of the start of the hour), timestamp_ms, ok, latency_ms, prompt_tokens,
+            completion_tokens and question
+    """
+    usage = logs["response"].map(lambda response: _load_json(response).get("usage") or {})
+    return pd.DataFrame(
+        {
+            "hour": logs["timestamp_ms"] // HOUR_MS * HOUR_MS,
+            "timestamp_ms": logs["timestamp_ms"],
+            "ok": logs["status_code"] == 200,
+            "latency_ms": logs["execution_time_ms"].astype(float),
+            "prompt_tokens": usage.map(lambda u: u.get("prompt_tokens", np.nan)).astype(float),
+            "completion_tokens": usage.map(lambda u: u.get("completion_tokens", np.nan)).astype(float),
+            "question": logs["request"].map(extract_question),
+        }
+    )
+
+
+def _percentile(values, q):
+    values = values.dropna()
+    return float(np.percentile(values, q)) if len(values) else np.nan
+
+
+def hourly_aggregates(requests):
+    """
+    Per hour latency percentiles of successful requests, token distributions, error rate and the fraction
+    of requests repeating a question already asked in the same hour (what a response cache would save), with
+    the timestamp of the last request captured in the hour.
+    """
+    rows = []
+    for hour, group in requests.groupby("hour"):
+        ok = group[group["ok"]]
+        rows.append(
+            {
+                "hour": int(hour),
+                "last_timestamp_ms": int(group["timestamp_ms"].max()),
+                "requests": len(group),
+                "error_rate": 1 - len(ok) / len(group),
+                "p50_latency_ms": _percentile(ok["latency_ms"], 50),
+                "p95_latency_ms": _percentile(ok["latency_ms"], 95),
+                "mean_prompt_tokens": float(ok["prompt_tokens"].mean()),
+                "p95_prompt_tokens": _percentile(ok["prompt_tokens"], 95),
+                "mean_completion_tokens": float(ok["completion_tokens"].mean()),
+                "p95_completion_tokens": _percentile(ok["completion_tokens"], 95),
+                "duplicate_fraction": 1 - group["question"].nunique() / len(group),
+            }
+        )
+    return pd.DataFrame(rows, columns=AGGREGATE_COLUMNS)
+
+
+def merge_aggregates(existing, new):
+    """Replace the hours of `existing` that were recomputed in `new`."""
+    if existing is None or existing.empty:
+        return new.reset_index(drop=True)
+    kept = existing[~existing["hour"].isin(new["hour"])]
+    return pd.concat([kept, new]).sort_values("hour").reset_index(drop=True)
+
+
+def detect_regressions(
+    aggregates,
+    baseline_hours=168,
+    min_requests=20,
+    max_latency_increase=0.25,
+    max_error_rate_increase=0.02,
+    max_prompt_tokens_increase=0.25,
+):
+    """
+    Compare the latest complete hour with the median of the preceding `baseline_hours` hours.
+
+    An hour is complete once a request after its end was captured: the job runs a few minutes into the hour, whose
+    few requests so far aren't compared. Hours with fewer than `min_requests` requests are too noisy and ignored.
+
+    Returns:
+        list: alert messages, empty if nothing regressed
+    """
+    complete = aggregates["hour"] + HOUR_MS <= aggregates["last_timestamp_ms"].max()
+    hours = aggregates[complete & (aggregates["requests"] >= min_requests)].sort_values("hour")
+    if len(hours) < 2:
+        return []
+    latest = hours.iloc[-1]
+    baseline = hours.iloc[-baseline_hours - 1 : -1].median(numeric_only=True)
+    hour = pd.Timestamp(int(latest["hour"]), unit="ms")
+
+    alerts = []
+    for metric in ("p50_latency_ms", "p95_latency_ms"):
+        if latest[metric] > (1 + max_latency_increase) * baseline[metric]:
+            alerts.append(f"{hour}: {metric} {latest[metric]:.0f} vs baseline {baseline[metric]:.0f}")
+    if latest["error_rate"] > baseline["error_rate"] + max_error_rate_increase:
+        alerts.append(f"{hour}: error rate {latest['error_rate']:.2%} vs baseline {baseline['error_rate']:.2%}")
+    if latest["mean_prompt_tokens"] > (1 + max_prompt_tokens_increase) * baseline["mean_prompt_tokens"]:
+        alerts.append(
+            f"{hour}: mean prompt tokens {latest['mean_prompt_tokens']:.0f} "
+            f"vs baseline {baseline['mean_prompt_tokens']:.0f}"
+        )
+    return alerts
+
+
+def checkpoint_ms(aggregates, lag_hours=LATE_ARRIVAL_HOURS):
+    """
+    Timestamp from which the next run must read requests: the start of the hour `lag_hours` before the last
+    aggregated hour. Every hour from there on is recomputed from all its requests and replaces its previous
+    aggregate, so requests captured late for the last `lag_hours` hours are counted.
+    """
+    if aggregates is None or aggregates.empty:
+        return 0
+    return max(int(aggregates["hour"].max()) - lag_hours * HOUR_MS, 0)
+
+
+def process_increment(logs, aggregates):
+    """
+    Aggregate the requests captured since `checkpoint_ms(aggregates)` into the aggregate table.
+
+    Returns:
+        pd.DataFrame: updated aggregates
+    """
+    if logs.empty:
+        return aggregates
+    return merge_aggregates(aggregates, hourly_aggregates(parse_requests(logs)))
+
+
+def run_local(payload_path, aggregate_path, lag_hours=LATE_ARRIVAL_HOURS, **regression_kwargs):
+    """
+    Run the job on a Parquet copy of a payload table, e.g. for tests or offline analysis.
+
+    Args:
+        payload_path (str): Parquet file or directory with the inference table columns
+        aggregate_path (str): Parquet file of the aggregate table, created if missing
+        lag_hours (int): hours before the last aggregated one that are re-aggregated, see `checkpoint_ms`
+        regression_kwargs: passed to `detect_regressions`
+
+    Returns:
+        tuple: (aggregates, alerts)
+    """
+    aggregates = pd.read_parquet(aggregate_path) if os.path.exists(aggregate_path) else None
+    logs = pd.read_parquet(payload_path, filters=[("timestamp_ms", ">=", checkpoint_ms(aggregates, lag_hours))])
+    if logs.empty:
+        return aggregates, []
+    aggregates = process_increment(logs, aggregates)
+    aggregates.to_parquet(aggregate_path, index=False)
+    return aggregates, detect_regressions(aggregates, **regression_kwargs)
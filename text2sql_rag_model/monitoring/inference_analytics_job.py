@@ -0,0 +1,53 @@
+# Databricks notebook source
+##################################################################################
+# Inference Analytics Notebook
+#
+# Incrementally aggregates the requests captured in a serving endpoint's inference (payload) table into a
+# compact hourly table: p50/p95 latency, prompt/completion token distributions, duplicate questions and
+# error rate. Each run only reads requests since a few hours before the last aggregated hour, and re-aggregates
+# those hours so that requests landing late in the inference table are counted. The notebook fails, and the job
+# notifies its owners, when the latest hour regressed compared to the previous week.
+# Scheduled by `inference_analytics_job` in resources/monitoring-workflow-resource.yml.
+#
+# Parameters:
+# * payload_table   - Inference table written by the endpoint's auto_capture_config.
+# * aggregate_table - Hourly aggregate table, created on the first run.
+##################################################################################
+
+# COMMAND ----------
+
+dbutils.widgets.text("payload_table", "asong_dev.llms.sqlcoder_7b_asong_payload", "Payload Table")
+dbutils.widgets.text("aggregate_table", "asong_dev.llms.sqlcoder_7b_asong_hourly_metrics", "Aggregate Table")
+
+# COMMAND ----------
+
+import sys
+import os
+
+sys.path.append(os.path.abspath('..'))
+from text2sql_rag_model.monitoring.inference_analytics import checkpoint_ms, detect_regressions, process_increment
+
+payload_table = dbutils.widgets.get("payload_table")
+aggregate_table = dbutils.widgets.get("aggregate_table")
+
+aggregates = spark.table(aggregate_table).toPandas() if spark.catalog.tableExists(aggregate_table) else None
+since_ms = checkpoint_ms(aggregates)
+logs = spark.sql(
+    f"""
+    SELECT timestamp_ms, status_code, execution_time_ms, request, response
+    FROM {payload_table}
+    WHERE timestamp_ms >= {since_ms}
+    """
+).toPandas()
+print(f"Aggregating {len(logs)} requests captured since {since_ms}")
+
+# COMMAND ----------
+
+if not logs.empty:
+    aggregates = process_increment(logs, aggregates)
+    # one row per hour, small enough to rewrite on every run
+    spark.createDataFrame(aggregates).write.mode("overwrite").option("overwriteSchema", "true").saveAsTable(aggregate_table)
+
+    alerts = detect_regressions(aggregates)
+    if alerts:
+        raise Exception("Inference regressions detected:\n" + "\n".join(alerts))
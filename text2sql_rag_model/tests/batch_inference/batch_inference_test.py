@@ -0,0 +1,105 @@
+import time
+from functools import partial
+
+import pandas as pd
+
+from text2sql_rag_model.batch_inference.batch_inference import (
+    completed_ids,
+    pending_partitions,
+    pin_model_version,
+    prepare_questions,
+    read_results,
+    run_batch_inference,
+    run_partition,
+)
+from text2sql_rag_model.model_deployment.registry_cache import FakeRegistryClient, RegistryCache
+
+
+def slow_predict_fn(delay_s):
+    """Predict function factory, module level so that it pickles to worker processes."""
+
+    def predict_fn(question):
+        time.sleep(delay_s)
+        return f"SELECT '{question}'", 100
+
+    return predict_fn
+
+
+def make_questions(count):
+    return prepare_questions(pd.DataFrame({"question": [f"question {i}" for i in range(count)]}))
+
+
+def test_prepare_questions_dedups():
+    questions = prepare_questions(pd.DataFrame({"question": ["a", "b", "a"]}))
+    assert questions["question"].tolist() == ["a", "b"]
+    with_ids = prepare_questions(pd.DataFrame({"q": ["a", "b"], "key": [1, 2]}), "q", "key")
+    assert with_ids["id"].tolist() == ["1", "2"]
+
+
+def test_run_partition_checkpoints_and_rerun_skips_completed(tmp_path):
+    output_dir = str(tmp_path)
+    questions = make_questions(25)
+    rows = list(zip(questions["id"], questions["question"]))
+
+    def flaky_predict_fn(question):
+        if question.endswith("7"):
+            raise RuntimeError("endpoint timed out")
+        return "SELECT 1", 10
+
+    summary = run_partition(flaky_predict_fn, rows, output_dir, partition=0, concurrency=4, flush_every=10)
+    assert summary["answered"] == 23
+    assert {e["question"] for e in summary["errors"]} == {"question 7", "question 17"}
+    assert len(list((tmp_path / "partition=0").glob("*.parquet"))) == 3
+    assert len(completed_ids(output_dir)) == 23
+
+    # the rerun only answers the failed questions
+    remaining = pending_partitions(questions, output_dir, num_partitions=1)
+    assert sorted(q for _, q in remaining[0]) == ["question 17", "question 7"]
+    answered = []
+    run_partition(lambda q: answered.append(q) or ("SELECT 2", 10), remaining[0], output_dir, partition=0)
+    assert sorted(answered) == ["question 17", "question 7"]
+
+    results = read_results(output_dir)
+    assert len(results) == 25
+    assert set(results.columns) == {"id", "question", "generated_sql", "prompt_tokens", "latency_s"}
+
+
+def test_throughput_scales_with_workers(tmp_path):
+    questions = make_questions(48)
+    factory = partial(slow_predict_fn, 0.05)
+
+    def run(num_workers, output_dir):
+        start = time.perf_counter()
+        summaries = run_batch_inference(
+            factory, questions, str(output_dir), num_partitions=4, num_workers=num_workers, concurrency=2
+        )
+        assert sum(s["answered"] for s in summaries) == 48
+        return time.perf_counter() - start
+
+    one_worker = run(1, tmp_path / "one")
+    four_workers = run(4, tmp_path / "four")
+    assert four_workers < one_worker / 2
+    assert len(read_results(str(tmp_path / "four"))) == 48
+    # everything is answered, a rerun has nothing to do
+    assert run_batch_inference(factory, questions, str(tmp_path / "four"), num_partitions=4) == []
+
+
+def test_checkpoints_are_keyed_by_the_pinned_model_version(tmp_path):
+    client = FakeRegistryClient({"main.llms.text2sqlrag": [1, 2]})
+    client.set_registered_model_alias("main.llms.text2sqlrag", "Champion", 1)
+    model_uri, checkpoint_dir = pin_model_version(
+        "models:/main.llms.text2sqlrag@Champion", str(tmp_path), RegistryCache(client)
+    )
+    assert model_uri == "models:/main.llms.text2sqlrag/1"
+    assert checkpoint_dir == str(tmp_path / "main.llms.text2sqlrag-v1")
+    questions = make_questions(3)
+    run_partition(lambda q: ("SELECT 1", 10), list(zip(questions["id"], questions["question"])), checkpoint_dir, 0)
+
+    # once the alias moves, every question is answered again, by the new version only
+    client.set_registered_model_alias("main.llms.text2sqlrag", "Champion", 2)
+    model_uri, checkpoint_dir = pin_model_version(
+        "models:/main.llms.text2sqlrag@Champion", str(tmp_path), RegistryCache(client)
+    )
+    assert model_uri == "models:/main.llms.text2sqlrag/2"
+    assert sum(len(rows) for rows in pending_partitions(questions, checkpoint_dir, 1).values()) == 3
+    assert read_results(checkpoint_dir).empty
@@ -0,0 +1,118 @@
+import threading
+
+import pandas as pd
+import pytest
+
+from text2sql_rag_model.batch_inference import spark_udf
+from text2sql_rag_model.batch_inference.spark_udf import (
+    RetrievalCache,
+    executor_predict_fn,
+    max_in_flight_per_task,
+    predict_batch,
+    text_to_sql_udf,
+)
+
+
+class FakeTextToSQLModel:
+    """Stands in for a loaded text2sqlrag model: retrieval, then generation."""
+
+    loads = 0
+    last_loaded = None
+
+    def __init__(self):
+        FakeTextToSQLModel.loads += 1
+        FakeTextToSQLModel.last_loaded = self
+        self.retrievals = 0
+        self._lock = threading.Lock()
+
+    def _retrieve_context(self, question, schema_snapshot=None):
+        with self._lock:
+            self.retrievals += 1
+        return f"schema for {question}"
+
+    def predict(self, model_input):
+        question = model_input["prompt"][0]
+        if question == "fail":
+            raise RuntimeError("endpoint error")
+        context = self._retrieve_context(question, None)
+        return {"generated_sql": [f"SELECT '{context}'"], "prompt_tokens": [len(question)]}
+
+
+def load_fake_model(model_uri):
+    return FakeTextToSQLModel()
+
+
+@pytest.fixture(autouse=True)
+def clear_executor_models():
+    spark_udf._EXECUTOR_MODELS.clear()
+    FakeTextToSQLModel.loads = 0
+    yield
+    spark_udf._EXECUTOR_MODELS.clear()
+
+
+def test_retrieval_cache_evicts_least_recently_used():
+    calls = []
+    cache = RetrievalCache(lambda q: calls.append(q) or q.upper(), maxsize=2)
+    assert cache("a") == "A"
+    assert cache("b") == "B"
+    assert cache("a") == "A"
+    cache("c")  # evicts b
+    cache("b")
+    assert calls == ["a", "b", "c", "b"]
+    assert cache.stats == {"hits": 1, "misses": 4}
+
+
+def test_retrieval_cache_keys_on_snapshot_version():
+    calls = []
+
+    class Snapshot:
+        def __init__(self, version):
+            self.version = version
+
+    cache = RetrievalCache(lambda q, snapshot: calls.append((q, snapshot.version)) or snapshot.version)
+    assert cache("a", Snapshot(1)) == 1
+    assert cache("a", Snapshot(1)) == 1
+    # a hot reloaded schema is retrieved again
+    assert cache("a", Snapshot(2)) == 2
+    assert calls == [("a", 1), ("a", 2)]
+
+
+def test_executor_predict_fn_loads_model_once_and_shares_retrieval_cache():
+    first = executor_predict_fn("models:/text2sqlrag/1", load_model=load_fake_model)
+    second = executor_predict_fn("models:/text2sqlrag/1", load_model=load_fake_model)
+    assert first is second
+    assert FakeTextToSQLModel.loads == 1
+
+    predict_batch(first, ["q1", "q2"])
+    predict_batch(second, ["q1", "q2", "q3"])
+    model = FakeTextToSQLModel.last_loaded
+    assert model.retrievals == 3
+    assert model._retrieve_context.stats == {"hits": 2, "misses": 3}
+
+
+def test_predict_batch_keeps_order_and_isolates_errors():
+    predict_fn = executor_predict_fn("models:/text2sqlrag/1", load_model=load_fake_model)
+    result = predict_batch(predict_fn, ["a", "fail", "ccc"], max_in_flight=3)
+    assert result["generated_sql"].isna().tolist() == [False, True, False]
+    assert result["generated_sql"][2] == "SELECT 'schema for ccc'"
+    assert result["prompt_tokens"].tolist() == [1, 0, 3]
+    assert result["error"].isna().tolist() == [True, False, True]
+
+
+def test_max_in_flight_per_task():
+    assert max_in_flight_per_task("Small", num_endpoints=2, num_tasks=4) == 2
+    assert max_in_flight_per_task("Small", num_tasks=100) == 1
+
+
+def test_text_to_sql_udf_on_local_spark():
+    pyspark = pytest.importorskip("pyspark")
+    spark = pyspark.sql.SparkSession.builder.master("local[*]").appName("pytest-text-to-sql-udf").getOrCreate()
+    try:
+        questions = spark.createDataFrame(pd.DataFrame({"question": [f"q{i % 5}" for i in range(40)]})).repartition(4)
+        answer = text_to_sql_udf("models:/text2sqlrag/1", max_in_flight=4, load_model=load_fake_model)
+        answers = questions.withColumn("answer", answer("question")).select("question", "answer.*").toPandas()
+        assert len(answers) == 40
+        assert (answers["generated_sql"] == "SELECT 'schema for " + answers["question"] + "'").all()
+        assert answers["error"].isna().all()
+    finally:
+        spark.stop()
@@ -0,0 +1,288 @@
+import pickle
+import threading
+import time
+
+import pytest
+
+from text2sql_rag_model.model_deployment.text_to_sql.admission import (
+    BATCH,
+    INTERACTIVE,
+    AdmissionController,
+    AdmissionRejected,
+    REQUEST_PARAMS,
+    DeadlineExceeded,
+    InvalidRequest,
+    request_options,
+)
+
+
+def wait_for(condition, timeout_s=5):
+    deadline = time.monotonic() + timeout_s
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+class Holder:
+    """Runs a request in a thread and holds its slot until released."""
+
+    def __init__(self, controller, priority, deadline=None, log=None, name=None, rows=1):
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.error = None
+
+        def run():
+            try:
+                with controller.admit(priority, deadline, rows):
+                    if log is not None:
+                        log.append(name)
+                    self.started.set()
+                    self.release.wait(5)
+            except Exception as e:
+                self.error = e
+
+        self.thread = threading.Thread(target=run)
+        self.thread.start()
+
+    def finish(self):
+        self.release.set()
+        self.thread.join(5)
+
+
+def test_admits_immediately_under_capacity():
+    controller = AdmissionController(max_concurrency=2)
+    with controller.admit(INTERACTIVE):
+        with controller.admit(BATCH):
+            assert controller.estimated_wait_s(INTERACTIVE) > 0
+    assert controller.estimated_wait_s(INTERACTIVE) == 0
+    assert controller.stats[INTERACTIVE]["admitted"] == 1
+    assert controller.stats[BATCH]["admitted"] == 1
+
+
+def test_batch_cannot_take_interactive_capacity():
+    controller = AdmissionController(max_concurrency=4, max_batch_concurrency=2)
+    batch = [Holder(controller, BATCH) for _ in range(4)]
+    wait_for(lambda: controller.queue_depths()[BATCH] == 2)
+    # batch is saturated and queued, interactive requests still start right away
+    assert controller.estimated_wait_s(INTERACTIVE) == 0
+    interactive = [Holder(controller, INTERACTIVE) for _ in range(2)]
+    for holder in interactive:
+        assert holder.started.wait(5)
+    for holder in batch + interactive:
+        holder.finish()
+    assert all(holder.error is None for holder in batch + interactive)
+    assert controller.stats[BATCH]["admitted"] == 4
+
+
+def test_queued_interactive_requests_start_before_batch():
+    controller = AdmissionController(max_concurrency=1, max_batch_concurrency=1)
+    log = []
+    running = Holder(controller, BATCH, log=log, name="running")
+    assert running.started.wait(5)
+    queued_batch = Holder(controller, BATCH, log=log, name="batch")
+    wait_for(lambda: controller.queue_depths()[BATCH] == 1)
+    queued_interactive = Holder(controller, INTERACTIVE, log=log, name="interactive")
+    wait_for(lambda: controller.queue_depths()[INTERACTIVE] == 1)
+
+    running.finish()
+    assert queued_interactive.started.wait(5)
+    queued_interactive.finish()
+    queued_batch.finish()
+    assert log == ["running", "interactive", "batch"]
+
+
+def test_rejects_when_queue_is_full():
+    controller = AdmissionController(max_concurrency=1, max_queue={INTERACTIVE: 1})
+    running = Holder(controller, INTERACTIVE)
+    assert running.started.wait(5)
+    queued = Holder(controller, INTERACTIVE)
+    wait_for(lambda: controller.queue_depths()[INTERACTIVE] == 1)
+    with pytest.raises(AdmissionRejected) as rejected:
+        with controller.admit(INTERACTIVE):
+            pass
+    assert rejected.value.retry_after_s >= 1
+    assert controller.stats[INTERACTIVE]["rejected"] == 1
+    running.finish()
+    queued.finish()
+    assert queued.error is None
+
+
+def test_rejects_when_estimated_wait_exceeds_slo():
+    controller = AdmissionController(max_concurrency=1, slo_s={INTERACTIVE: 5}, initial_service_s=8)
+    running = Holder(controller, INTERACTIVE)
+    assert running.started.wait(5)
+    with pytest.raises(AdmissionRejected, match="retry after 8s"):
+        with controller.admit(INTERACTIVE):
+            pass
+    running.finish()
+
+
+def test_rejects_when_wait_exceeds_deadline():
+    controller = AdmissionController(max_concurrency=1, initial_service_s=3)
+    running = Holder(controller, INTERACTIVE)
+    assert running.started.wait(5)
+    with pytest.raises(AdmissionRejected):
+        with controller.admit(INTERACTIVE, deadline=time.monotonic() + 1):
+            pass
+    running.finish()
+
+
+def test_drops_queued_request_when_deadline_passes():
+    controller = AdmissionController(max_concurrency=1, initial_service_s=0.01)
+    running = Holder(controller, INTERACTIVE)
+    assert running.started.wait(5)
+    ran = []
+    with pytest.raises(DeadlineExceeded):
+        with controller.admit(INTERACTIVE, deadline=time.monotonic() + 0.05):
+            ran.append(True)
+    assert not ran
+    assert controller.queue_depths()[INTERACTIVE] == 0
+    assert controller.stats[INTERACTIVE]["expired"] == 1
+    running.finish()
+    # the slot is free again
+    with controller.admit(INTERACTIVE):
+        pass
+
+
+def test_drops_request_whose_deadline_already_passed():
+    controller = AdmissionController()
+    with pytest.raises(DeadlineExceeded):
+        with controller.admit(BATCH, deadline=time.monotonic() - 1):
+            pass
+
+
+def test_service_time_estimate_follows_durations():
+    controller = AdmissionController(initial_service_s=2.0, ewma_alpha=0.5)
+    with controller.admit(INTERACTIVE):
+        pass
+    assert controller.service_s[INTERACTIVE] < 1.1
+    assert controller.service_s[BATCH] == 2.0
+
+
+def test_long_batch_requests_dont_inflate_interactive_estimates():
+    controller = AdmissionController(max_concurrency=1, initial_service_s=0.5, ewma_alpha=1.0)
+    # a 100-row batch taking 60s is 0.6s per row, and only counts for batch requests
+    controller._running[BATCH] += 1
+    controller._release(BATCH, duration_s=60, rows=100)
+    assert controller.service_s[BATCH] == pytest.approx(0.6)
+    assert controller.service_s[INTERACTIVE] == 0.5
+    running = Holder(controller, BATCH)
+    assert running.started.wait(5)
+    assert controller.estimated_wait_s(INTERACTIVE) == pytest.approx(0.5)
+    running.finish()
+
+
+def test_queued_batch_rows_count_in_batch_estimates():
+    controller = AdmissionController(max_concurrency=1, max_batch_concurrency=1, initial_service_s=0.01)
+    running = Holder(controller, BATCH)
+    assert running.started.wait(5)
+    queued = Holder(controller, BATCH, rows=50)
+    wait_for(lambda: controller.queue_depths()[BATCH] == 1)
+    assert controller.estimated_wait_s(BATCH) == pytest.approx(0.51)
+    assert controller.estimated_wait_s(INTERACTIVE) == pytest.approx(0.01)
+    running.finish()
+    queued.finish()
+    assert queued.error is None
+
+
+def test_request_options():
+    assert request_options({"prompt": ["q"]}) == (INTERACTIVE, None)
+    assert request_options({"prompt": ["q"]}, params=REQUEST_PARAMS) == (INTERACTIVE, None)
+    priority, deadline = request_options({"prompt": ["q"]}, params={"priority": "batch", "timeout_s": 30.0})
+    assert priority == BATCH
+    assert 29 < deadline - time.monotonic() <= 30
+    assert request_options({"prompt": "q"}, num_rows=10)[0] == BATCH
+    assert request_options({"prompt": "q", "priority": float("nan"), "timeout_s": float("nan")}) == (INTERACTIVE, None)
+    priority, deadline = request_options({"prompt": ["q"], "priority": "batch", "timeout_s": 30})
+    assert priority == BATCH
+    assert 29 < deadline - time.monotonic() <= 30
+
+
+def test_multi_row_requests_are_always_batch():
+    assert request_options({"prompt": "q"}, num_rows=1000, params={"priority": "interactive"})[0] == BATCH
+
+
+def test_request_options_normalizes_params():
+    assert request_options({"prompt": ["q"]}, params={"priority": " Interactive"})[0] == INTERACTIVE
+    priority, deadline = request_options({"prompt": ["q"]}, params={"priority": "BATCH", "timeout_s": "60"})
+    assert priority == BATCH
+    assert 59 < deadline - time.monotonic() <= 60
+    assert request_options({"prompt": ["q"], "timeout_s": "-1"}) == (INTERACTIVE, None)
+
+
+@pytest.mark.parametrize(
+    "params", [{"priority": "Interactiv"}, {"priority": 1}, {"timeout_s": "soon"}, {"timeout_s": [60]}]
+)
+def test_request_options_rejects_invalid_params(params):
+    with pytest.raises(InvalidRequest):
+        request_options({"prompt": ["q"]}, params=params)
+
+
+def test_unknown_priority():
+    with pytest.raises(InvalidRequest):
+        with AdmissionController().admit("urgent"):
+            pass
+
+
+def test_batch_rows_share_max_batch_concurrency():
+    controller = AdmissionController(max_concurrency=4, max_batch_concurrency=2)
+    lock = threading.Lock()
+    running = []
+    peak = []
+
+    def answer(row):
+        with lock:
+            running.append(row)
+            peak.append(len(running))
+        time.sleep(0.01)
+        with lock:
+            running.remove(row)
+        return row * 2
+
+    results = [None, None]
+
+    def request(i):
+        with controller.admit(BATCH, rows=8):
+            results[i] = controller.map_rows(answer, range(8))
+
+    threads = [threading.Thread(target=request, args=(i,)) for i in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert results == [list(range(0, 16, 2))] * 2
+    assert max(peak) == 2
+
+
+def test_pickle_resets_runtime_state():
+    controller = AdmissionController(max_concurrency=3)
+    with controller.admit(INTERACTIVE):
+        restored = pickle.loads(pickle.dumps(controller))
+    assert restored.max_concurrency == 3
+    assert restored.stats[INTERACTIVE]["admitted"] == 0
+    assert restored.estimated_wait_s(INTERACTIVE) == 0
+
+
+class EchoParamsModel:
+    """pyfunc model returning the admission options it received."""
+
+    def predict(self, context, model_input, params=None):
+        priority, deadline = request_options(model_input.to_dict(orient="records")[0], len(model_input), params)
+        return {"priority": [priority], "has_deadline": [deadline is not None]}
+
+
+def test_request_params_go_through_the_logged_signature(tmp_path):
+    mlflow = pytest.importorskip("mlflow")
+    import pandas as pd
+    from mlflow.models import infer_signature
+
+    model_input = {"prompt": ["How many cows?"]}
+    output = {"priority": ["interactive"], "has_deadline": [False]}
+    signature = infer_signature(model_input, output, params=REQUEST_PARAMS)
+    python_model = type("EchoParams", (mlflow.pyfunc.PythonModel,), {"predict": EchoParamsModel.predict})()
+    mlflow.pyfunc.save_model(str(tmp_path / "model"), python_model=python_model, signature=signature)
+    model = mlflow.pyfunc.load_model(str(tmp_path / "model"))
+
+    assert model.predict(pd.DataFrame(model_input)) == {"priority": ["interactive"], "has_deadline": [False]}
+    prediction = model.predict(pd.DataFrame(model_input), params={"priority": "batch", "timeout_s": 30.0})
+    assert prediction == {"priority": ["batch"], "has_deadline": [True]}
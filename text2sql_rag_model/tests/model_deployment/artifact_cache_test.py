@@ -0,0 +1,213 @@
+import multiprocessing
+import os
+import threading
+
+import pytest
+
+from text2sql_rag_model.model_deployment import artifact_cache
+from text2sql_rag_model.model_deployment.artifact_cache import (
+    ArtifactCache,
+    LocalArtifactRepo,
+    cached_model_path,
+    download_ranges,
+    known_digests,
+    version_key,
+)
+from text2sql_rag_model.model_deployment.checkpoint_packaging import hash_file
+from text2sql_rag_model.model_deployment.registry_cache import FakeRegistryClient, RegistryCache
+
+
+class CountingRepo(LocalArtifactRepo):
+    """Local file-based artifact repo recording every read."""
+
+    def __init__(self, root):
+        super().__init__(root)
+        self.ranges = []
+        self.downloads = []
+        self._lock = threading.Lock()
+
+    def read_range(self, relative_path, start, end):
+        with self._lock:
+            self.ranges.append((relative_path, start, end))
+        return super().read_range(relative_path, start, end)
+
+    def download(self, relative_path, local_path):
+        with self._lock:
+            self.downloads.append(relative_path)
+        super().download(relative_path, local_path)
+
+
+def write_model_version(root, weights, adapter=b"adapter-v1", metadata=""):
+    """A logged model laid out like MLflow's transformers flavor."""
+    os.makedirs(os.path.join(root, "model"), exist_ok=True)
+    with open(os.path.join(root, "MLmodel"), "w") as f:
+        f.write("flavors:\n  transformers: {}\n" + metadata)
+    with open(os.path.join(root, "model", "model.safetensors"), "wb") as f:
+        f.write(weights)
+    with open(os.path.join(root, "model", "adapter.safetensors"), "wb") as f:
+        f.write(adapter)
+    return root
+
+
+@pytest.fixture
+def weights():
+    return os.urandom(300_000)
+
+
+def read_model_dir(model_dir):
+    files = {}
+    for root, _, names in os.walk(model_dir):
+        for name in names:
+            with open(os.path.join(root, name), "rb") as f:
+                files[os.path.relpath(os.path.join(root, name), model_dir)] = f.read()
+    return files
+
+
+def test_download_ranges_reassembles_file(tmp_path, weights):
+    (tmp_path / "weights").write_bytes(weights)
+    repo = CountingRepo(str(tmp_path))
+    download_ranges(repo.read_range, "weights", len(weights), str(tmp_path / "copy"), chunk_size=64_000, max_workers=4)
+    assert (tmp_path / "copy").read_bytes() == weights
+    assert len(repo.ranges) == 5
+
+
+def test_fetch_downloads_large_files_in_chunks(tmp_path, weights):
+    repo = CountingRepo(write_model_version(str(tmp_path / "v1"), weights))
+    cache = ArtifactCache(str(tmp_path / "cache"), chunk_size=64_000, max_workers=4)
+    model_dir = cache.fetch(version_key("sqlcoder", 1), repo)
+    assert read_model_dir(model_dir) == read_model_dir(repo.root)
+    assert sorted(repo.downloads) == ["MLmodel", "model/adapter.safetensors"]
+    assert {path for path, _, _ in repo.ranges} == {"model/model.safetensors"}
+
+
+def test_fetch_reuses_cached_version_without_reading_repo(tmp_path, weights):
+    repo = CountingRepo(write_model_version(str(tmp_path / "v1"), weights))
+    cache = ArtifactCache(str(tmp_path / "cache"), chunk_size=64_000)
+    first = cache.fetch("sqlcoder-v1", repo)
+    reads = len(repo.ranges) + len(repo.downloads)
+    assert ArtifactCache(str(tmp_path / "cache")).fetch("sqlcoder-v1", repo) == first
+    assert len(repo.ranges) + len(repo.downloads) == reads
+
+
+def test_versions_share_unchanged_blobs(tmp_path, weights):
+    cache = ArtifactCache(str(tmp_path / "cache"), chunk_size=64_000)
+    v1 = cache.fetch("sqlcoder-v1", CountingRepo(write_model_version(str(tmp_path / "v1"), weights)))
+    v2 = cache.fetch("sqlcoder-v2", CountingRepo(write_model_version(str(tmp_path / "v2"), weights, b"adapter-v2")))
+    weights_v1 = os.stat(os.path.join(v1, "model", "model.safetensors"))
+    weights_v2 = os.stat(os.path.join(v2, "model", "model.safetensors"))
+    assert weights_v1.st_ino == weights_v2.st_ino
+    assert len(os.listdir(tmp_path / "cache" / "blobs")) == 4
+
+    cache.prune(keep_keys=["sqlcoder-v2"])
+    assert not os.path.exists(v1)
+    assert len(os.listdir(tmp_path / "cache" / "blobs")) == 3
+    assert cache.fetch("sqlcoder-v2", repo=None) == v2
+
+
+def test_known_digests_match_unique_weights_paths():
+    files = [
+        ("MLmodel", 10),
+        ("model/model.safetensors", 100),
+        ("model/config.json", 1),
+        ("a/x.safetensors", 1),
+        ("b/x.safetensors", 1),
+    ]
+    metadata = {"checkpoint_sha256": {"model.safetensors": "abc", "config.json": "def", "x.safetensors": "ghi"}}
+    assert known_digests(files, metadata) == {"model/model.safetensors": "abc"}
+    assert known_digests(files, {}) == {}
+
+
+def test_new_version_skips_weights_recorded_in_metadata(tmp_path, weights):
+    (tmp_path / "weights").write_bytes(weights)
+    metadata = f"metadata:\n  checkpoint_sha256:\n    model.safetensors: {hash_file(str(tmp_path / 'weights'))}\n"
+    cache = ArtifactCache(str(tmp_path / "cache"), chunk_size=64_000)
+    cache.fetch("sqlcoder-v1", CountingRepo(write_model_version(str(tmp_path / "v1"), weights, metadata=metadata)))
+
+    repo = CountingRepo(write_model_version(str(tmp_path / "v2"), weights, b"adapter-v2", metadata=metadata))
+    v2 = cache.fetch("sqlcoder-v2", repo)
+    assert sorted(repo.downloads) == ["MLmodel", "model/adapter.safetensors"]
+    assert repo.ranges == []
+    assert read_model_dir(v2) == read_model_dir(repo.root)
+
+
+def test_fetch_refetches_missing_blobs(tmp_path, weights):
+    repo = CountingRepo(write_model_version(str(tmp_path / "v1"), weights))
+    cache = ArtifactCache(str(tmp_path / "cache"))
+    model_dir = cache.fetch("sqlcoder-v1", repo)
+    for digest in os.listdir(tmp_path / "cache" / "blobs"):
+        os.remove(tmp_path / "cache" / "blobs" / digest)
+    assert cache.cached_manifest("sqlcoder-v1") is None
+    assert read_model_dir(cache.fetch("sqlcoder-v1", repo)) == read_model_dir(repo.root)
+    assert model_dir == cache.fetch("sqlcoder-v1", repo)
+
+
+def fetch_in_process(cache_dir, repo_root, results):
+    repo = CountingRepo(repo_root)
+    model_dir = ArtifactCache(cache_dir, chunk_size=64_000).fetch("sqlcoder-v1", repo)
+    results.put((model_dir, len(repo.ranges) + len(repo.downloads)))
+
+
+def test_concurrent_processes_fetch_once(tmp_path, weights):
+    repo_root = write_model_version(str(tmp_path / "v1"), weights)
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=fetch_in_process, args=(str(tmp_path / "cache"), repo_root, results))
+        for _ in range(4)
+    ]
+    for process in processes:
+        process.start()
+    outputs = [results.get(timeout=60) for _ in processes]
+    for process in processes:
+        process.join()
+
+    assert len({model_dir for model_dir, _ in outputs}) == 1
+    # one process downloaded the version, the others waited on the lock and reused it
+    assert sorted(reads for _, reads in outputs)[:3] == [0, 0, 0]
+    assert read_model_dir(outputs[0][0]) == read_model_dir(repo_root)
+    assert os.listdir(tmp_path / "cache" / "tmp") == []
+
+
+
+def test_prune_waits_for_running_fetches(tmp_path, weights):
+    cache = ArtifactCache(str(tmp_path / "cache"))
+    downloading = threading.Event()
+    resume = threading.Event()
+
+    class SlowRepo(CountingRepo):
+        def download(self, relative_path, local_path):
+            super().download(relative_path, local_path)
+            if relative_path == "MLmodel":
+                downloading.set()
+                resume.wait(5)
+
+    repo = SlowRepo(write_model_version(str(tmp_path / "v1"), weights))
+    fetched = []
+    fetch = threading.Thread(target=lambda: fetched.append(cache.fetch("sqlcoder-v1", repo)))
+    fetch.start()
+    assert downloading.wait(5)
+    prune = threading.Thread(target=cache.prune, kwargs={"keep_keys": ["sqlcoder-v1"]})
+    prune.start()
+    prune.join(0.2)
+    # the blob of MLmodel is stored but in no manifest yet, prune must not delete it
+    assert prune.is_alive()
+    resume.set()
+    fetch.join(5)
+    prune.join(5)
+    assert read_model_dir(fetched[0]) == read_model_dir(repo.root)
+    assert cache.cached_manifest("sqlcoder-v1") is not None
+
+
+def test_cached_model_path_resolves_alias_to_cached_version(tmp_path, weights, monkeypatch):
+    cache = ArtifactCache(str(tmp_path / "cache"))
+    repo = CountingRepo(write_model_version(str(tmp_path / "v2"), weights))
+    v2 = cache.fetch(version_key("main.llms.sqlcoder", 2), repo)
+    reads = len(repo.ranges) + len(repo.downloads)
+    repo_uris = []
+    monkeypatch.setattr(artifact_cache, "MlflowArtifactRepo", lambda uri: repo_uris.append(uri) or repo)
+    client = FakeRegistryClient({"main.llms.sqlcoder": [1, 2]})
+    client.aliases[("main.llms.sqlcoder", "Champion")] = 2
+    registry_cache = RegistryCache(client)
+    assert cached_model_path("models:/main.llms.sqlcoder@Champion", str(tmp_path / "cache"), registry_cache) == v2
+    assert cached_model_path("models:/main.llms.sqlcoder/2", str(tmp_path / "cache"), registry_cache) == v2
+    assert repo_uris == ["fake:/main.llms.sqlcoder/2"] * 2
+    assert len(repo.ranges) + len(repo.downloads) == reads
@@ -0,0 +1,75 @@
+import datetime
+from decimal import Decimal
+
+import pandas as pd
+
+from text2sql_rag_model.model_deployment.text_to_sql.candidate_selection import (
+    build_sqlite_replica,
+    execute_candidate,
+    sample_rows_of,
+    select_candidate,
+)
+
+CREATE_FARM = """CREATE TABLE farm (\n  Farm_ID BIGINT,\n  Year BIGINT,\n  Cows DOUBLE)\nUSING delta\nCOMMENT 'farm animals'"""
+SAMPLE_ROWS = {
+    "asong_demo.data.farm": [
+        {"Farm_ID": 1, "Year": 2020, "Cows": 10.0},
+        {"Farm_ID": 2, "Year": 2021, "Cows": 30.0},
+    ]
+}
+
+
+def test_build_sqlite_replica_loads_samples():
+    connection = build_sqlite_replica([CREATE_FARM], SAMPLE_ROWS)
+    assert connection.execute("SELECT SUM(cows) FROM farm").fetchone() == (40.0,)
+
+
+def test_execute_candidate_reports_errors():
+    result, error = execute_candidate("SELECT pigs FROM farm", [CREATE_FARM])
+    assert result is None
+    assert "pigs" in error
+
+
+def test_execute_candidate_times_out():
+    cross_join = "SELECT COUNT(*) FROM farm a, farm b, farm c, farm d, farm e, farm f, farm g, farm h"
+    rows = {"farm": [{"Farm_ID": i} for i in range(30)]}
+    result, error = execute_candidate(cross_join, [CREATE_FARM], rows, timeout_s=0.05)
+    assert result is None
+    assert error
+
+
+def test_select_candidate_discards_failures_and_votes_on_results():
+    candidates = [
+        "SELECT pigs FROM farm",
+        "SELECT MIN(Cows) FROM farm",
+        "SELECT MAX(Cows) FROM farm",
+        "SELECT MAX(f.Cows) FROM farm AS f",
+    ]
+    assert select_candidate(candidates, [CREATE_FARM], SAMPLE_ROWS) == "SELECT MAX(Cows) FROM farm"
+
+
+def test_select_candidate_falls_back_to_first_candidate():
+    assert select_candidate(["SELECT a FROM x", "SELECT b FROM y"], [CREATE_FARM]) == "SELECT a FROM x"
+    assert select_candidate(["SELECT 1"], [CREATE_FARM]) == "SELECT 1"
+    assert select_candidate([], [CREATE_FARM]) == ""
+
+
+def test_select_candidate_without_samples_only_filters_failures():
+    candidates = ["SELECT pigs FROM farm", "SELECT MIN(Cows) FROM farm", "SELECT MAX(Cows) FROM farm"]
+    # both aggregates return a single NULL on the empty replica, the first one that runs wins
+    assert select_candidate(candidates, [CREATE_FARM]) == "SELECT MIN(Cows) FROM farm"
+
+
+def test_sample_rows_of_converts_to_sqlite_types():
+    df = pd.DataFrame(
+        {
+            "Cows": [Decimal("1.5"), None],
+            "Day": [pd.Timestamp("2024-01-02"), pd.NaT],
+            "Date": [datetime.date(2024, 1, 2), None],
+        }
+    )
+    rows = sample_rows_of(df)
+    assert rows[0] == {"Cows": 1.5, "Day": "2024-01-02T00:00:00", "Date": "2024-01-02"}
+    assert rows[1] == {"Cows": None, "Day": None, "Date": None}
+    connection = build_sqlite_replica(["CREATE TABLE t (Cows DOUBLE, Day TIMESTAMP, Date DATE)"], {"t": rows})
+    assert connection.execute("SELECT SUM(cows), COUNT(*) FROM t").fetchone() == (1.5, 2)
@@ -0,0 +1,111 @@
+import hashlib
+import json
+import os
+import shutil
+import struct
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from text2sql_rag_model.model_deployment.checkpoint_packaging import (
+    generation_eos_token_id,
+    read_safetensors_header,
+    upload_directory,
+    verify_checkpoint,
+)
+
+
+def write_safetensors(path, tensors):
+    """Write float16 tensors in the safetensors format: header length, JSON header, raw data."""
+    header, offset, data = {}, 0, []
+    for name, tensor in tensors.items():
+        raw = tensor.astype("<f2").tobytes()
+        header[name] = {"dtype": "F16", "shape": list(tensor.shape), "data_offsets": [offset, offset + len(raw)]}
+        offset += len(raw)
+        data.append(raw)
+    header_bytes = json.dumps(header).encode("utf-8")
+    with open(path, "wb") as f:
+        f.write(struct.pack("<Q", len(header_bytes)))
+        f.write(header_bytes)
+        for raw in data:
+            f.write(raw)
+
+
+@pytest.fixture
+def random_checkpoint(tmp_path):
+    """A tiny two-shard checkpoint with random weights, laid out like a Hugging Face snapshot."""
+    rng = np.random.default_rng(0)
+    checkpoint_dir = tmp_path / "checkpoint"
+    checkpoint_dir.mkdir()
+    shards = {
+        "model-00001-of-00002.safetensors": {f"layers.{i}.weight": rng.standard_normal((512, 512)) for i in range(8)},
+        "model-00002-of-00002.safetensors": {f"layers.{i}.weight": rng.standard_normal((512, 512)) for i in range(8, 12)},
+    }
+    weight_map = {}
+    for shard, tensors in shards.items():
+        write_safetensors(checkpoint_dir / shard, tensors)
+        weight_map.update({name: shard for name in tensors})
+    (checkpoint_dir / "model.safetensors.index.json").write_text(json.dumps({"weight_map": weight_map}))
+    (checkpoint_dir / "config.json").write_text(json.dumps({"model_type": "llama", "eos_token_id": 2}))
+    (checkpoint_dir / "tokenizer.json").write_text(json.dumps({"model": {"vocab": {}}}))
+    return checkpoint_dir
+
+
+def test_read_safetensors_header(random_checkpoint):
+    header = read_safetensors_header(random_checkpoint / "model-00002-of-00002.safetensors")
+    assert sorted(header) == ["layers.10.weight", "layers.11.weight", "layers.8.weight", "layers.9.weight"]
+    assert header["layers.8.weight"]["shape"] == [512, 512]
+
+
+def test_verify_checkpoint_hashes_every_file(random_checkpoint):
+    manifest = verify_checkpoint(str(random_checkpoint), max_workers=4)
+    assert len(manifest) == 5
+    shard = "model-00001-of-00002.safetensors"
+    expected = hashlib.sha256((random_checkpoint / shard).read_bytes()).hexdigest()
+    assert manifest[shard] == {"sha256": expected, "bytes": os.path.getsize(random_checkpoint / shard)}
+
+
+def test_verify_checkpoint_streams_weights(random_checkpoint):
+    shard_bytes = os.path.getsize(random_checkpoint / "model-00001-of-00002.safetensors")
+    tracemalloc.start()
+    verify_checkpoint(str(random_checkpoint), max_workers=1, chunk_size=64 * 1024)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # hashing reads fixed-size chunks, the weights are never held in memory at once
+    assert peak < shard_bytes / 4
+
+
+def test_verify_checkpoint_detects_missing_tensors(random_checkpoint):
+    write_safetensors(random_checkpoint / "model-00002-of-00002.safetensors", {"layers.8.weight": np.zeros((2, 2))})
+    with pytest.raises(ValueError, match="missing tensors"):
+        verify_checkpoint(str(random_checkpoint))
+
+
+def test_verify_checkpoint_requires_safetensors(tmp_path):
+    (tmp_path / "pytorch_model.bin").write_bytes(b"pickle")
+    with pytest.raises(ValueError, match="No safetensors"):
+        verify_checkpoint(str(tmp_path))
+
+
+def test_generation_eos_token_id(random_checkpoint):
+    assert generation_eos_token_id(str(random_checkpoint)) == 2
+    (random_checkpoint / "generation_config.json").write_text(json.dumps({"eos_token_id": 32021}))
+    assert generation_eos_token_id(str(random_checkpoint)) == 32021
+
+
+def test_upload_directory_keeps_layout(random_checkpoint, tmp_path):
+    (random_checkpoint / "components").mkdir()
+    (random_checkpoint / "components" / "special_tokens_map.json").write_text("{}")
+    artifact_root = tmp_path / "artifacts"
+
+    def log_artifact(local_path, artifact_path):
+        destination = artifact_root / artifact_path
+        destination.mkdir(parents=True, exist_ok=True)
+        shutil.copy(local_path, destination)
+
+    uploaded = upload_directory(str(random_checkpoint), log_artifact, "model", max_workers=4)
+    assert len(uploaded) == 6
+    assert (artifact_root / "model" / "components" / "special_tokens_map.json").exists()
+    for name in uploaded:
+        assert (artifact_root / "model" / name).read_bytes() == (random_checkpoint / name).read_bytes()
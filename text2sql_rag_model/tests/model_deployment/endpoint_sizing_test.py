@@ -0,0 +1,87 @@
+import json
+
+import pytest
+
+from text2sql_rag_model.model_deployment.endpoint_sizing import (
+    MockServingEndpoint,
+    apply_sizing_config,
+    choose_smallest,
+    http_invoker,
+    load_profile,
+    measure_curve,
+    replay,
+    summarize,
+    synthetic_profile,
+    throughput_candidates,
+    with_sizing,
+    workload_size_candidates,
+    write_sizing_config,
+)
+
+PAYLOADS = [{"prompt": ["How many farms are there?"]}]
+
+
+def test_synthetic_profile_rate():
+    profile = synthetic_profile(PAYLOADS, rate_qps=50, duration_s=10)
+    assert 400 < len(profile) < 600
+    assert all(a[0] <= b[0] for a, b in zip(profile, profile[1:]))
+
+
+def test_load_profile(tmp_path):
+    path = tmp_path / "profile.jsonl"
+    path.write_text(
+        "\n".join(json.dumps({"timestamp_ms": t, "request": PAYLOADS[0]}) for t in [2000, 1000, 1500])
+    )
+    assert [offset for offset, _ in load_profile(str(path))] == [0.0, 0.5, 1.0]
+
+
+def test_latency_grows_past_capacity():
+    profile = synthetic_profile(PAYLOADS, rate_qps=40, duration_s=1)
+    with MockServingEndpoint(capacity=1, service_time_s=0.05) as endpoint:
+        curve = measure_curve(http_invoker(endpoint.url), profile, rate_factors=[0.25, 1])
+    assert curve[0]["error_rate"] == 0
+    assert curve[1]["p95_latency_s"] > 3 * curve[0]["p95_latency_s"]
+
+
+def test_choose_smallest_size_meeting_slo():
+    profile = synthetic_profile(PAYLOADS, rate_qps=40, duration_s=1)
+    capacities = {"Small": 1, "Medium": 4, "Large": 16}
+    with MockServingEndpoint(service_time_s=0.05) as endpoint:
+        invoke = http_invoker(endpoint.url)
+
+        def measure(candidate):
+            endpoint.set_capacity(capacities[candidate["workload_size"]])
+            return summarize(replay(invoke, profile), profile[-1][0])
+
+        sizing, summary = choose_smallest(workload_size_candidates(), measure, p95_slo_s=0.2)
+    assert sizing == {"workload_size": "Medium"}
+    assert summary["p95_latency_s"] <= 0.2
+
+    with pytest.raises(ValueError):
+        choose_smallest([{"workload_size": "Small"}], lambda c: {"p95_latency_s": 1.0, "error_rate": 0}, 0.5)
+
+
+def test_apply_sizing_config(tmp_path):
+    config = {
+        "served_entities": [
+            {"entity_name": "m", "entity_version": 3, "max_provisioned_throughput": 970, "workload_size": "Small"}
+        ],
+        "auto_capture_config": {"catalog_name": "c"},
+    }
+    path = str(tmp_path / "endpoint_sizing.json")
+    assert apply_sizing_config(config, path) == config
+
+    write_sizing_config(path, throughput_candidates(970)[2], {"p95_latency_s": 1.0}, 2.0)
+    sized = apply_sizing_config(config, path)
+    assert sized["served_entities"] == [
+        {"entity_name": "m", "entity_version": 3, "min_provisioned_throughput": 0, "max_provisioned_throughput": 2910}
+    ]
+    assert sized["auto_capture_config"] == config["auto_capture_config"]
+
+
+def test_with_sizing_leaves_other_settings():
+    config = {"served_entities": [{"entity_name": "m", "entity_version": 3, "workload_size": "Small"}]}
+    assert with_sizing(config, {"workload_size": "Large"})["served_entities"] == [
+        {"entity_name": "m", "entity_version": 3, "workload_size": "Large"}
+    ]
+    assert config["served_entities"][0]["workload_size"] == "Small"
@@ -0,0 +1,63 @@
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from text2sql_rag_model.model_deployment.endpoint_warmup import (
+    KeepWarmSchedule,
+    keep_warm_cost,
+    keep_warm_once,
+    warm_up,
+)
+
+
+class ColdEndpoint:
+    """Fails the first `cold_requests` requests, like an endpoint scaling from zero."""
+
+    def __init__(self, cold_requests):
+        self.cold_requests = cold_requests
+        self.requests = []
+
+    def __call__(self, payload):
+        self.requests.append(payload)
+        if len(self.requests) <= self.cold_requests:
+            raise RuntimeError("503 Service Unavailable")
+        return {"generated_sql": ["SELECT 1"]}
+
+
+def test_warm_up_retries_until_endpoint_answers():
+    endpoint = ColdEndpoint(cold_requests=2)
+    report = warm_up(endpoint, [{"prompt": ["a"]}, {"prompt": ["b"]}], retry_interval_s=0)
+    assert len(endpoint.requests) == 5
+    assert len(report["warm_latencies_s"]) == 2
+
+
+def test_warm_up_times_out():
+    with pytest.raises(TimeoutError):
+        warm_up(ColdEndpoint(cold_requests=100), [{"prompt": ["a"]}], timeout_s=0.05, retry_interval_s=0.01)
+
+
+def test_schedule_is_active_during_business_hours():
+    schedule = KeepWarmSchedule(start_hour=8, end_hour=18, timezone="America/New_York")
+    tuesday_9am = datetime(2024, 6, 4, 9, tzinfo=ZoneInfo("America/New_York"))
+    assert schedule.is_active(tuesday_9am)
+    assert not schedule.is_active(datetime(2024, 6, 4, 7, tzinfo=ZoneInfo("America/New_York")))
+    assert not schedule.is_active(datetime(2024, 6, 8, 9, tzinfo=ZoneInfo("America/New_York")))
+    # 12:00 UTC is 8:00 in New York during daylight saving time
+    assert schedule.is_active(datetime(2024, 6, 4, 12, tzinfo=ZoneInfo("UTC")))
+    assert schedule.quartz_cron_expression() == "0 0/10 8-17 ? * MON,TUE,WED,THU,FRI"
+
+
+def test_keep_warm_once_only_pings_when_active():
+    endpoint = ColdEndpoint(cold_requests=0)
+    schedule = KeepWarmSchedule()
+    assert keep_warm_once(endpoint, {"prompt": ["a"]}, schedule, datetime(2024, 6, 8, 9, tzinfo=ZoneInfo("UTC"))) is None
+    ping = keep_warm_once(endpoint, {"prompt": ["a"]}, schedule, datetime(2024, 6, 4, 9, tzinfo=ZoneInfo("UTC")))
+    assert ping["ok"]
+    assert len(endpoint.requests) == 1
+
+
+def test_keep_warm_cost():
+    cost = keep_warm_cost(KeepWarmSchedule(), dbus_per_hour=10, dollars_per_dbu=1)
+    assert cost["keep_warm_dollars_per_week"] == 500
+    assert cost["always_on_dollars_per_week"] == 1680
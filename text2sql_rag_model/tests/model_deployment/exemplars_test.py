@@ -0,0 +1,118 @@
+import pickle
+
+import numpy as np
+
+from text2sql_rag_model.model_deployment.text_to_sql.exemplars import (
+    CachedEmbedder,
+    EndpointEmbedder,
+    ExemplarStore,
+    estimate_tokens,
+    format_exemplar,
+    select_within_budget,
+)
+
+
+VOCABULARY = ["farm", "cows", "competition", "city", "year", "theme", "horses", "count"]
+
+
+def bag_of_words(texts):
+    """Deterministic stand-in for an embedding model."""
+    return np.array([[text.lower().count(word) for word in VOCABULARY] for text in texts], dtype=np.float32)
+
+
+class FakeEmbeddingClient:
+    def __init__(self):
+        self.requests = []
+
+    def predict(self, endpoint, inputs):
+        self.requests.append(inputs["input"])
+        return {"data": [{"embedding": vector.tolist()} for vector in bag_of_words(inputs["input"])]}
+
+
+def build_store():
+    return ExemplarStore.build(
+        ["How many cows per farm?", "Which city hosted the competition?", "Broken query"],
+        ["SELECT Farm_ID, Cows FROM farm", "SELECT Host_city_ID FROM farm_competition", "SELEC nonsense FROM"],
+        bag_of_words,
+    )
+
+
+def test_build_keeps_only_valid_sql():
+    store = build_store()
+    assert len(store) == 2
+    assert "Broken query" not in store.questions
+
+
+def test_search_returns_most_similar_exemplars():
+    store = build_store()
+    results = store.search(bag_of_words(["Count the cows on each farm"])[0], k=2)
+    assert results[0]["question"] == "How many cows per farm?"
+    assert all(r["score"] >= 0.5 for r in results)
+    assert len(results) == 1
+
+
+def test_empty_store():
+    store = ExemplarStore.build([], [], bag_of_words)
+    assert not store
+    assert store.search(np.ones(len(VOCABULARY)), k=3) == []
+
+
+def test_store_pickles():
+    store = pickle.loads(pickle.dumps(build_store()))
+    assert store.search(bag_of_words(["competition city"])[0], k=1)[0]["sql"].startswith("SELECT Host_city_ID")
+
+
+def test_endpoint_embedder_batches_requests():
+    client = FakeEmbeddingClient()
+    vectors = EndpointEmbedder(client, "bge", batch_size=2)(["farm", "cows", "city"])
+    assert vectors.shape == (3, len(VOCABULARY))
+    assert [len(batch) for batch in client.requests] == [2, 1]
+
+
+def test_cached_embedder_embeds_missing_texts_in_one_call():
+    client = FakeEmbeddingClient()
+    embed = CachedEmbedder(EndpointEmbedder(client, "bge"))
+    batch = embed(["farm cows", "city", "farm cows", "year"])
+    assert np.array_equal(batch, bag_of_words(["farm cows", "city", "farm cows", "year"]))
+    assert client.requests == [["farm cows", "city", "year"]]
+
+    assert np.array_equal(embed(["city"])[0], bag_of_words(["city"])[0])
+    embed(["year", "theme"])
+    assert client.requests[1:] == [["theme"]]
+    assert embed.stats == {"hits": 3, "misses": 4, "calls": 2}
+
+
+def test_cached_embedder_evicts_least_recently_used():
+    client = FakeEmbeddingClient()
+    embed = CachedEmbedder(EndpointEmbedder(client, "bge"), maxsize=2)
+    embed(["farm"])
+    embed(["cows"])
+    embed(["farm"])
+    embed(["city"])  # evicts cows
+    embed(["farm", "cows"])
+    assert client.requests == [["farm"], ["cows"], ["city"], ["cows"]]
+
+
+def test_cached_embedder_pickles_without_entries():
+    embed = CachedEmbedder(bag_of_words)
+    embed(["farm"])
+    restored = pickle.loads(pickle.dumps(embed))
+    assert restored.stats == {"hits": 0, "misses": 0, "calls": 0}
+    assert np.array_equal(restored(["farm"]), bag_of_words(["farm"]))
+
+
+def test_select_within_budget():
+    blocks = ["a" * 40, "b" * 40, "c" * 400]
+    kept, remaining = select_within_budget(blocks, budget_tokens=30)
+    assert kept == blocks[:2]
+    assert remaining == 30 - 2 * estimate_tokens("a" * 40)
+
+    # the most relevant block is kept even when it alone exceeds the budget
+    kept, remaining = select_within_budget(["c" * 400, "a"], budget_tokens=10, min_blocks=1)
+    assert kept == ["c" * 400]
+    assert remaining < 0
+    assert select_within_budget(["a"], budget_tokens=remaining)[0] == []
+
+
+def test_format_exemplar():
+    assert format_exemplar({"question": "q?", "sql": "SELECT 1"}) == "Question: q?\nSQL: SELECT 1\n"
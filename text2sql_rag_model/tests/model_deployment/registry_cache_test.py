@@ -0,0 +1,145 @@
+import pytest
+
+from text2sql_rag_model.model_deployment.registry_cache import (
+    FakeRegistryClient,
+    RegistryCache,
+    TTLCache,
+    parse_model_uri,
+)
+
+
+MODEL = "main.llms.sqlcoder"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def calls_of(client, method):
+    return [call for call in client.calls if call[0] == method]
+
+
+def test_ttl_cache_expires_entries():
+    clock = FakeClock()
+    cache = TTLCache(ttl_s=10, clock=clock)
+    loads = []
+    assert cache.get("k", lambda: loads.append(1) or 1) == 1
+    clock.now = 9
+    assert cache.get("k", lambda: loads.append(2) or 2) == 1
+    clock.now = 10
+    assert cache.get("k", lambda: loads.append(3) or 3) == 3
+    assert loads == [1, 3]
+    assert cache.stats == {"hits": 1, "misses": 2}
+
+
+def test_latest_version_reads_one_ordered_result():
+    client = FakeRegistryClient({MODEL: list(range(1, 501))})
+    registry = RegistryCache(client)
+    assert registry.latest_version(MODEL) == 500
+    assert registry.latest_version(MODEL) == 500
+    assert calls_of(client, "search_model_versions") == [
+        ("search_model_versions", f"name='{MODEL}'", 1, ["version_number DESC"])
+    ]
+
+
+def test_latest_version_scans_when_registry_cant_order():
+    client = FakeRegistryClient({MODEL: [3, 12, 7], "other": [1, 2]}, supports_order_by=False)
+    registry = RegistryCache(client)
+    assert registry.latest_version(MODEL) == 12
+    assert registry.latest_version("other") == 2
+    # the unsupported ordered search is only tried once
+    assert [call[3] for call in calls_of(client, "search_model_versions")] == [["version_number DESC"], None, None]
+
+
+def test_unity_catalog_registry_scans_without_trying_to_order():
+    client = FakeRegistryClient({MODEL: [3, 12, 7]}, supports_order_by=False)
+    client._registry_uri = "databricks-uc"
+    assert RegistryCache(client).latest_version(MODEL) == 12
+    assert [call[3] for call in calls_of(client, "search_model_versions")] == [None]
+
+
+def test_transient_errors_keep_ordered_search():
+    client = FakeRegistryClient({MODEL: [3, 12, 7]})
+    search = client.search_model_versions
+    errors = [Exception("TEMPORARILY_UNAVAILABLE: registry overloaded")]
+
+    def flaky_search(*args, **kwargs):
+        if errors:
+            raise errors.pop()
+        return search(*args, **kwargs)
+
+    client.search_model_versions = flaky_search
+    registry = RegistryCache(client)
+    with pytest.raises(Exception, match="TEMPORARILY_UNAVAILABLE"):
+        registry.latest_version(MODEL)
+    assert registry.latest_version(MODEL) == 12
+    assert [call[3] for call in calls_of(client, "search_model_versions")] == [["version_number DESC"]]
+
+
+def test_latest_version_refreshes_after_ttl():
+    clock = FakeClock()
+    client = FakeRegistryClient({MODEL: [1, 2]})
+    registry = RegistryCache(client, ttl_s=60, clock=clock)
+    assert registry.latest_version(MODEL) == 2
+    client.versions[MODEL].append(3)
+    assert registry.latest_version(MODEL) == 2
+    clock.now = 60
+    assert registry.latest_version(MODEL) == 3
+
+
+def test_latest_version_of_unknown_model():
+    assert RegistryCache(FakeRegistryClient()).latest_version(MODEL) is None
+
+
+def test_resolve_uris():
+    client = FakeRegistryClient({MODEL: [1, 2, 3]})
+    client.aliases[(MODEL, "Champion")] = 2
+    registry = RegistryCache(client)
+    assert registry.resolve(f"models:/{MODEL}@Champion") == (MODEL, 2)
+    assert registry.resolve(f"models:/{MODEL}/latest") == (MODEL, 3)
+    assert registry.resolve(f"models:/{MODEL}/1") == (MODEL, 1)
+    registry.resolve(f"models:/{MODEL}@Champion")
+    assert len(calls_of(client, "get_model_version_by_alias")) == 1
+    assert calls_of(client, "search_model_versions")[0][2] == 1
+
+
+def test_set_alias_updates_cache():
+    client = FakeRegistryClient({MODEL: [1, 2]})
+    client.aliases[(MODEL, "Champion")] = 1
+    registry = RegistryCache(client)
+    assert registry.version_by_alias(MODEL, "Champion") == 1
+    registry.set_alias(MODEL, "Champion", 2)
+    assert registry.version_by_alias(MODEL, "Champion") == 2
+    assert client.aliases[(MODEL, "Champion")] == 2
+    assert len(calls_of(client, "get_model_version_by_alias")) == 1
+
+
+def test_latest_versions_batches_models():
+    client = FakeRegistryClient({f"model_{i}": list(range(1, i + 2)) for i in range(20)})
+    registry = RegistryCache(client)
+    names = [f"model_{i}" for i in range(20)]
+    assert registry.latest_versions(names + names[:5]) == {f"model_{i}": i + 1 for i in range(20)}
+    assert len(calls_of(client, "search_model_versions")) == 20
+    registry.latest_versions(names)
+    assert len(calls_of(client, "search_model_versions")) == 20
+
+
+def test_invalidate_one_model():
+    client = FakeRegistryClient({MODEL: [1], "other": [1]})
+    registry = RegistryCache(client)
+    registry.latest_versions([MODEL, "other"])
+    registry.invalidate(MODEL)
+    registry.latest_versions([MODEL, "other"])
+    assert [call[1] for call in calls_of(client, "search_model_versions")].count(f"name='{MODEL}'") == 2
+    assert [call[1] for call in calls_of(client, "search_model_versions")].count("name='other'") == 1
+
+
+def test_parse_model_uri():
+    assert parse_model_uri("models:/main.text2sql.sqlcoder/3") == ("main.text2sql.sqlcoder", "3", None)
+    assert parse_model_uri("models:/sqlcoder@Champion") == ("sqlcoder", None, "Champion")
+    with pytest.raises(ValueError):
+        parse_model_uri("runs:/abc/model")
@@ -0,0 +1,128 @@
+import pickle
+import threading
+import time
+
+import pytest
+
+LOCK = threading.Lock()
+
+from text2sql_rag_model.model_deployment.text_to_sql.resilient_invoker import (
+    ResilientInvoker,
+    should_fail_over,
+    status_code_of,
+)
+
+
+class FakeClient:
+    """Deployment client whose latency per call is scripted per endpoint."""
+
+    def __init__(self, latencies):
+        self.latencies = {endpoint: list(values) for endpoint, values in latencies.items()}
+        self.calls = []
+
+    def predict(self, endpoint, inputs):
+        with LOCK:
+            self.calls.append(endpoint)
+            latency = self.latencies[endpoint].pop(0) if len(self.latencies[endpoint]) > 1 else self.latencies[endpoint][0]
+        if isinstance(latency, Exception):
+            raise latency
+        time.sleep(latency)
+        return {"endpoint": endpoint, "latency": latency}
+
+
+def warm(invoker, n=20):
+    for _ in range(n):
+        invoker.predict({"prompt": ["q"]})
+
+
+def test_hedges_slow_calls_and_first_answer_wins():
+    client = FakeClient({"primary": [0.01] * 20 + [1.0, 0.01]})
+    invoker = ResilientInvoker(client, ["primary"], max_hedge_fraction=0.5, min_samples=20)
+    warm(invoker)
+    start = time.perf_counter()
+    response = invoker.predict({"prompt": ["q"]})
+    assert time.perf_counter() - start < 0.5
+    assert response["latency"] == 0.01
+    assert invoker.stats["hedges"] == 1
+    assert invoker.stats["hedge_wins"] == 1
+
+
+def test_hedging_is_capped():
+    client = FakeClient({"primary": [0.01] * 20 + [0.2]})
+    invoker = ResilientInvoker(client, ["primary"], max_hedge_fraction=0.1, min_samples=20)
+    warm(invoker)
+    for _ in range(10):
+        invoker.predict({"prompt": ["q"]})
+    assert invoker.stats["hedges"] <= 0.1 * invoker.stats["calls"]
+
+
+def test_fails_over_on_error_and_timeout():
+    client = FakeClient({"primary": [RuntimeError("503")], "secondary": [0.01]})
+    invoker = ResilientInvoker(client, ["primary", "secondary", None])
+    assert invoker.predict({"prompt": ["q"]})["endpoint"] == "secondary"
+
+    client = FakeClient({"primary": [0.01] * 20 + [2.0], "secondary": [0.01]})
+    invoker = ResilientInvoker(client, ["primary", "secondary"], min_timeout_s=0.1, max_hedge_fraction=0)
+    warm(invoker)
+    assert invoker.predict({"prompt": ["q"]})["endpoint"] == "secondary"
+    assert invoker.stats["timeouts"] == 1
+    assert invoker.stats["failovers"] == 1
+
+
+class HTTPError(Exception):
+    """Like requests.HTTPError, with the response attached."""
+
+    def __init__(self, status_code):
+        super().__init__(f"{status_code} Error")
+        self.response = type("Response", (), {"status_code": status_code})()
+
+
+def test_should_fail_over():
+    assert status_code_of(HTTPError(400)) == 400
+    assert status_code_of(Exception("400 Client Error: Bad Request for url: https://host/invocations")) == 400
+    assert status_code_of(ConnectionError("connection reset")) is None
+    assert should_fail_over(TimeoutError())
+    assert should_fail_over(HTTPError(503))
+    assert should_fail_over(HTTPError(429))
+    assert should_fail_over(ConnectionError("connection reset"))
+    assert not should_fail_over(HTTPError(400))
+    assert not should_fail_over(Exception("404 Client Error: Not Found for url: https://host/invocations"))
+
+
+def test_client_errors_do_not_fail_over():
+    client = FakeClient({"primary": [HTTPError(400)], "secondary": [0.01]})
+    invoker = ResilientInvoker(client, ["primary", "secondary"])
+    with pytest.raises(HTTPError):
+        invoker.predict({"prompt": ["q"]})
+    assert client.calls == ["primary"]
+    assert invoker.stats["failovers"] == 0
+
+    client = FakeClient({"primary": [HTTPError(429)], "secondary": [0.01]})
+    assert ResilientInvoker(client, ["primary", "secondary"]).predict({"prompt": ["q"]})["endpoint"] == "secondary"
+
+
+def test_timed_out_calls_count_against_the_endpoint():
+    client = FakeClient({"primary": [0.5], "secondary": [0.01]})
+    invoker = ResilientInvoker(client, ["primary", "secondary"], max_timeout_s=0.05, max_outstanding=2)
+    for _ in range(2):
+        assert invoker.predict({"prompt": ["q"]})["endpoint"] == "secondary"
+    # both primary calls timed out but still hold their thread, the next call skips the primary
+    assert invoker.predict({"prompt": ["q"]})["endpoint"] == "secondary"
+    assert client.calls.count("primary") == 2
+    assert invoker.stats == {"calls": 3, "hedges": 0, "hedge_wins": 0, "timeouts": 2, "failovers": 3, "saturated": 1}
+    time.sleep(0.6)
+    assert invoker._outstanding == {"primary": 0, "secondary": 0}
+
+
+def test_raises_when_all_endpoints_fail():
+    client = FakeClient({"primary": [RuntimeError("503")], "secondary": [ValueError("400")]})
+    with pytest.raises(ValueError):
+        ResilientInvoker(client, ["primary", "secondary"]).predict({"prompt": ["q"]})
+
+
+def test_pickles_with_latency_history():
+    invoker = ResilientInvoker(FakeClient({"primary": [0.0]}), ["primary"])
+    warm(invoker, 5)
+    restored = pickle.loads(pickle.dumps(invoker))
+    assert len(restored.trackers["primary"]) == 5
+    assert restored.predict({"prompt": ["q"]})["endpoint"] == "primary"
@@ -0,0 +1,147 @@
+import pandas as pd
+import pytest
+
+from text2sql_rag_model.model_deployment.rollout import (
+    FakeDeployClient,
+    RolloutError,
+    compare_versions,
+    rollout,
+    summarize_inference_logs,
+)
+
+
+ENDPOINT = "text2sqlrag"
+
+
+def entity(version):
+    return {"entity_name": "main.llms.text2sqlrag", "entity_version": version, "workload_size": "Small"}
+
+
+def deployed_client(version=1):
+    client = FakeDeployClient()
+    client.create_endpoint(ENDPOINT, {"served_entities": [entity(version)]})
+    return client
+
+
+def metrics(new_p95_ms=100.0, new_error_rate=0.0):
+    return lambda since_ms: {
+        "1": {"requests": 1000, "p95_latency_ms": 100.0, "error_rate": 0.0},
+        "2": {"requests": 100, "p95_latency_ms": new_p95_ms, "error_rate": new_error_rate},
+    }
+
+
+def routes(config):
+    return {r["served_model_name"]: r["traffic_percentage"] for r in config["traffic_config"]["routes"]}
+
+
+def test_summarize_inference_logs():
+    logs = pd.DataFrame(
+        {
+            "model_version": ["1"] * 4 + ["2"] * 2,
+            "status_code": [200, 200, 200, 500, 200, 200],
+            "execution_time_ms": [10, 20, 30, 5000, 40, 40],
+        }
+    )
+    summary = summarize_inference_logs(logs)
+    assert summary["1"]["requests"] == 4
+    assert summary["1"]["error_rate"] == 0.25
+    assert summary["1"]["p95_latency_ms"] <= 30
+    assert summary["2"] == {"requests": 2, "p95_latency_ms": 40.0, "error_rate": 0.0}
+
+
+def test_compare_versions():
+    current = {"requests": 1000, "p95_latency_ms": 100.0, "error_rate": 0.01}
+    assert compare_versions(current, {"requests": 100, "p95_latency_ms": 105.0, "error_rate": 0.01}) is None
+    assert "latency" in compare_versions(current, {"requests": 100, "p95_latency_ms": 150.0, "error_rate": 0.0})
+    assert "error rate" in compare_versions(current, {"requests": 100, "p95_latency_ms": 90.0, "error_rate": 0.05})
+    # not enough traffic on the new version to judge it
+    assert compare_versions(current, {"requests": 5, "p95_latency_ms": 500.0, "error_rate": 0.5}) is None
+
+
+def test_rollout_shifts_traffic_in_steps():
+    client = deployed_client()
+    history = rollout(client, ENDPOINT, entity(2), metrics(), sleep=lambda s: None)
+
+    assert [step["traffic_percentage"] for step in history] == [5, 25, 50]
+    configs = [config for _, config in client.config_history[1:]]
+    assert [routes(c) for c in configs] == [
+        {"text2sqlrag-1": 95, "text2sqlrag-2": 5},
+        {"text2sqlrag-1": 75, "text2sqlrag-2": 25},
+        {"text2sqlrag-1": 50, "text2sqlrag-2": 50},
+        {"text2sqlrag-2": 100},
+    ]
+    served = client.get_endpoint(ENDPOINT)["config"]["served_entities"]
+    assert [e["entity_version"] for e in served] == [2]
+
+
+def test_rollout_rolls_back_slower_version():
+    client = deployed_client()
+    with pytest.raises(RolloutError, match="5%"):
+        rollout(client, ENDPOINT, entity(2), metrics(new_p95_ms=300.0), sleep=lambda s: None)
+
+    config = client.get_endpoint(ENDPOINT)["config"]
+    assert [e["entity_version"] for e in config["served_entities"]] == [1]
+    assert routes(config) == {"text2sqlrag-1": 100}
+
+
+def test_rollout_rolls_back_failing_version():
+    client = deployed_client()
+    with pytest.raises(RolloutError, match="error rate"):
+        rollout(client, ENDPOINT, entity(2), metrics(new_error_rate=0.2), sleep=lambda s: None)
+    assert client.get_endpoint(ENDPOINT)["config"]["served_entities"][0]["entity_version"] == 1
+
+
+def test_rollout_skips_version_already_served():
+    client = deployed_client(version=2)
+    assert rollout(client, ENDPOINT, entity(2), metrics(), sleep=lambda s: None) == []
+    assert len(client.config_history) == 1
+
+
+def test_rollout_extends_bake_until_requests_are_logged():
+    client = deployed_client()
+    reads = []
+
+    def late_metrics(since_ms):
+        reads.append(since_ms)
+        # the inference table lags: nothing for the new version on the first read of each step
+        return metrics()(since_ms) if len(reads) % 2 == 0 else {"1": metrics()(since_ms)["1"]}
+
+    waits = []
+    history = rollout(client, ENDPOINT, entity(2), late_metrics, poll_interval_s=60, sleep=waits.append)
+    assert [step["traffic_percentage"] for step in history] == [5, 25, 50]
+    assert waits.count(60) == 3
+    assert client.get_endpoint(ENDPOINT)["config"]["served_entities"][0]["entity_version"] == 2
+
+
+def test_rollout_rolls_back_when_new_version_cant_be_judged():
+    client = deployed_client()
+    no_traffic = lambda since_ms: {"1": {"requests": 1000, "p95_latency_ms": 100.0, "error_rate": 0.0}}
+    with pytest.raises(RolloutError, match="fewer than 20 requests"):
+        rollout(
+            client, ENDPOINT, entity(2), no_traffic, bake_time_s=600, max_bake_time_s=1200, poll_interval_s=300,
+            sleep=lambda s: None,
+        )
+    config = client.get_endpoint(ENDPOINT)["config"]
+    assert [e["entity_version"] for e in config["served_entities"]] == [1]
+
+
+def test_rollout_warms_up_new_version_before_shifting_traffic():
+    client = deployed_client()
+    warmed = []
+
+    def warmup(served_name):
+        warmed.append((served_name, routes(client.get_endpoint(ENDPOINT)["config"])))
+
+    rollout(client, ENDPOINT, entity(2), metrics(), warmup=warmup, sleep=lambda s: None)
+    assert warmed == [("text2sqlrag-2", {"text2sqlrag-1": 100, "text2sqlrag-2": 0})]
+
+
+def test_rollout_rolls_back_when_warmup_fails():
+    client = deployed_client()
+
+    def warmup(served_name):
+        raise TimeoutError("no answer")
+
+    with pytest.raises(RolloutError, match="warmup failed"):
+        rollout(client, ENDPOINT, entity(2), metrics(), warmup=warmup, sleep=lambda s: None)
+    assert routes(client.get_endpoint(ENDPOINT)["config"]) == {"text2sqlrag-1": 100}
@@ -0,0 +1,55 @@
+import json
+import pickle
+
+import pytest
+
+from text2sql_rag_model.model_deployment.text_to_sql.routing import LARGE, SMALL, QueryRouter, mean_token_logprob
+
+SCHEMA = {"farm": {"farm_id", "year", "cows"}}
+
+
+def test_routes_short_single_table_questions_to_small_model():
+    router = QueryRouter()
+    route, features = router.route("How many farms are there?", [0.82, 0.61, 0.55])
+    assert route == SMALL
+    assert features["relevant_tables"] == 1
+
+
+def test_routes_ambiguous_or_long_questions_to_large_model():
+    router = QueryRouter()
+    assert router.route("How many farms are there?", [0.80, 0.79, 0.78])[0] == LARGE
+    long_question = " ".join(["word"] * 30)
+    assert router.route(long_question, [0.82, 0.61])[0] == LARGE
+    assert router.route("How many farms are there?", [])[0] == LARGE
+
+
+def test_single_table_has_no_score_margin(capsys):
+    router = QueryRouter()
+    route, features = router.route("How many farms are there?", [0.82])
+    assert route == SMALL
+    assert features["score_margin"] is None
+    router.log_decision(route, features)
+    line = capsys.readouterr().out.strip().removeprefix("routing: ")
+    assert json.loads(line, parse_constant=lambda constant: pytest.fail(f"invalid JSON {constant}"))["score_margin"] is None
+
+
+def test_escalation_reason():
+    router = QueryRouter(min_mean_logprob=-0.5)
+    assert router.escalation_reason("SELECT COUNT(*) FROM farm", SCHEMA, -0.1) is None
+    assert router.escalation_reason("SELECT COUNT(*) FROM farm", SCHEMA, None) is None
+    assert router.escalation_reason("SELECT pigs FROM farm", SCHEMA, -0.1).startswith("invalid SQL")
+    assert router.escalation_reason("SELECT COUNT(*) FROM farm", SCHEMA, -2.0).startswith("low confidence")
+
+
+def test_mean_token_logprob():
+    assert mean_token_logprob({"text": "SELECT 1"}) is None
+    assert mean_token_logprob({"logprobs": {"token_logprobs": [-0.5, None, -1.5]}}) == -1.0
+
+
+def test_log_decision_counts(capsys):
+    router = QueryRouter()
+    router.log_decision(SMALL, {"question_words": 4}, latency_saved_s=1.5)
+    router.log_decision(SMALL, {"question_words": 4}, "invalid SQL", latency_saved_s=-0.5)
+    assert router.stats == {"small": 2, "large": 0, "escalated": 1, "latency_saved_s": 1.0}
+    assert '"route": "small"' in capsys.readouterr().out
+    assert pickle.loads(pickle.dumps(router)).stats["small"] == 0
@@ -0,0 +1,204 @@
+import pickle
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from text2sql_rag_model.model_deployment.text_to_sql.schema_snapshot import (
+    SCHEMA_COLUMNS,
+    SCHEMA_SNAPSHOT_ENV_VAR,
+    SchemaSnapshot,
+    SnapshotRefresher,
+    embedding_endpoint_name,
+    embedding_source_column,
+    index_score,
+    index_version,
+    scan_rows,
+    snapshot_enabled,
+)
+
+
+EMBEDDINGS = {"farms": [1.0, 0.0, 0.0], "cows": [0.0, 1.0, 0.0], "milk": [0.0, 0.0, 1.0]}
+
+
+def embed(texts):
+    return np.array([EMBEDDINGS[text] for text in texts], dtype=np.float32)
+
+
+def row(name):
+    return {
+        "TableName": name,
+        "CreateTableStatement": f"CREATE TABLE {name} (id INT)",
+        SCHEMA_COLUMNS[2]: f"{name} table",
+    }
+
+
+def scan_page(name):
+    return {"fields": [{"key": key, "value": {"string_value": value}} for key, value in row(name).items()]}
+
+
+def test_index_version():
+    assert index_version({"status": {"triggered_update_status": {"last_processed_commit_version": "7"}}}) == 7
+    assert index_version({"continuous_update_status": {"last_processed_commit_version": 3}}) == 3
+    assert index_version({"status": {"ready": True}}) is None
+
+
+def test_embedding_source_column():
+    description = {"delta_sync_index_spec": {"embedding_source_columns": [{"name": "TableDescription"}]}}
+    assert embedding_source_column(description) == "TableDescription"
+    assert embedding_source_column({}) == "TableName"
+
+
+def test_embedding_endpoint_name():
+    description = {
+        "delta_sync_index_spec": {
+            "embedding_source_columns": [
+                {"name": "TableName", "embedding_model_endpoint_name": "databricks-bge-large-en"}
+            ]
+        }
+    }
+    assert embedding_endpoint_name(description) == "databricks-bge-large-en"
+    assert embedding_endpoint_name({"delta_sync_index_spec": {"embedding_vector_columns": []}}) is None
+
+
+def test_scan_rows_pages_through_the_index():
+    pages = {
+        None: {"data": [scan_page("farms"), scan_page("cows")], "last_primary_key": "cows"},
+        "cows": {"data": [scan_page("milk")], "last_primary_key": "milk"},
+        "milk": {"data": [], "last_primary_key": None},
+    }
+    calls = []
+
+    def scan(num_results, last_primary_key):
+        calls.append(last_primary_key)
+        return pages[last_primary_key]
+
+    rows = scan_rows(scan, ["TableName"], page_size=2)
+    assert rows == [{"TableName": "farms"}, {"TableName": "cows"}, {"TableName": "milk"}]
+    assert calls == [None, "cows", "milk"]
+
+
+def test_snapshot_search_returns_similarity_search_rows():
+    snapshot = SchemaSnapshot.build(4, [row("farms"), row("cows"), row("milk")], embed)
+    results = snapshot.search(np.array([0.1, 0.9, 0.0]), k=2)
+    assert [result[0] for result in results] == ["cows", "farms"]
+    assert results[0][:3] == [row("cows")[column] for column in SCHEMA_COLUMNS]
+    assert results[0][3] > results[1][3]
+    assert len(snapshot) == 3
+
+
+def test_index_score():
+    assert index_score(1.0) == 1.0
+    assert index_score(0.0) == pytest.approx(1 / 3)
+
+
+def test_empty_snapshot():
+    snapshot = SchemaSnapshot.build(1, [], embed)
+    assert snapshot.search(np.array([1.0, 0.0, 0.0])) == []
+
+
+class Source:
+    """Versioned rows, counting snapshot loads."""
+
+    def __init__(self):
+        self.version = 1
+        self.rows = [row("farms")]
+        self.loads = 0
+        self.error = None
+
+    def current_version(self):
+        if self.error:
+            raise self.error
+        return self.version
+
+    def load(self, version):
+        self.loads += 1
+        return SchemaSnapshot.build(version, list(self.rows), embed)
+
+
+def test_refresh_swaps_only_on_new_versions():
+    source = Source()
+    refresher = SnapshotRefresher(source.current_version, source.load)
+    assert refresher.current is None
+    assert refresher.refresh()
+    assert not refresher.refresh()
+    assert source.loads == 1
+
+    first = refresher.current
+    source.version, source.rows = 2, [row("farms"), row("cows")]
+    assert refresher.refresh()
+    assert refresher.version == 2
+    assert len(refresher.current) == 2
+    # a request still holding the previous snapshot keeps a consistent view
+    assert first.version == 1 and len(first) == 1
+    assert refresher.stats == {"checks": 3, "reloads": 2, "failures": 0}
+
+
+def test_failed_refresh_keeps_serving_the_current_snapshot():
+    source = Source()
+    refresher = SnapshotRefresher(source.current_version, source.load)
+    refresher.refresh()
+    source.error = ConnectionError("vector search unavailable")
+    assert not refresher.refresh()
+    assert refresher.version == 1
+    assert refresher.stats["failures"] == 1
+
+
+def test_background_thread_picks_up_new_versions():
+    source = Source()
+    refresher = SnapshotRefresher(source.current_version, source.load, interval_s=0.01)
+    refresher.start()
+    refresher.start()
+    try:
+        deadline = time.monotonic() + 5
+        while refresher.version != 1:
+            assert time.monotonic() < deadline
+            time.sleep(0.005)
+        source.version = 2
+        while refresher.version != 2:
+            assert time.monotonic() < deadline
+            time.sleep(0.005)
+    finally:
+        refresher.stop(timeout_s=5)
+    assert source.loads == 2
+
+
+def test_readers_never_wait_on_a_slow_load():
+    source = Source()
+    refresher = SnapshotRefresher(source.current_version, source.load)
+    refresher.refresh()
+    loading, release = threading.Event(), threading.Event()
+
+    def slow_load(version):
+        loading.set()
+        release.wait(5)
+        return source.load(version)
+
+    refresher.load = slow_load
+    source.version = 2
+    thread = threading.Thread(target=refresher.refresh)
+    thread.start()
+    assert loading.wait(5)
+    # the old snapshot is served while the new one is built
+    assert refresher.current.version == 1
+    release.set()
+    thread.join(5)
+    assert refresher.current.version == 2
+
+
+def test_pickle_drops_the_snapshot():
+    source = Source()
+    refresher = SnapshotRefresher(source.current_version, source.load, interval_s=5)
+    refresher.refresh()
+    restored = pickle.loads(pickle.dumps(refresher))
+    assert restored.current is None
+    assert restored.interval_s == 5
+    assert restored.stats["reloads"] == 0
+
+
+def test_snapshot_enabled_only_when_opted_in(monkeypatch):
+    monkeypatch.delenv(SCHEMA_SNAPSHOT_ENV_VAR, raising=False)
+    assert not snapshot_enabled()
+    monkeypatch.setenv(SCHEMA_SNAPSHOT_ENV_VAR, "true")
+    assert snapshot_enabled()
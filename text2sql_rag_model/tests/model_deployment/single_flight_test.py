@@ -0,0 +1,96 @@
+import pickle
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from text2sql_rag_model.model_deployment.text_to_sql.single_flight import SingleFlight, normalize_question
+
+
+def wait_for(condition, timeout_s=5):
+    deadline = time.monotonic() + timeout_s
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def test_normalize_question():
+    assert normalize_question("  How many  cows are there? ") == "how many cows are there"
+    assert normalize_question("HOW MANY\tcows are there.") == "how many cows are there"
+
+
+def test_concurrent_calls_share_one_execution():
+    single_flight = SingleFlight()
+    release = threading.Event()
+    executions = []
+
+    def generate():
+        executions.append(1)
+        release.wait(5)
+        return {"generated_sql": "SELECT 1", "tables": ["farm"]}
+
+    with ThreadPoolExecutor(max_workers=10) as executor:
+        futures = [executor.submit(single_flight.do, "q", generate) for _ in range(10)]
+        wait_for(lambda: single_flight.stats["calls"] == 10)
+        release.set()
+        results = [f.result() for f in futures]
+
+    assert len(executions) == 1
+    assert single_flight.stats == {"calls": 10, "executions": 1, "coalesced": 9}
+    assert sorted(coalesced for _, coalesced in results) == [False] + [True] * 9
+    # every caller gets its own copy
+    values = [value for value, _ in results]
+    assert all(value == {"generated_sql": "SELECT 1", "tables": ["farm"]} for value in values)
+    values[0]["tables"].append("cows")
+    assert values[1]["tables"] == ["farm"]
+    assert single_flight.in_flight() == 0
+
+
+def test_different_keys_run_separately():
+    single_flight = SingleFlight()
+    release = threading.Event()
+
+    def generate(key):
+        release.wait(5)
+        return key
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(single_flight.do, key, lambda key=key: generate(key)) for key in "abab"]
+        wait_for(lambda: single_flight.stats["calls"] == 4)
+        release.set()
+        assert [f.result()[0] for f in futures] == list("abab")
+    assert single_flight.stats == {"calls": 4, "executions": 2, "coalesced": 2}
+
+
+def test_completed_calls_are_not_cached():
+    single_flight = SingleFlight()
+    assert single_flight.do("q", lambda: 1) == (1, False)
+    assert single_flight.do("q", lambda: 2) == (2, False)
+
+
+def test_errors_reach_every_caller():
+    single_flight = SingleFlight()
+    release = threading.Event()
+
+    def fail():
+        release.wait(5)
+        raise RuntimeError("endpoint error")
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        futures = [executor.submit(single_flight.do, "q", fail) for _ in range(3)]
+        wait_for(lambda: single_flight.stats["calls"] == 3)
+        release.set()
+        for future in futures:
+            with pytest.raises(RuntimeError, match="endpoint error"):
+                future.result()
+    assert single_flight.in_flight() == 0
+    assert single_flight.do("q", lambda: "recovered") == ("recovered", False)
+
+
+def test_pickle_resets_runtime_state():
+    single_flight = SingleFlight()
+    single_flight.do("q", lambda: 1)
+    restored = pickle.loads(pickle.dumps(single_flight))
+    assert restored.stats == {"calls": 0, "executions": 0, "coalesced": 0}
+    assert restored.do("q", lambda: 2) == (2, False)
@@ -0,0 +1,52 @@
+from text2sql_rag_model.model_deployment.text_to_sql.sql_validation import (
+    build_repair_prompt,
+    extract_sql,
+    parse_schema,
+    validate_sql,
+)
+
+CREATE_FARM = """CREATE TABLE farm (\n  Farm_ID BIGINT,\n  Year BIGINT,\n  Cows DOUBLE)\nUSING delta\nCOMMENT 'The \\'farm\\' table contains data related to various farm animals.'"""
+CREATE_COMPETITION = """CREATE TABLE asong_demo.data.farm_competition (\n  Competition_ID BIGINT,\n  Year BIGINT,\n  Theme STRING)\nUSING delta"""
+
+
+def schema():
+    return parse_schema([CREATE_FARM, CREATE_COMPETITION, "not a create statement ("])
+
+
+def test_parse_schema():
+    assert schema() == {
+        "farm": {"farm_id", "year", "cows"},
+        "farm_competition": {"competition_id", "year", "theme"},
+    }
+
+
+def test_extract_sql():
+    assert extract_sql("Given ...[SQL]\nSELECT 1;</s>") == "SELECT 1;"
+    assert extract_sql("SELECT MAX(f.Cows) FROM farm f;") == "SELECT MAX(f.Cows) FROM farm f;"
+
+
+def test_validate_sql_accepts_valid_queries():
+    assert validate_sql("SELECT MAX(f.Cows) AS max_cows, MIN(Cows) FROM farm f ORDER BY max_cows", schema()) is None
+    assert (
+        validate_sql(
+            "WITH c AS (SELECT Year, COUNT(*) AS n FROM farm_competition GROUP BY Year) "
+            "SELECT f.Year, c.n FROM farm f JOIN c ON f.Year = c.Year",
+            schema(),
+        )
+        is None
+    )
+
+
+def test_validate_sql_rejects_invalid_queries():
+    assert "does not parse" in validate_sql("SELECT FROM WHERE (", schema())
+    assert "`pigs`" in validate_sql("SELECT pigs FROM farm", schema()).lower()
+    assert "barn" in validate_sql("SELECT * FROM barn", schema())
+    assert "read-only" in validate_sql("DROP TABLE farm", schema())
+    assert validate_sql("", schema()) == "The query is empty."
+
+
+def test_build_repair_prompt_inserts_feedback_before_answer():
+    prompt = "### Task\nq\n### Answer\n[SQL]"
+    repaired = build_repair_prompt(prompt, "SELECT pigs FROM farm", "Column `pigs` does not exist")
+    assert repaired.index("### Previous Attempt") < repaired.index("### Answer")
+    assert repaired.endswith("### Answer\n[SQL]")
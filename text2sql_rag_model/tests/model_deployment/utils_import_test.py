@@ -0,0 +1,37 @@
+import json
+import os
+import subprocess
+import sys
+
+import text2sql_rag_model
+
+
+# generous for slow CI machines, importing torch alone takes several seconds
+IMPORT_TIME_BUDGET_S = 1.5
+HEAVY_MODULES = ["torch", "transformers", "mlflow", "databricks", "pyspark"]
+
+MEASURE_IMPORT = f"""
+import json, sys, time
+start = time.perf_counter()
+import text2sql_rag_model.model_deployment.utils
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "heavy": [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))
+"""
+
+
+def measure_import():
+    """Import the module in a fresh interpreter, so that modules imported by other tests don't hide its cost."""
+    package_parent = os.path.dirname(os.path.dirname(text2sql_rag_model.__file__))
+    output = subprocess.run(
+        [sys.executable, "-c", MEASURE_IMPORT], cwd=package_parent, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def test_utils_import_defers_heavy_dependencies():
+    assert measure_import()["heavy"] == []
+
+
+def test_utils_import_time():
+    seconds = min(measure_import()["seconds"] for _ in range(3))
+    assert seconds < IMPORT_TIME_BUDGET_S
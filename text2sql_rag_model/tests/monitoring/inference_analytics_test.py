@@ -0,0 +1,121 @@
+import json
+
+import pandas as pd
+
+from text2sql_rag_model.monitoring.inference_analytics import (
+    HOUR_MS,
+    checkpoint_ms,
+    detect_regressions,
+    extract_question,
+    hourly_aggregates,
+    parse_requests,
+    run_local,
+)
+
+
+def captured(hour, question, latency_ms=100, status_code=200, prompt_tokens=500, completion_tokens=30, offset_ms=0):
+    prompt = f"### Task\nGenerate a SQL query to answer [QUESTION]{question}[/QUESTION]\n[SQL]"
+    response = {"choices": [{"text": "SELECT 1"}], "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens}}
+    return {
+        "timestamp_ms": hour * HOUR_MS + offset_ms,
+        "status_code": status_code,
+        "execution_time_ms": latency_ms,
+        "request": json.dumps({"prompt": [prompt]}),
+        "response": json.dumps(response) if status_code == 200 else None,
+    }
+
+
+def hour_of_requests(hour, count=30, latency_ms=100, errors=0):
+    return [
+        captured(hour, f"question {i}", latency_ms=latency_ms, status_code=500 if i < errors else 200, offset_ms=i)
+        for i in range(count)
+    ]
+
+
+def test_extract_question():
+    request = captured(0, "How many  Farms?")["request"]
+    assert extract_question(request) == "how many farms?"
+    assert extract_question(json.dumps({"prompt": ["plain prompt"]})) == "plain prompt"
+
+
+def test_hourly_aggregates():
+    logs = pd.DataFrame(
+        [
+            captured(0, "how many farms?", latency_ms=100),
+            captured(0, "How many farms?", latency_ms=200, offset_ms=1),
+            captured(0, "list cities", status_code=500, offset_ms=2),
+            captured(1, "list cities", latency_ms=50, prompt_tokens=800),
+        ]
+    )
+    aggregates = hourly_aggregates(parse_requests(logs)).set_index("hour")
+
+    first = aggregates.loc[0]
+    assert first["requests"] == 3
+    assert abs(first["error_rate"] - 1 / 3) < 1e-9
+    assert first["p50_latency_ms"] == 150
+    assert first["mean_prompt_tokens"] == 500
+    assert abs(first["duplicate_fraction"] - 1 / 3) < 1e-9
+    assert aggregates.loc[HOUR_MS]["mean_prompt_tokens"] == 800
+
+
+def test_run_local_is_incremental(tmp_path):
+    payload_dir = tmp_path / "payload"
+    payload_dir.mkdir()
+    aggregate_path = str(tmp_path / "aggregates.parquet")
+
+    pd.DataFrame(hour_of_requests(0) + hour_of_requests(1, count=10)).to_parquet(payload_dir / "part-0.parquet")
+    aggregates, alerts = run_local(str(payload_dir), aggregate_path)
+    assert aggregates["requests"].tolist() == [30, 10]
+    assert alerts == []
+
+    # the rest of hour 1 and hour 2 arrive, hour 1 is recomputed from all its requests
+    later = [captured(1, f"late {i}", offset_ms=100 + i) for i in range(20)] + hour_of_requests(2)
+    pd.DataFrame(later).to_parquet(payload_dir / "part-1.parquet")
+    aggregates, _ = run_local(str(payload_dir), aggregate_path)
+    assert aggregates["hour"].tolist() == [0, HOUR_MS, 2 * HOUR_MS]
+    assert aggregates["requests"].tolist() == [30, 30, 30]
+
+    # nothing new
+    aggregates, alerts = run_local(str(payload_dir), aggregate_path)
+    assert len(aggregates) == 3 and alerts == []
+
+
+def test_late_requests_for_earlier_hours_are_counted(tmp_path):
+    payload_dir = tmp_path / "payload"
+    payload_dir.mkdir()
+    aggregate_path = str(tmp_path / "aggregates.parquet")
+
+    pd.DataFrame([r for hour in range(4) for r in hour_of_requests(hour, count=10)]).to_parquet(
+        payload_dir / "part-0.parquet"
+    )
+    aggregates, _ = run_local(str(payload_dir), aggregate_path)
+    assert checkpoint_ms(aggregates) == 0
+    assert checkpoint_ms(aggregates, lag_hours=1) == 2 * HOUR_MS
+
+    # requests of hours 1 and 2 land after hour 3 was aggregated
+    late = [captured(hour, f"late {i}", offset_ms=100 + i) for hour in (1, 2) for i in range(5)]
+    pd.DataFrame(late + hour_of_requests(4, count=10)).to_parquet(payload_dir / "part-1.parquet")
+    aggregates, _ = run_local(str(payload_dir), aggregate_path)
+    assert aggregates["requests"].tolist() == [10, 15, 15, 10, 10]
+
+
+def test_detect_regressions():
+    history = [row for hour in range(5) for row in hour_of_requests(hour)]
+    steady = hourly_aggregates(parse_requests(pd.DataFrame(history)))
+    assert detect_regressions(steady) == []
+
+    # hour 5 is complete once a request of hour 6 is captured
+    slow_hour = hour_of_requests(5, latency_ms=400, errors=6) + [captured(6, "next hour")]
+    alerts = detect_regressions(hourly_aggregates(parse_requests(pd.DataFrame(history + slow_hour))))
+    assert any("p95_latency_ms" in alert for alert in alerts)
+    assert any("error rate" in alert for alert in alerts)
+    assert all(alert.startswith(str(pd.Timestamp(5 * HOUR_MS, unit="ms"))) for alert in alerts)
+
+
+def test_detect_regressions_ignores_partial_trailing_hour():
+    history = [row for hour in range(6) for row in hour_of_requests(hour)]
+    # the job ran 5 minutes into hour 6: its first slow requests don't make a regression yet
+    partial = [captured(6, f"question {i}", latency_ms=400, offset_ms=i * 10_000) for i in range(30)]
+    aggregates = hourly_aggregates(parse_requests(pd.DataFrame(history + partial)))
+    assert detect_regressions(aggregates) == []
+    assert aggregates["last_timestamp_ms"].max() == 6 * HOUR_MS + 290_000
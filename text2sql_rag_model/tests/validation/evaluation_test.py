@@ -0,0 +1,138 @@
+import math
+import sqlite3
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from text2sql_rag_model.validation.evaluation import (
+    PredictionCache,
+    check_thresholds,
+    dataset_hash,
+    exact_match,
+    execution_match,
+    is_ordered,
+    predict_questions,
+    score_predictions,
+    summarize_metrics,
+)
+
+
+@pytest.fixture
+def database(tmp_path):
+    path = str(tmp_path / "farm.sqlite")
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE farm (Farm_ID INTEGER, Year INTEGER, Cows REAL)")
+    connection.executemany("INSERT INTO farm VALUES (?, ?, ?)", [(1, 2020, 10.0), (2, 2021, 30.0)])
+    connection.commit()
+    connection.close()
+    return path
+
+
+def threshold(threshold=None, higher_is_better=True, min_absolute_change=None, min_relative_change=None):
+    # same attributes as mlflow.models.MetricThreshold
+    return SimpleNamespace(
+        threshold=threshold,
+        higher_is_better=higher_is_better,
+        min_absolute_change=min_absolute_change,
+        min_relative_change=min_relative_change,
+    )
+
+
+def test_exact_match_ignores_formatting():
+    assert exact_match("select max(Cows)  from farm;", "SELECT MAX(cows) FROM farm") == 1.0
+    assert exact_match("SELECT MIN(Cows) FROM farm", "SELECT MAX(Cows) FROM farm") == 0.0
+
+
+def test_execution_match(database):
+    target = "SELECT MAX(Cows) FROM farm"
+    assert execution_match("SELECT MAX(f.Cows) AS m FROM farm f", target, database) == 1.0
+    assert execution_match("SELECT MIN(Cows) FROM farm", target, database) == 0.0
+    assert execution_match("SELECT pigs FROM farm", target, database) == 0.0
+    assert execution_match("SELECT Year FROM farm", "SELECT Year FROM farm ORDER BY Year DESC", database) == 0.0
+
+
+def test_execution_match_ignores_nested_order_by(database):
+    target = "SELECT Year FROM (SELECT Year, Cows FROM farm ORDER BY Year DESC LIMIT 10) WHERE Cows > 0"
+    assert execution_match("SELECT Year FROM farm WHERE Cows > 0", target, database) == 1.0
+    assert not is_ordered("SELECT 'order by' AS label FROM farm")
+    assert is_ordered("SELECT Year FROM farm ORDER BY Year")
+
+
+def test_execution_match_skips_broken_reference_queries(database):
+    assert math.isnan(execution_match("SELECT MAX(Cows) FROM farm", "SELECT pigs FROM farm", database))
+
+
+def test_predict_questions_runs_in_parallel():
+    def predict_fn(question):
+        time.sleep(0.1)
+        return f"SELECT '{question}'", 100
+
+    start = time.perf_counter()
+    predictions = predict_questions(predict_fn, ["a", "b", "c", "d"], max_workers=4)
+    assert time.perf_counter() - start < 0.3
+    assert predictions["prediction"].tolist() == ["SELECT 'a'", "SELECT 'b'", "SELECT 'c'", "SELECT 'd'"]
+    assert (predictions["latency_s"] >= 0.1).all()
+
+
+def test_score_and_summarize():
+    predictions = predict_questions(lambda q: (q, 10), ["SELECT 1", "SELECT 2"])
+    scored = score_predictions(predictions, ["SELECT 1", "SELECT 3"], {"exact_match": exact_match})
+    metrics = summarize_metrics(scored, ["exact_match"])
+    assert metrics["exact_match"] == 0.5
+    assert metrics["mean_prompt_tokens"] == 10
+    assert metrics["p95_latency_s"] >= metrics["p50_latency_s"]
+
+
+def test_check_thresholds():
+    thresholds = {
+        "execution_match": threshold(0.6, higher_is_better=True),
+        "p95_latency_s": threshold(10, higher_is_better=False, min_relative_change=0.0),
+    }
+    assert check_thresholds({"execution_match": 0.7, "p95_latency_s": 4.0}, thresholds, {"p95_latency_s": 5.0}) == []
+    failures = check_thresholds({"execution_match": 0.5, "p95_latency_s": 6.0}, thresholds, {"p95_latency_s": 5.0})
+    assert len(failures) == 2
+    assert check_thresholds({}, thresholds) == ["execution_match: metric is missing", "p95_latency_s: metric is missing"]
+
+
+def test_check_thresholds_tolerates_small_regressions():
+    thresholds = {
+        "execution_match": threshold(0.6, higher_is_better=True, min_relative_change=0.0),
+        "p95_latency_s": threshold(15, higher_is_better=False, min_relative_change=0.0),
+    }
+    champion = {"execution_match": 0.8, "p95_latency_s": 2.0}
+    tolerances = {"execution_match": 0.02, "p95_latency_s": 0.1}
+    assert check_thresholds({"execution_match": 0.79, "p95_latency_s": 2.1}, thresholds, champion, tolerances) == []
+    # far slower than the Champion while still under the absolute threshold
+    failures = check_thresholds({"execution_match": 0.8, "p95_latency_s": 10.0}, thresholds, champion, tolerances)
+    assert len(failures) == 1 and failures[0].startswith("p95_latency_s")
+    failures = check_thresholds({"execution_match": 0.7, "p95_latency_s": 2.0}, thresholds, champion, tolerances)
+    assert len(failures) == 1 and failures[0].startswith("execution_match")
+
+
+def test_validation_thresholds_compare_with_the_champion():
+    pytest.importorskip("mlflow")
+    from text2sql_rag_model.validation.validation import baseline_tolerances, validation_thresholds
+
+    thresholds = validation_thresholds()
+    assert thresholds["p95_latency_s"].min_relative_change is not None
+    assert thresholds["execution_match"].min_relative_change is not None
+    assert set(baseline_tolerances()) <= set(thresholds)
+
+
+def test_prediction_cache_round_trip(tmp_path):
+    cache = PredictionCache(str(tmp_path))
+    data_hash = dataset_hash(["q1", "q2"], ["SELECT 1", "SELECT 2"])
+    assert cache.get("catalog.schema.model", 3, data_hash) is None
+
+    predictions = predict_questions(lambda q: ("SELECT 'x, y'", 42), ["q1", "q2"])
+    cache.put("catalog.schema.model", 3, data_hash, predictions)
+    cached = cache.get("catalog.schema.model", 3, data_hash)
+    assert cached["prediction"].tolist() == ["SELECT 'x, y'", "SELECT 'x, y'"]
+    assert cached["prompt_tokens"].tolist() == [42, 42]
+    assert cache.get("catalog.schema.model", 4, data_hash) is None
+
+
+def test_dataset_hash_changes_with_targets():
+    assert dataset_hash(["q"], ["SELECT 1"]) == dataset_hash(["q"], ["SELECT 1"])
+    assert dataset_hash(["q"], ["SELECT 1"]) != dataset_hash(["q"], ["SELECT 2"])
@@ -0,0 +1,39 @@
+import pandas as pd
+
+from text2sql_rag_model.vector_db.description_compression import (
+    COMPACT_DESCRIPTION_COLUMN,
+    compress_description,
+    compress_descriptions,
+)
+
+
+FARM_DESCRIPTION = (
+    "The \\'farm\\' table contains data related to various farm animals. It includes information such as the total "
+    "number of horses, cattle, oxen, and other livestock for a particular year. This data can be useful for analyzing "
+    "trends in animal populations over time and planning future farming strategies based on current stock levels."
+)
+
+
+def test_compress_description_drops_boilerplate_and_usage_prose():
+    compact = compress_description(FARM_DESCRIPTION)
+    assert compact == (
+        "Various farm animals. The total number of horses, cattle, oxen, and other livestock for a particular year."
+    )
+    assert len(compact.split()) < len(FARM_DESCRIPTION.split()) / 2
+
+
+def test_compress_description_respects_max_words():
+    assert compress_description(FARM_DESCRIPTION, max_words=5) == "Various farm animals."
+    assert len(compress_description("word " * 100, max_words=10).split()) == 10
+
+
+def test_compress_description_keeps_single_usage_sentence():
+    assert compress_description("This table can be used for billing.") == "This table can be used for billing."
+    assert compress_description(None) == ""
+
+
+def test_compress_descriptions_adds_column():
+    df = pd.DataFrame({"TableName": ["farm"], "TableDescription": [FARM_DESCRIPTION]})
+    compressed = compress_descriptions(df)
+    assert compressed[COMPACT_DESCRIPTION_COLUMN].iloc[0].startswith("Various farm animals.")
+    assert "TableDescription" in compressed
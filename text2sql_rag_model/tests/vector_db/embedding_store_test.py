@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from text2sql_rag_model.vector_db.embedding_store import (
+    EmbeddingStore,
+    benchmark_compression,
+    quantize_int8,
+)
+
+
+@pytest.fixture
+def embeddings():
+    rng = np.random.default_rng(42)
+    return rng.standard_normal((500, 64)).astype(np.float32)
+
+
+def test_search_returns_exact_neighbours_for_float32(embeddings):
+    store = EmbeddingStore([f"table_{i}" for i in range(500)], embeddings)
+    ids, scores = store.search(embeddings[[3, 7]], k=4)
+    assert ids[0][0] == "table_3"
+    assert ids[1][0] == "table_7"
+    assert scores.shape == (2, 4)
+    assert np.all(np.diff(scores, axis=1) <= 0)
+
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_compressed_store_keeps_top_result(embeddings, dtype):
+    store = EmbeddingStore(list(range(500)), embeddings, dtype=dtype, block_size=64)
+    indices, _ = store.search_indices(embeddings[:50], k=1)
+    assert (indices[:, 0] == np.arange(50)).mean() == 1.0
+
+
+def test_int8_uses_quarter_of_float32_memory(embeddings):
+    full = EmbeddingStore(list(range(500)), embeddings)
+    compact = EmbeddingStore(list(range(500)), embeddings, dtype="int8")
+    assert compact.nbytes < full.nbytes / 3.5
+
+
+def test_quantize_int8_round_trip():
+    vectors = np.array([[0.5, -1.0, 0.25], [0.0, 0.0, 0.0]], dtype=np.float32)
+    quantized, scales = quantize_int8(vectors)
+    assert quantized.dtype == np.int8
+    np.testing.assert_allclose(quantized * scales[:, None], vectors, atol=1e-2)
+
+
+def test_benchmark_reports_recall_and_memory():
+    results = benchmark_compression(num_vectors=2000, dim=32, num_queries=16, k=5)
+    assert [r["dtype"] for r in results] == ["float32", "float16", "int8"]
+    assert results[0]["recall_at_k"] == 1.0
+    assert all(r["recall_at_k"] > 0.8 for r in results)
+    assert results[2]["megabytes"] < results[0]["megabytes"]
@@ -0,0 +1,205 @@
+import multiprocessing
+import pickle
+import threading
+import time
+from collections import deque
+from types import SimpleNamespace
+
+import pytest
+
+from text2sql_rag_model.vector_db.rate_limiter import RateLimiter, is_rate_limited, retry_after_s
+
+
+class FakeClock:
+    """Wall clock that only moves when someone sleeps."""
+
+    def __init__(self):
+        self.now = 1_000.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class RateLimitedError(Exception):
+    def __init__(self, retry_after=None):
+        super().__init__("429 Client Error: Too Many Requests")
+        headers = {"Retry-After": str(retry_after)} if retry_after is not None else {}
+        self.response = SimpleNamespace(status_code=429, headers=headers)
+
+
+class QuotaAPI:
+    """API answering 429 when more than quota requests were accepted within the last second."""
+
+    def __init__(self, clock, quota):
+        self.clock = clock
+        self.quota = quota
+        self.accepted = deque()
+        self.rejected = 0
+
+    def __call__(self):
+        now = self.clock()
+        while self.accepted and self.accepted[0] <= now - 1:
+            self.accepted.popleft()
+        if len(self.accepted) >= self.quota:
+            self.rejected += 1
+            raise RateLimitedError()
+        self.accepted.append(now)
+        return "ok"
+
+
+def fake_limiter(tmp_path, rate, clock, **kwargs):
+    return RateLimiter("test_api", rate, state_dir=str(tmp_path), clock=clock, sleep=clock.sleep, **kwargs)
+
+
+def test_acquire_spaces_requests_at_the_rate(tmp_path):
+    clock = FakeClock()
+    limiter = fake_limiter(tmp_path, rate=10, clock=clock, burst=2)
+    waits = [limiter.acquire() for _ in range(5)]
+    assert waits[:2] == [0.0, 0.0]
+    assert waits[2:] == pytest.approx([0.1, 0.1, 0.1])
+    assert limiter.stats["acquired"] == 5
+
+
+def test_concurrent_callers_reserve_consecutive_slots(tmp_path):
+    clock = FakeClock()
+    limiter = RateLimiter("test_api", 10, burst=1, state_dir=str(tmp_path), clock=clock, sleep=lambda s: None)
+    # callers that don't sleep in between each get the next slot
+    assert [limiter.acquire() for _ in range(4)] == pytest.approx([0.0, 0.1, 0.2, 0.3])
+
+
+def test_instances_with_the_same_family_share_the_bucket(tmp_path):
+    clock = FakeClock()
+    first = fake_limiter(tmp_path, rate=10, clock=clock, burst=1)
+    second = fake_limiter(tmp_path, rate=10, clock=clock, burst=1)
+    assert first.acquire() == 0.0
+    assert second.acquire() == pytest.approx(0.1)
+
+
+def test_throttling_halves_the_rate_and_successes_restore_it(tmp_path):
+    clock = FakeClock()
+    limiter = fake_limiter(tmp_path, rate=10, clock=clock, increase_fraction=0.1)
+    limiter.on_throttled(retry_after=2)
+    assert limiter.rate == 5
+    assert limiter.acquire() == pytest.approx(2.0)
+    # +1 request per second for every second of successes
+    for _ in range(5):
+        limiter.on_success()
+    assert limiter.rate == pytest.approx(6, abs=0.1)
+    for _ in range(100):
+        limiter.on_success()
+    assert limiter.rate == 10
+
+
+def test_rate_never_drops_below_min_rate(tmp_path):
+    limiter = fake_limiter(tmp_path, rate=10, clock=FakeClock(), min_rate=2)
+    for _ in range(10):
+        limiter.on_throttled()
+    assert limiter.rate == 2
+
+
+def test_call_retries_rate_limited_errors(tmp_path):
+    clock = FakeClock()
+    limiter = fake_limiter(tmp_path, rate=10, clock=clock)
+    answers = [RateLimitedError(retry_after=1), RateLimitedError(), "ok"]
+
+    def flaky():
+        answer = answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    assert limiter.call(flaky) == "ok"
+    assert limiter.stats["throttled"] == 2
+
+
+def test_call_gives_up_after_max_retries(tmp_path):
+    limiter = fake_limiter(tmp_path, rate=10, clock=FakeClock())
+
+    def always_limited():
+        raise RateLimitedError()
+
+    with pytest.raises(RateLimitedError):
+        limiter.call(always_limited, max_retries=2)
+    assert limiter.stats["acquired"] == 3
+
+
+def test_call_raises_other_errors(tmp_path):
+    limiter = fake_limiter(tmp_path, rate=10, clock=FakeClock())
+
+    def broken():
+        raise ValueError("RESOURCE_DOES_NOT_EXIST")
+
+    with pytest.raises(ValueError):
+        limiter.call(broken)
+    assert limiter.stats["throttled"] == 0
+
+
+def test_adaptive_rate_stays_near_the_quota_without_error_storms(tmp_path):
+    clock = FakeClock()
+    api = QuotaAPI(clock, quota=10)
+    # configured above the real quota, as when the quota is lowered or shared with another node
+    limiter = fake_limiter(tmp_path, rate=20, clock=clock)
+    start = clock()
+    for _ in range(600):
+        limiter.call(api)
+    throughput = 600 / (clock() - start)
+    assert throughput > 0.7 * api.quota
+    assert api.rejected < 0.05 * 600
+
+
+def test_is_rate_limited():
+    assert is_rate_limited(RateLimitedError())
+    assert is_rate_limited(Exception('Response content b\'{"error_code":"REQUEST_LIMIT_EXCEEDED"}\', status_code 429'))
+    assert is_rate_limited(SimpleNamespace(error_code="REQUEST_LIMIT_EXCEEDED"))
+    assert not is_rate_limited(Exception("RESOURCE_DOES_NOT_EXIST"))
+
+
+def test_retry_after_s():
+    assert retry_after_s(RateLimitedError(retry_after=3)) == 3.0
+    assert retry_after_s(RateLimitedError()) is None
+    assert retry_after_s(Exception("429")) is None
+
+
+def test_pickle_keeps_configuration(tmp_path):
+    limiter = RateLimiter("test_api", 10, state_dir=str(tmp_path))
+    limiter.acquire()
+    restored = pickle.loads(pickle.dumps(limiter))
+    assert restored.max_rate == 10
+    assert restored.stats["acquired"] == 0
+    restored.acquire()
+
+
+def test_threads_share_the_rate(tmp_path):
+    limiter = RateLimiter("test_api", 100, burst=1, state_dir=str(tmp_path))
+    start = time.monotonic()
+    threads = [threading.Thread(target=lambda: [limiter.acquire() for _ in range(3)]) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # 30 requests at 100 per second, the first one is free
+    assert time.monotonic() - start >= 0.27
+
+
+def acquire_in_process(state_dir, n, times):
+    limiter = RateLimiter("test_api", 50, burst=1, state_dir=state_dir)
+    for _ in range(n):
+        limiter.acquire()
+        times.put(time.time())
+
+
+def test_processes_share_the_rate(tmp_path):
+    times = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=acquire_in_process, args=(str(tmp_path), 5, times)) for _ in range(4)
+    ]
+    for process in processes:
+        process.start()
+    sent = sorted(times.get(timeout=30) for _ in range(20))
+    for process in processes:
+        process.join()
+    # 20 requests at 50 per second take at least 19 intervals, whichever process sends them
+    assert sent[-1] - sent[0] >= 19 / 50 * 0.9
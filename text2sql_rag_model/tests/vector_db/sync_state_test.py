@@ -0,0 +1,34 @@
+from text2sql_rag_model.vector_db.sync_state import changes_data, default_state_table, needs_sync
+
+
+def commit(version, operation="WRITE", **metrics):
+    return {"version": version, "operation": operation, "operationMetrics": {k: str(v) for k, v in metrics.items()}}
+
+
+def test_default_state_table():
+    assert default_state_table("main.data.table_metadata_index") == "main.data.vector_search_sync_state"
+
+
+def test_changes_data():
+    assert changes_data(commit(1, numOutputRows=3))
+    assert changes_data(commit(1, "MERGE", numTargetRowsInserted=0, numTargetRowsUpdated=2))
+    # the description compression MERGE when no description changed
+    assert not changes_data(commit(1, "MERGE", numTargetRowsInserted=0, numTargetRowsUpdated=0))
+    assert not changes_data(commit(1, "OPTIMIZE", numRemovedFiles=4))
+    # unknown operations without row metrics may have changed rows
+    assert changes_data(commit(1, "ADD COLUMNS"))
+
+
+def test_needs_sync_without_previous_sync():
+    assert needs_sync([commit(0)], None)
+
+
+def test_needs_sync_skips_unchanged_tables():
+    history = [commit(5, "OPTIMIZE"), commit(4, "MERGE", numTargetRowsUpdated=0), commit(3, numOutputRows=10)]
+    assert not needs_sync(history, 5)
+    assert not needs_sync(history, 3)
+    assert needs_sync(history, 2)
+
+
+def test_needs_sync_when_history_was_vacuumed():
+    assert needs_sync([commit(9, "OPTIMIZE"), commit(8, "OPTIMIZE")], 5)
@@ -0,0 +1,262 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import sqlglot
+from sqlglot.errors import SqlglotError
+
+from text2sql_rag_model.model_deployment.text_to_sql.sql_validation import SQL_DIALECT
+
+# concurrent requests a serving endpoint replica handles per workload size
+WORKLOAD_SIZE_CONCURRENCY = {"Small": 4, "Medium": 16, "Large": 64}
+
+
+def normalize_sql(sql):
+    """
+    Canonical form of a query for exact-match comparison: parsed and re-generated by sqlglot,
+    so whitespace, keyword case and a trailing semicolon don't matter.
+    """
+    sql = (sql or "").strip().rstrip(";")
+    try:
+        return sqlglot.transpile(sql, read=SQL_DIALECT, write=SQL_DIALECT, normalize=True, pretty=False)[0].lower()
+    except SqlglotError:
+        return " ".join(sql.lower().split())
+
+
+def exact_match(prediction, target):
+    """1.0 if both queries have the same canonical form, else 0.0."""
+    return float(normalize_sql(prediction) == normalize_sql(target))
+
+
+def run_query(sql, database):
+    """
+    Execute a Databricks SQL query on a local read-only SQLite database.
+
+    Args:
+        sql (str): Databricks SQL
+        database (str): path to the SQLite database file
+
+    Returns:
+        list: fetched rows
+
+    Raises:
+        sqlite3.Error, SqlglotError: if the query can't be transpiled or executed
+    """
+    sqlite_sql = sqlglot.transpile(sql, read=SQL_DIALECT, write="sqlite")[0]
+    connection = sqlite3.connect(f"file:{database}?mode=ro", uri=True)
+    try:
+        return connection.execute(sqlite_sql).fetchall()
+    finally:
+        connection.close()
+
+
+def is_ordered(sql):
+    """Whether the outermost query has an ORDER BY, ignoring ones in subqueries or string literals."""
+    try:
+        return sqlglot.parse_one(sql, read=SQL_DIALECT).args.get("order") is not None
+    except SqlglotError:
+        return False
+
+
+def execution_match(prediction, target, database):
+    """
+    1.0 if the predicted and target queries return the same rows on the local database, else 0.0.
+
+    Row order only matters when the target query has a top-level ORDER BY. A prediction that fails to run scores
+    0.0. A target that fails to run can't be scored and gives NaN, which the metric means skip.
+    """
+    try:
+        expected = run_query(target, database)
+    except (sqlite3.Error, SqlglotError) as e:
+        print(f"reference query can't be executed, skipping it: {e}")
+        return float("nan")
+    try:
+        actual = run_query(prediction, database)
+    except (sqlite3.Error, SqlglotError):
+        return 0.0
+    if is_ordered(target):
+        return float(actual == expected)
+    return float(Counter(actual) == Counter(expected))
+
+
+def make_predict_fn(model):
+    """
+    Wrap a loaded text2sqlrag pyfunc model into a function of one question returning
+    (generated_sql, prompt_tokens).
+    """
+
+    def predict_fn(question):
+        output = model.predict({"prompt": [question]})
+        prompt_tokens = output.get("prompt_tokens", [np.nan])[0]
+        return output["generated_sql"][0], prompt_tokens
+
+    return predict_fn
+
+
+def endpoint_pool_size(workload_size="Small", num_endpoints=1):
+    """
+    Number of questions to keep in flight so that the serving endpoints are saturated without queueing.
+
+    Args:
+        workload_size (str): workload size of the endpoints the model calls, "Small", "Medium" or "Large"
+        num_endpoints (int): number of endpoints that scale independently
+
+    Returns:
+        int: thread pool size
+    """
+    return WORKLOAD_SIZE_CONCURRENCY[workload_size] * num_endpoints
+
+
+def dataset_hash(questions, targets):
+    """Stable digest of the validation questions and reference SQL, used as a cache key."""
+    payload = json.dumps([list(questions), list(targets)], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class PredictionCache:
+    """
+    Per-example predictions of a model version on a validation dataset, stored as CSV files.
+
+    Predictions of a registered model version never change, so the Champion only needs to answer
+    the validation questions once per dataset instead of on every validation run.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    def _path(self, model_name, model_version, data_hash):
+        return os.path.join(self.cache_dir, model_name, str(model_version), f"{data_hash}.csv")
+
+    def get(self, model_name, model_version, data_hash):
+        """Cached predictions as returned by `predict_questions`, or None on a cache miss."""
+        path = self._path(model_name, model_version, data_hash)
+        if not os.path.exists(path):
+            return None
+        return pd.read_csv(path, keep_default_na=False, dtype={"question": str, "prediction": str})
+
+    def put(self, model_name, model_version, data_hash, predictions):
+        path = self._path(model_name, model_version, data_hash)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write then rename so that a concurrent reader never sees a partial file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        predictions.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, path)
+
+
+def predict_questions(predict_fn, questions, max_workers=8):
+    """
+    Generate SQL for every question in parallel, recording per-question latency.
+
+    Args:
+        predict_fn (callable): question -> (generated_sql, prompt_tokens), see `make_predict_fn`
+        questions (list): natural language questions
+        max_workers (int): number of questions in flight at once
+
+    Returns:
+        pd.DataFrame: with columns question, prediction, latency_s and prompt_tokens, in input order
+    """
+
+    def timed_predict(question):
+        start = time.perf_counter()
+        prediction, prompt_tokens = predict_fn(question)
+        return prediction, time.perf_counter() - start, prompt_tokens
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        outputs = list(executor.map(timed_predict, questions))
+    predictions, latencies, prompt_tokens = zip(*outputs) if outputs else ((), (), ())
+    return pd.DataFrame(
+        {
+            "question": list(questions),
+            "prediction": list(predictions),
+            "latency_s": list(latencies),
+            "prompt_tokens": list(prompt_tokens),
+        }
+    )
+
+
+def score_predictions(predictions, targets, metric_fns, max_workers=8):
+    """
+    Add one column per metric to the predictions, scoring examples in parallel.
+
+    Args:
+        predictions (pd.DataFrame): output of `predict_questions`
+        targets (list): reference SQL, aligned with the predictions
+        metric_fns (dict): {metric_name: fn(prediction, target) -> float}
+        max_workers (int): number of examples scored at once
+
+    Returns:
+        pd.DataFrame: a copy of predictions with a target column and one column per metric
+    """
+    scored = predictions.copy()
+    scored["target"] = list(targets)
+    pairs = list(zip(scored["prediction"], scored["target"]))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for name, metric_fn in metric_fns.items():
+            scored[name] = list(executor.map(lambda pair: metric_fn(*pair), pairs))
+    return scored
+
+
+def summarize_metrics(scored, metric_names):
+    """
+    Aggregate per-example scores into the metrics used for validation thresholds.
+
+    Returns:
+        dict: the mean of each metric, p50/p95 latency in seconds and mean prompt tokens per query
+    """
+    metrics = {name: float(scored[name].mean()) for name in metric_names}
+    metrics["p50_latency_s"] = float(np.percentile(scored["latency_s"], 50))
+    metrics["p95_latency_s"] = float(np.percentile(scored["latency_s"], 95))
+    metrics["mean_prompt_tokens"] = float(pd.to_numeric(scored["prompt_tokens"]).mean())
+    return metrics
+
+
+def check_thresholds(metrics, thresholds, baseline_metrics=None, tolerances=None):
+    """
+    Check metrics against `mlflow.models.MetricThreshold`s, with the same semantics as `mlflow.evaluate`.
+
+    A MetricThreshold can only require an improvement over the baseline, so `tolerances` relaxes the baseline
+    comparison of noisy metrics: with min_relative_change=0.0 and a tolerance of 0.1, a metric may be up to 10% of
+    the baseline worse.
+
+    Args:
+        metrics (dict): candidate metrics
+        thresholds (dict): {metric_name: MetricThreshold}
+        baseline_metrics (dict, optional): baseline metrics, required for relative and absolute change thresholds
+        tolerances (dict, optional): {metric_name: tolerated regression as a fraction of the baseline}
+
+    Returns:
+        list: one message per failed threshold, empty if all pass
+    """
+    failures = []
+    for name, threshold in thresholds.items():
+        value = metrics.get(name)
+        if value is None or np.isnan(value):
+            failures.append(f"{name}: metric is missing")
+            continue
+        sign = 1 if threshold.higher_is_better else -1
+        if threshold.threshold is not None and sign * (value - threshold.threshold) < 0:
+            comparator = ">=" if threshold.higher_is_better else "<="
+            failures.append(f"{name}: {value} is not {comparator} {threshold.threshold}")
+        baseline = (baseline_metrics or {}).get(name)
+        if baseline is None:
+            continue
+        tolerance = (tolerances or {}).get(name, 0.0)
+        change = sign * (value - baseline) + tolerance * abs(baseline)
+        if threshold.min_absolute_change is not None and change < threshold.min_absolute_change:
+            failures.append(f"{name}: {value} does not improve on baseline {baseline} by {threshold.min_absolute_change}")
+        if (
+            threshold.min_relative_change is not None
+            and baseline != 0
+            and change / abs(baseline) < threshold.min_relative_change
+        ):
+            failures.append(
+                f"{name}: {value} does not improve on baseline {baseline} by {threshold.min_relative_change:.0%}"
+                + (f" (tolerating {tolerance:.0%} worse)" if tolerance else "")
+            )
+    return failures
@@ -12,23 +12,30 @@
 #
 # * env                                     - Name of the environment the notebook is run in (staging, or prod). Defaults to "prod".
 # * `run_mode`                              - The `run_mode` defines whether model validation is enabled or not. It can be one of the three values:
-#                                             * `disabled` : Do not run the model validation notebook.
+#                                             * `disabled` : Do not run the model validation notebook, only tag the model version as not validated.
 #                                             * `dry_run`  : Run the model validation notebook. Ignore failed model validation rules and proceed to move
 #                                                            model to the "Champion" alias.
 #                                             * `enabled`  : Run the model validation notebook. Move model to the "Champion" alias only if all model validation
 #                                                            rules are passing.
 # * enable_baseline_comparison              - Whether to load the current registered "Champion" model as baseline.
 #                                             Baseline model is a requirement for relative change and absolute change validation thresholds.
-# * validation_input                        - Validation input. Please refer to data parameter in mlflow.evaluate documentation https://mlflow.org/docs/latest/python_api/mlflow.html#mlflow.evaluate
-# * model_type                              - A string describing the model type. The model type can be either "regressor" and "classifier".
-#                                             Please refer to model_type parameter in mlflow.evaluate documentation https://mlflow.org/docs/latest/python_api/mlflow.html#mlflow.evaluate
-# * targets                                 - The string name of a column from data that contains evaluation labels.
-#                                             Please refer to targets parameter in mlflow.evaluate documentation https://mlflow.org/docs/latest/python_api/mlflow.html#mlflow.evaluate
+# * baseline_mode                           - How the baseline predictions are obtained. It can be one of two values:
+#                                             * `cached`  : Reuse the Champion's per-example predictions cached for its model version and
+#                                                           this validation dataset, only scoring the Champion on a cache miss.
+#                                             * `rescore` : Score the Champion from scratch and refresh the cache.
+# * validation_input                        - Validation input. A query returning one natural language question and its reference SQL per row.
+# * questions                               - The string name of a column from data that contains the questions.
+# * targets                                 - The string name of a column from data that contains the reference SQL.
 # * custom_metrics_loader_function          - Specifies the name of the function in text2sql_rag_app/validation/validation.py that returns custom metrics.
 # * validation_thresholds_loader_function   - Specifies the name of the function in text2sql_rag_app/validation/validation.py that returns model validation thresholds.
+# * evaluator_config_loader_function        - Specifies the name of the function in text2sql_rag_app/validation/validation.py that returns evaluator config.
 #
-# For details on mlflow evaluate API, see doc https://mlflow.org/docs/latest/python_api/mlflow.html#mlflow.evaluate
-# For details and examples about performing model validation, see the Model Validation documentation https://mlflow.org/docs/latest/models.html#model-validation
+# Questions are answered in parallel by the candidate model (and the "Champion" if baseline comparison is enabled).
+# Exact match, execution match on a local SQLite database, p95 latency and prompt tokens per question are computed
+# and checked against the validation thresholds. Metrics are tagged on the model version so that
+# model_deployment/text_to_sql/update_model_alias.py can refuse to promote a failing version to "Champion".
+#
+# For details on validation thresholds, see the Model Validation documentation https://mlflow.org/docs/latest/models.html#model-validation
 #
 ##################################################################################
 
@@ -67,34 +74,29 @@ dbutils.widgets.text(
 )
 dbutils.widgets.dropdown("run_mode", "disabled", ["disabled", "dry_run", "enabled"], "Run Mode")
 dbutils.widgets.dropdown("enable_baseline_comparison", "false", ["true", "false"], "Enable Baseline Comparison")
-dbutils.widgets.text("validation_input", "SELECT * FROM delta.`dbfs:/databricks-datasets/nyctaxi-with-zipcodes/subsampled`", "Validation Input")
+dbutils.widgets.dropdown("baseline_mode", "cached", ["cached", "rescore"], "Baseline Mode")
+dbutils.widgets.text("validation_input", "SELECT * FROM asong_dev.llms.text2sql_validation_questions", "Validation Input")
 
-dbutils.widgets.text("model_type", "regressor", "Model Type")
-dbutils.widgets.text("targets", "fare_amount", "Targets")
+dbutils.widgets.text("questions", "question", "Questions")
+dbutils.widgets.text("targets", "target_sql", "Targets")
 dbutils.widgets.text("custom_metrics_loader_function", "custom_metrics", "Custom Metrics Loader Function")
 dbutils.widgets.text("validation_thresholds_loader_function", "validation_thresholds", "Validation Thresholds Loader Function")
 dbutils.widgets.text("evaluator_config_loader_function", "evaluator_config", "Evaluator Config Loader Function")
-dbutils.widgets.text("model_name", "dev.llms.text2sql_rag_app-model", "Full (Three-Level) Model Name")
+dbutils.widgets.text("model_name", "asong_dev.llms.text2sqlrag", "Full (Three-Level) Model Name")
 dbutils.widgets.text("model_version", "", "Candidate Model Version")
 
 # COMMAND ----------
 
-print(
-    "Currently model validation is not supported for models registered with feature store. Please refer to "
-    "issue https://github.com/databricks/mlops-stacks/issues/70 for more details."
-)
-dbutils.notebook.exit(0)
 run_mode = dbutils.widgets.get("run_mode").lower()
 assert run_mode == "disabled" or run_mode == "dry_run" or run_mode == "enabled"
 
+dry_run = run_mode == "dry_run"
+
 if run_mode == "disabled":
     print(
         "Model validation is in DISABLED mode. Exit model validation without blocking model deployment."
     )
-    dbutils.notebook.exit(0)
-dry_run = run_mode == "dry_run"
-
-if dry_run:
+elif dry_run:
     print(
         "Model validation is in DRY_RUN mode. Validation threshold validation failures will not block model deployment."
     )
@@ -132,26 +134,32 @@ if model_uri == "":
 
 baseline_model_uri = "models:/" + model_name + "@Champion"
 
-evaluators = "default"
 assert model_uri != "", "model_uri notebook parameter must be specified"
 assert model_name != "", "model_name notebook parameter must be specified"
 assert model_version != "", "model_version notebook parameter must be specified"
 
+if run_mode == "disabled":
+    # update_model_alias.py refuses to promote versions without this tag, i.e. never validated
+    client.set_model_version_tag(model_name, model_version, "validation_run_mode", run_mode)
+    dbutils.notebook.exit(0)
+
 # COMMAND ----------
 
 # take input
 enable_baseline_comparison = dbutils.widgets.get("enable_baseline_comparison")
 assert enable_baseline_comparison == "true" or enable_baseline_comparison == "false"
 enable_baseline_comparison = enable_baseline_comparison == "true"
+baseline_mode = dbutils.widgets.get("baseline_mode")
+assert baseline_mode == "cached" or baseline_mode == "rescore"
 
 validation_input = dbutils.widgets.get("validation_input")
 assert validation_input
-data = spark.sql(validation_input)
+data = spark.sql(validation_input).toPandas()
 
-model_type = dbutils.widgets.get("model_type")
+questions = dbutils.widgets.get("questions")
 targets = dbutils.widgets.get("targets")
 
-assert model_type
+assert questions
 assert targets
 
 custom_metrics_loader_function_name = dbutils.widgets.get("custom_metrics_loader_function")
@@ -169,13 +177,62 @@ validation_thresholds_loader_function = getattr(
 evaluator_config_loader_function = getattr(
     importlib.import_module("validation"), evaluator_config_loader_function_name
 )
-custom_metrics = custom_metrics_loader_function()
-validation_thresholds = validation_thresholds_loader_function()
 evaluator_config = evaluator_config_loader_function()
+custom_metrics = custom_metrics_loader_function(evaluator_config["execution_database"])
+validation_thresholds = validation_thresholds_loader_function()
+baseline_tolerances = getattr(importlib.import_module("validation"), "baseline_tolerances")()
 
 # COMMAND ----------
 
+from text2sql_rag_model.model_deployment import artifact_cache
+from text2sql_rag_model.model_deployment.registry_cache import RegistryCache
+from text2sql_rag_model.validation.evaluation import (
+    PredictionCache,
+    check_thresholds,
+    dataset_hash,
+    make_predict_fn,
+    predict_questions,
+    score_predictions,
+    summarize_metrics,
+)
+
+prediction_cache = PredictionCache(evaluator_config["prediction_cache_dir"])
+registry_cache = RegistryCache(client)
+
+
 # helper methods
+def evaluate_model(model_uri):
+    model = artifact_cache.load_model(model_uri, registry_cache=registry_cache)
+    max_workers = evaluator_config["max_workers"]
+    predictions = predict_questions(make_predict_fn(model), data[questions].tolist(), max_workers)
+    scored = score_predictions(predictions, data[targets].tolist(), custom_metrics, max_workers)
+    return scored, summarize_metrics(scored, custom_metrics)
+
+
+def evaluate_baseline():
+    # the cache is keyed by the Champion's version, so promoting a new Champion invalidates it
+    champion_version = registry_cache.version_by_alias(model_name, "Champion")
+    question_list, target_list = data[questions].tolist(), data[targets].tolist()
+    data_hash = dataset_hash(question_list, target_list)
+    predictions = None
+    if baseline_mode == "cached":
+        predictions = prediction_cache.get(model_name, champion_version, data_hash)
+    if predictions is None:
+        print(f"Scoring Champion version {champion_version} on the validation questions")
+        model = artifact_cache.load_model(f"models:/{model_name}/{champion_version}", registry_cache=registry_cache)
+        predictions = predict_questions(make_predict_fn(model), question_list, evaluator_config["max_workers"])
+        prediction_cache.put(model_name, champion_version, data_hash, predictions)
+    scored = score_predictions(predictions, target_list, custom_metrics, evaluator_config["max_workers"])
+    return scored, summarize_metrics(scored, custom_metrics)
+
+
+def tag_model_version_with_metrics(metrics):
+    # read back by update_model_alias.py before the version is promoted to "Champion"
+    client.set_model_version_tag(model_name, model_version, "validation_run_mode", run_mode)
+    for metric, value in metrics.items():
+        client.set_model_version_tag(model_name, model_version, "validation_" + metric, str(value))
+
+
 def get_run_link(run_info):
     return "[Run](#mlflow/experiments/{0}/runs/{1})".format(
         run_info.experiment_id, run_info.run_id
@@ -233,40 +290,37 @@ with mlflow.start_run(
     mlflow.log_artifact(validation_thresholds_file)
 
     try:
-        eval_result = mlflow.evaluate(
-            model=model_uri,
-            data=data,
-            targets=targets,
-            model_type=model_type,
-            evaluators=evaluators,
-            validation_thresholds=validation_thresholds,
-            custom_metrics=custom_metrics,
-            baseline_model=None
-            if not enable_baseline_comparison
-            else baseline_model_uri,
-            evaluator_config=evaluator_config,
-        )
+        scored, metrics = evaluate_model(model_uri)
+        baseline_metrics = {}
+        if enable_baseline_comparison:
+            _, baseline_metrics = evaluate_baseline()
+
+        mlflow.log_metrics(metrics)
+        tag_model_version_with_metrics(metrics)
+        predictions_file = os.path.join(tmp_dir, "predictions.csv")
+        scored.to_csv(predictions_file, index=False)
+        mlflow.log_artifact(predictions_file)
         metrics_file = os.path.join(tmp_dir, "metrics.txt")
         with open(metrics_file, "w") as f:
             f.write(
                 "{0:30}  {1:30}  {2}\n".format("metric_name", "candidate", "baseline")
             )
-            for metric in eval_result.metrics:
-                candidate_metric_value = str(eval_result.metrics[metric])
+            for metric in metrics:
+                candidate_metric_value = str(metrics[metric])
                 baseline_metric_value = "N/A"
-                if metric in eval_result.baseline_model_metrics:
-                    mlflow.log_metric(
-                        "baseline_" + metric, eval_result.baseline_model_metrics[metric]
-                    )
-                    baseline_metric_value = str(
-                        eval_result.baseline_model_metrics[metric]
-                    )
+                if metric in baseline_metrics:
+                    mlflow.log_metric("baseline_" + metric, baseline_metrics[metric])
+                    baseline_metric_value = str(baseline_metrics[metric])
                 f.write(
                     "{0:30}  {1:30}  {2}\n".format(
                         metric, candidate_metric_value, baseline_metric_value
                     )
                 )
         mlflow.log_artifact(metrics_file)
+
+        failures = check_thresholds(metrics, validation_thresholds, baseline_metrics, baseline_tolerances)
+        if failures:
+            raise Exception("Validation thresholds failed:\n" + "\n".join(failures))
         log_to_model_description(run, True)
         
         # Assign "Challenger" alias to indicate model version has passed validation checks
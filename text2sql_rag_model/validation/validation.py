@@ -1,41 +1,63 @@
-import numpy as np
-from mlflow.models import make_metric, MetricThreshold
+from functools import partial
 
-# Custom metrics to be included. Return empty list if custom metrics are not needed.
-# Please refer to custom_metrics parameter in mlflow.evaluate documentation https://mlflow.org/docs/latest/python_api/mlflow.html#mlflow.evaluate
-# TODO(optional) : custom_metrics
-def custom_metrics():
+from mlflow.models import MetricThreshold
 
-    # TODO(optional) : define custom metric function to be included in custom_metrics.
-    def squared_diff_plus_one(eval_df, _builtin_metrics):
-        """
-        This example custom metric function creates a metric based on the ``prediction`` and
-        ``target`` columns in ``eval_df`.
-        """
-        return np.sum(np.abs(eval_df["prediction"] - eval_df["target"] + 1) ** 2)
+from text2sql_rag_model.validation.evaluation import endpoint_pool_size, exact_match, execution_match
 
-    return [make_metric(eval_fn=squared_diff_plus_one, greater_is_better=False)]
+
+# Custom metrics to be included. Each metric scores one example, fn(prediction, target) -> float,
+# and is reported as its mean over the validation questions.
+# TODO(optional) : custom_metrics
+def custom_metrics(execution_database):
+    return {
+        "exact_match": exact_match,
+        "execution_match": partial(execution_match, database=execution_database),
+    }
 
 
 # Define model validation rules. Return empty dict if validation rules are not needed.
-# Please refer to validation_thresholds parameter in mlflow.evaluate documentation https://mlflow.org/docs/latest/python_api/mlflow.html#mlflow.evaluate
+# Rules follow MetricThreshold semantics of mlflow.evaluate https://mlflow.org/docs/latest/python_api/mlflow.html#mlflow.evaluate
+# and are checked again in model_deployment/text_to_sql/update_model_alias.py before a version becomes Champion.
 # TODO(optional) : validation_thresholds
 def validation_thresholds():
     return {
-        "max_error": MetricThreshold(
-            threshold=500, higher_is_better=False  # max_error should be <= 500
+        "execution_match": MetricThreshold(
+            threshold=0.6,  # at least 60% of the questions return the same rows as the reference SQL
+            min_relative_change=0.0,  # and no fewer than the Champion, within baseline_tolerances
+            higher_is_better=True,
+        ),
+        "p95_latency_s": MetricThreshold(
+            threshold=15,  # p95 end-to-end latency per question should be <= 15s
+            min_relative_change=0.0,  # and no slower than the Champion, within baseline_tolerances
+            higher_is_better=False,
         ),
-        "mean_squared_error": MetricThreshold(
-            threshold=20,  # mean_squared_error should be <= 20
-            # min_absolute_change=0.01,  # mean_squared_error should be at least 0.01 greater than baseline model accuracy
-            # min_relative_change=0.01,  # mean_squared_error should be at least 1 percent greater than baseline model accuracy
+        "mean_prompt_tokens": MetricThreshold(
+            threshold=2000,  # prompt tokens per question should be <= 2000
             higher_is_better=False,
         ),
     }
 
 
-# Define evaluator config. Return empty dict if validation rules are not needed.
-# Please refer to evaluator_config parameter in mlflow.evaluate documentation https://mlflow.org/docs/latest/python_api/mlflow.html#mlflow.evaluate
+# Define how much worse than the Champion a metric may be, as a fraction of the Champion's value. MetricThreshold's
+# min_relative_change can only require an improvement, these tolerances absorb the run to run noise of the
+# baseline comparison. Checked by check_thresholds in ModelValidation and update_model_alias.py.
+def baseline_tolerances():
+    return {
+        "execution_match": 0.02,  # at most 2% fewer matching questions than the Champion
+        "p95_latency_s": 0.1,  # at most 10% slower than the Champion
+    }
+
+
+# Define evaluator config.
+# * execution_database   - local SQLite copy of the evaluated tables, used for execution match
+# * max_workers          - number of questions evaluated in parallel, sized for the concurrency of the
+#                          serving endpoints the model calls (LLM and vector search)
+# * prediction_cache_dir - where per-example predictions of registered versions are cached, so the
+#                          Champion baseline is only scored once per validation dataset
 # TODO(optional) : evaluator_config
 def evaluator_config():
-    return {}
+    return {
+        "execution_database": "/Volumes/asong_dev/llms/validation/text2sql_validation.sqlite",
+        "max_workers": endpoint_pool_size(workload_size="Small", num_endpoints=2),
+        "prediction_cache_dir": "/Volumes/asong_dev/llms/validation/prediction_cache",
+    }
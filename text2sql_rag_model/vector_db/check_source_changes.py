@@ -0,0 +1,54 @@
+# Databricks notebook source
+##################################################################################
+# Check Source Changes Notebook
+#
+# First task of `vector_search_create_index_job`. Compares the Delta commit history of the index source table
+# with the version recorded by the last sync and sets the `changed` task value, so that the description
+# compression and index sync tasks only run when the source table changed or the index doesn't exist yet.
+#
+# Parameters:
+# * endpoint_name     - Vector search endpoint of the index.
+# * source_table_name - Delta table the vector search index is synced from.
+# * index_name        - Vector search index.
+# * sync_state_table  - Table recording the last synced version, defaults to vector_search_sync_state in the
+#                       schema of the index.
+# * force_sync        - "true" to run the sync even if nothing changed.
+##################################################################################
+
+# MAGIC %pip install --upgrade --force-reinstall databricks-vectorsearch
+# MAGIC dbutils.library.restartPython()
+
+# COMMAND ----------
+
+dbutils.widgets.text("endpoint_name", "", label="Vector Search Endpoint Name")
+dbutils.widgets.text("source_table_name", "", label="Source Table Name")
+dbutils.widgets.text("index_name", "", label="Index Name")
+dbutils.widgets.text("sync_state_table", "", label="Sync State Table")
+dbutils.widgets.text("force_sync", "false", label="Force Sync")
+
+# COMMAND ----------
+
+import sys
+import os
+from databricks.vector_search.client import VectorSearchClient
+
+sys.path.append(os.path.abspath('..'))
+from text2sql_rag_model.vector_db.sync_state import default_state_table, needs_sync, read_synced_version, source_history
+from text2sql_rag_model.vector_db.utils import index_exists
+
+endpoint_name = dbutils.widgets.get("endpoint_name")
+source_table_name = dbutils.widgets.get("source_table_name")
+index_name = dbutils.widgets.get("index_name")
+sync_state_table = dbutils.widgets.get("sync_state_table") or default_state_table(index_name)
+force_sync = dbutils.widgets.get("force_sync").lower() == "true"
+
+history = source_history(spark, source_table_name)
+synced_version = read_synced_version(spark, sync_state_table, index_name)
+changed = (
+    force_sync
+    or needs_sync(history, synced_version)
+    or not index_exists(VectorSearchClient(), endpoint_name, index_name)
+)
+print(f"{source_table_name} is at version {history[0]['version']}, last synced version {synced_version}: "
+      f"{'syncing' if changed else 'nothing to do'}")
+dbutils.jobs.taskValues.set(key="changed", value=changed)
@@ -0,0 +1,56 @@
+# Databricks notebook source
+##################################################################################
+# Compress Table Descriptions Notebook
+#
+# Adds a compact version of every TableDescription to the index source table, so that the text2sqlrag model
+# puts a few keywords per table in its prompt instead of the verbose generated prose. Runs before the index
+# sync in `vector_search_create_index_job`; only changed descriptions are rewritten, so the sync doesn't
+# re-embed unchanged tables.
+#
+# Parameters:
+# * source_table_name - Delta table the vector search index is synced from.
+# * primary_key       - Primary key of the source table.
+# * max_words         - Maximum number of words of a compact description.
+##################################################################################
+
+# COMMAND ----------
+
+dbutils.widgets.text("source_table_name", "", label="Source Table Name")
+dbutils.widgets.text("primary_key", "TableName", label="Primary Key")
+dbutils.widgets.text("max_words", "30", label="Max Words")
+
+# COMMAND ----------
+
+import sys
+import os
+
+sys.path.append(os.path.abspath('..'))
+from text2sql_rag_model.vector_db.description_compression import COMPACT_DESCRIPTION_COLUMN, compress_descriptions
+
+source_table_name = dbutils.widgets.get("source_table_name")
+primary_key = dbutils.widgets.get("primary_key")
+max_words = int(dbutils.widgets.get("max_words"))
+
+source = spark.table(source_table_name)
+if COMPACT_DESCRIPTION_COLUMN not in source.columns:
+    spark.sql(f"ALTER TABLE {source_table_name} ADD COLUMNS ({COMPACT_DESCRIPTION_COLUMN} STRING)")
+
+descriptions = source.select(primary_key, "TableDescription").toPandas()
+compressed = compress_descriptions(descriptions, max_words=max_words)
+print(
+    f"Mean words per description: {descriptions['TableDescription'].str.split().str.len().mean():.0f} -> "
+    f"{compressed[COMPACT_DESCRIPTION_COLUMN].str.split().str.len().mean():.0f}"
+)
+
+# COMMAND ----------
+
+spark.createDataFrame(compressed[[primary_key, COMPACT_DESCRIPTION_COLUMN]]).createOrReplaceTempView("compressed_descriptions")
+spark.sql(
+    f"""
+    MERGE INTO {source_table_name} AS t
+    USING compressed_descriptions AS c
+    ON t.{primary_key} = c.{primary_key}
+    WHEN MATCHED AND t.{COMPACT_DESCRIPTION_COLUMN} IS DISTINCT FROM c.{COMPACT_DESCRIPTION_COLUMN}
+      THEN UPDATE SET t.{COMPACT_DESCRIPTION_COLUMN} = c.{COMPACT_DESCRIPTION_COLUMN}
+    """
+)
@@ -54,10 +54,35 @@ dbutils.widgets.text(
     label="Pipeline Type",
 )
 
+# table recording the source table version of the last sync, defaults to vector_search_sync_state next to the index
+dbutils.widgets.text(
+    "sync_state_table",
+    f"",
+    label="Sync State Table",
+)
+
+# sync even if the source table didn't change since the last sync
+dbutils.widgets.text(
+    "force_sync",
+    f"false",
+    label="Force Sync",
+)
+
 # COMMAND ----------
 
+import sys
+import os
 from databricks.vector_search.client import VectorSearchClient
-from utils import index_exists, wait_for_index_to_be_ready
+
+sys.path.append(os.path.abspath('..'))
+from text2sql_rag_model.vector_db.sync_state import (
+    default_state_table,
+    needs_sync,
+    read_synced_version,
+    record_synced_version,
+    source_history,
+)
+from text2sql_rag_model.vector_db.utils import index_exists, management_api, wait_for_index_to_be_ready
 
 vsc = VectorSearchClient()
 
@@ -68,10 +93,18 @@ primary_key = dbutils.widgets.get("primary_key")
 embedding_source_column = dbutils.widgets.get("embedding_source_column")
 embedding_model_endpoint_name = dbutils.widgets.get("embedding_model_endpoint_name")
 pipeline_type = dbutils.widgets.get("pipeline_type")
+sync_state_table = dbutils.widgets.get("sync_state_table") or default_state_table(index_name)
+force_sync = dbutils.widgets.get("force_sync").lower() == "true"
+
+# newest commit first, this version is recorded once the index is ready
+history = source_history(spark, source_table_name)
+source_version = history[0]["version"]
+synced_version = read_synced_version(spark, sync_state_table, index_name)
 
 if not index_exists(vsc, endpoint_name, index_name):
     print(f"Creating index {index_name} on endpoint {endpoint_name}...")
-    index = vsc.create_delta_sync_index(
+    index = management_api.call(
+        vsc.create_delta_sync_index,
         endpoint_name=endpoint_name,
         source_table_name=source_table_name,
         index_name=index_name,
@@ -81,16 +114,24 @@ if not index_exists(vsc, endpoint_name, index_name):
         embedding_model_endpoint_name=embedding_model_endpoint_name
     )
 
-else:
+elif force_sync or needs_sync(history, synced_version):
     #Trigger a sync to update our vs content with the new data saved in the table
-    print(f"Index {index_name} already exists. Triggering a sync to update our vs content")
-    vsc.get_index(endpoint_name, index_name).sync()
+    print(
+        f"Index {index_name} already exists and {source_table_name} changed since version {synced_version} "
+        f"(now {source_version}). Triggering a sync to update our vs content"
+    )
+    management_api.call(lambda: vsc.get_index(endpoint_name, index_name).sync())
+
+else:
+    print(f"{source_table_name} didn't change since version {synced_version}, skipping the sync")
+    dbutils.notebook.exit("skipped")
 
 # COMMAND ----------
 
 #Let's wait for the index to be ready and all our embeddings to be created and indexed
 wait_for_index_to_be_ready(vsc, endpoint_name, index_name)
-print(f"index {index_name} on table {source_table_name} is ready")
+record_synced_version(spark, sync_state_table, index_name, source_table_name, source_version)
+print(f"index {index_name} on table {source_table_name} is ready, synced version {source_version}")
 
 # COMMAND ----------
 
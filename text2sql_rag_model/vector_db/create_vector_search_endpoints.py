@@ -15,10 +15,14 @@ dbutils.widgets.text(
 # COMMAND ----------
 
 
+import sys
+import os
 from databricks.vector_search.client import VectorSearchClient
-from utils import endpoint_exists, wait_for_vs_endpoint_to_be_ready
 import time
 
+sys.path.append(os.path.abspath('..'))
+from text2sql_rag_model.vector_db.utils import endpoint_exists, management_api, wait_for_vs_endpoint_to_be_ready
+
 VECTOR_SEARCH_ENDPOINT_NAME = dbutils.widgets.get("endpoint_name")
 if not VECTOR_SEARCH_ENDPOINT_NAME:
     raise Exception("Please specify a valid endpoint name")
@@ -26,7 +30,7 @@ if not VECTOR_SEARCH_ENDPOINT_NAME:
 vsc = VectorSearchClient()
 
 if not endpoint_exists(vsc, VECTOR_SEARCH_ENDPOINT_NAME):
-    vsc.create_endpoint(name=VECTOR_SEARCH_ENDPOINT_NAME, endpoint_type="STANDARD")
+    management_api.call(vsc.create_endpoint, name=VECTOR_SEARCH_ENDPOINT_NAME, endpoint_type="STANDARD")
 
 wait_for_vs_endpoint_to_be_ready(vsc, VECTOR_SEARCH_ENDPOINT_NAME)
 print(f"Endpoint named {VECTOR_SEARCH_ENDPOINT_NAME} is ready.")
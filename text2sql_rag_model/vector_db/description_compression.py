@@ -0,0 +1,65 @@
+import re
+
+
+# column written next to TableDescription by the compress_table_descriptions notebook and fetched by the model
+COMPACT_DESCRIPTION_COLUMN = "TableDescriptionShort"
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+# sentences about what the data could be used for don't help writing SQL
+_LOW_VALUE = re.compile(
+    r"\b(can|could|may|might) (be )?(useful|used|help|valuable|assist)|\b(useful|valuable|helpful) for\b",
+    re.IGNORECASE,
+)
+# generated descriptions open with "The 'farm' table contains information about ..." or "It includes details such as ..."
+_BOILERPLATE_PREFIXES = [
+    re.compile(
+        r"^(the |this )?'?[\w.]*'? ?table (contains|stores|holds|includes|provides|has|records|lists)"
+        r"( (data|information|details|records))?( (related to|about|on|of|regarding|such as|like|for))?\s*",
+        re.IGNORECASE,
+    ),
+    re.compile(
+        r"^(it|this data) (also )?(includes|contains|provides|has|records|lists)"
+        r"( (data|information|details|records))?( (related to|about|on|of|regarding|such as|like|for))?\s*",
+        re.IGNORECASE,
+    ),
+]
+
+
+def _strip_boilerplate(sentence):
+    for pattern in _BOILERPLATE_PREFIXES:
+        sentence = pattern.sub("", sentence, count=1)
+    return sentence[:1].upper() + sentence[1:]
+
+
+def compress_description(description, max_words=30):
+    """
+    Extractive compression of an LLM-generated table description.
+
+    Sentences about possible uses of the data are dropped, boilerplate openings ("The 'farm' table contains
+    information about") are stripped and the result is cut at `max_words`, keeping whole sentences when possible.
+
+    Args:
+        description (str): verbose table description
+        max_words (int): maximum number of words of the compact description
+
+    Returns:
+        str: compact description, "" if the description is empty
+    """
+    if not description:
+        return ""
+    description = " ".join(description.replace("\\'", "'").split())
+    sentences = _SENTENCE_END.split(description)
+    kept = [s for s in sentences if not _LOW_VALUE.search(s)] or sentences[:1]
+
+    words = []
+    for sentence in kept:
+        sentence_words = _strip_boilerplate(sentence).split()
+        if words and len(words) + len(sentence_words) > max_words:
+            break
+        words.extend(sentence_words)
+    return " ".join(words[:max_words])
+
+
+def compress_descriptions(df, source_column="TableDescription", target_column=COMPACT_DESCRIPTION_COLUMN, max_words=30):
+    """Add the compact description of every table as `target_column` of a pandas DataFrame."""
+    return df.assign(**{target_column: df[source_column].map(lambda d: compress_description(d, max_words))})
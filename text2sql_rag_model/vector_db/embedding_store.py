@@ -0,0 +1,187 @@
+import time
+
+import numpy as np
+
+
+SUPPORTED_DTYPES = ("float32", "float16", "int8")
+
+
+def _normalize(vectors):
+    """L2-normalize rows so that a dot product is a cosine similarity."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def quantize_int8(vectors):
+    """Quantize float vectors to int8 with one symmetric scale per vector.
+
+    Args:
+        vectors (np.ndarray): float matrix of shape (n, dim)
+
+    Returns:
+        tuple: (int8 matrix of shape (n, dim), float32 scales of shape (n,))
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    quantized = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return quantized, scales.astype(np.float32)
+
+
+class EmbeddingStore:
+    """In-memory brute-force embedding index for the local retrieval path.
+
+    Embeddings are stored as float32, float16 or per-vector-scaled int8 and a whole
+    batch of queries is scored with a single matrix multiply per block of rows.
+    """
+
+    def __init__(self, ids, embeddings, dtype="float32", normalize=True, block_size=16384):
+        """
+        Args:
+            ids (list): identifiers returned by ``search``, one per embedding row
+            embeddings (np.ndarray): float matrix of shape (n, dim)
+            dtype (str): storage representation, one of "float32", "float16" or "int8"
+            normalize (bool): L2-normalize embeddings and queries (cosine similarity)
+            block_size (int): rows dequantized at a time while scoring, bounds temporary memory
+        """
+        if dtype not in SUPPORTED_DTYPES:
+            raise ValueError(f"dtype must be one of {SUPPORTED_DTYPES}, got {dtype}")
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if embeddings.ndim != 2 or len(ids) != embeddings.shape[0]:
+            raise ValueError("embeddings must be a 2D matrix with one row per id")
+
+        self.ids = list(ids)
+        self.dtype = dtype
+        self.normalize = normalize
+        self.block_size = block_size
+        self.dim = embeddings.shape[1]
+        if normalize:
+            embeddings = _normalize(embeddings)
+
+        self._scales = None
+        if dtype == "int8":
+            self._vectors, self._scales = quantize_int8(embeddings)
+        else:
+            self._vectors = embeddings.astype(dtype)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def nbytes(self):
+        """Memory held by the stored vectors (and int8 scales)."""
+        return self._vectors.nbytes + (self._scales.nbytes if self._scales is not None else 0)
+
+    def score(self, queries):
+        """Score a batch of queries against every stored embedding.
+
+        Args:
+            queries (np.ndarray): float matrix of shape (num_queries, dim), or a single vector
+
+        Returns:
+            np.ndarray: float32 similarity matrix of shape (num_queries, len(self))
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        if queries.shape[1] != self.dim:
+            raise ValueError(f"queries have dimension {queries.shape[1]}, expected {self.dim}")
+        if self.normalize:
+            queries = _normalize(queries)
+
+        if self.dtype == "float32":
+            return queries @ self._vectors.T
+
+        scores = np.empty((queries.shape[0], len(self)), dtype=np.float32)
+        for start in range(0, len(self), self.block_size):
+            block = self._vectors[start : start + self.block_size].astype(np.float32)
+            block_scores = queries @ block.T
+            if self._scales is not None:
+                block_scores *= self._scales[start : start + self.block_size]
+            scores[:, start : start + self.block_size] = block_scores
+        return scores
+
+    def search(self, queries, k=5):
+        """Return the top ``k`` ids and scores for every query in the batch.
+
+        Args:
+            queries (np.ndarray): float matrix of shape (num_queries, dim), or a single vector
+            k (int): number of results per query
+
+        Returns:
+            tuple: (list of id lists, float32 score matrix of shape (num_queries, k)),
+            both ordered from most to least similar
+        """
+        indices, scores = self.search_indices(queries, k)
+        return [[self.ids[i] for i in row] for row in indices], scores
+
+    def search_indices(self, queries, k=5):
+        """Same as ``search`` but returns row positions instead of ids."""
+        scores = self.score(queries)
+        k = min(k, scores.shape[1])
+        if k == 0:
+            empty = np.empty((scores.shape[0], 0))
+            return empty.astype(np.int64), empty.astype(np.float32)
+        if k < scores.shape[1]:
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.tile(np.arange(scores.shape[1]), (scores.shape[0], 1))
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+
+def benchmark_compression(num_vectors=100_000, dim=1024, num_queries=256, k=10, seed=0):
+    """Measure recall@k and memory of the compressed representations against float32.
+
+    Embeddings are drawn around a set of random cluster centers so that neighbours are
+    meaningful, which is closer to real table/column embeddings than isotropic noise.
+
+    Args:
+        num_vectors (int): number of stored embeddings
+        dim (int): embedding dimension
+        num_queries (int): size of the query batch
+        k (int): number of neighbours compared
+        seed (int): random seed
+
+    Returns:
+        list: one dict per dtype with ``dtype``, ``megabytes``, ``recall_at_k`` and ``search_seconds``
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(num_vectors // 100, 1), dim), dtype=np.float32)
+    assignments = rng.integers(0, centers.shape[0], num_vectors)
+    embeddings = centers[assignments] + 0.5 * rng.standard_normal((num_vectors, dim), dtype=np.float32)
+    queries = embeddings[rng.integers(0, num_vectors, num_queries)]
+    queries = queries + 0.1 * rng.standard_normal(queries.shape, dtype=np.float32)
+    ids = list(range(num_vectors))
+
+    results = []
+    exact = None
+    for dtype in SUPPORTED_DTYPES:
+        store = EmbeddingStore(ids, embeddings, dtype=dtype)
+        start = time.perf_counter()
+        indices, _ = store.search_indices(queries, k)
+        elapsed = time.perf_counter() - start
+        if exact is None:
+            exact = indices
+        hits = sum(len(np.intersect1d(a, b)) for a, b in zip(exact, indices))
+        results.append(
+            {
+                "dtype": dtype,
+                "megabytes": store.nbytes / 1e6,
+                "recall_at_k": hits / (k * num_queries),
+                "search_seconds": elapsed,
+            }
+        )
+    return results
+
+
+def main():
+    for result in benchmark_compression():
+        print(
+            "{dtype:8}  {megabytes:9.1f} MB  recall@k={recall_at_k:.4f}  search={search_seconds:.3f}s".format(**result)
+        )
+
+
+if __name__ == "__main__":
+    main()
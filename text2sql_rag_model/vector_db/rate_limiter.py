@@ -0,0 +1,192 @@
+import fcntl
+import os
+import struct
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+
+# requests per second each API family may send from one node (every thread, process and Spark task on it).
+# Start at or below the workspace quota: a 429 halves the rate, successes climb back up to it.
+API_RATES = {
+    "vector_search_management": 1.0,  # list, get, create and sync of endpoints and indexes
+    "vector_search_query": 20.0,  # similarity_search
+    "serving_query": 20.0,  # predict calls to serving endpoints, e.g. embeddings
+}
+DEFAULT_STATE_DIR = os.path.join(tempfile.gettempdir(), "text2sql_rate_limits")
+
+# tokens, updated_at, rate, blocked_until of a bucket, shared through a small file
+_STATE = struct.Struct("<4d")
+
+
+def is_rate_limited(error):
+    """Whether an API error is a 429 / REQUEST_LIMIT_EXCEEDED."""
+    response = getattr(error, "response", None)
+    if getattr(error, "status_code", None) == 429 or getattr(response, "status_code", None) == 429:
+        return True
+    if getattr(error, "error_code", None) in ("REQUEST_LIMIT_EXCEEDED", "RESOURCE_EXHAUSTED"):
+        return True
+    # the vector search client raises plain exceptions with the status and response body in the message
+    message = str(error)
+    return "REQUEST_LIMIT_EXCEEDED" in message or "status_code 429" in message or "429 Client Error" in message
+
+
+def retry_after_s(error):
+    """Seconds from the Retry-After header of a rate limited response, None if it has none."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """
+    Token bucket shared by every thread and process of the node, stored in a file under state_dir.
+
+    Callers reserve a token and sleep until their turn, so concurrent callers are spaced at the current rate
+    instead of all retrying at once. The rate adapts to the API's answers (additive increase, multiplicative
+    decrease): a 429 multiplies it by decrease_factor and pauses the bucket for the Retry-After, while successes
+    raise it by increase_fraction of the configured rate per second, up to that rate. The rate thus probes just
+    above the real quota now and then instead of hammering it.
+    """
+
+    def __init__(
+        self,
+        family,
+        rate,
+        burst=None,
+        min_rate=None,
+        decrease_factor=0.5,
+        increase_fraction=0.05,
+        state_dir=DEFAULT_STATE_DIR,
+        clock=time.time,
+        sleep=time.sleep,
+    ):
+        """
+        Args:
+            family (str): API family, processes using the same family and state_dir share the bucket
+            rate (float): maximum requests per second
+            burst (float, optional): tokens that can accumulate while idle, defaults to max(rate, 1)
+            min_rate (float, optional): lowest rate after 429s, defaults to rate / 20
+            decrease_factor (float): rate multiplier on a 429
+            increase_fraction (float): fraction of rate added back per second of successful calls
+            state_dir (str): directory of the bucket files, on a disk local to the node
+            clock (callable): wall clock shared by processes
+            sleep (callable): for tests
+        """
+        self.family = family
+        self.max_rate = rate
+        self.burst = burst or max(rate, 1.0)
+        self.min_rate = min_rate or rate / 20
+        self.decrease_factor = decrease_factor
+        self.increase_fraction = increase_fraction
+        self.path = os.path.join(state_dir, family + ".bucket")
+        self.clock = clock
+        self.sleep = sleep
+        self._init_runtime()
+
+    def _init_runtime(self):
+        # flock doesn't exclude threads sharing a file descriptor, they take this lock first
+        self._lock = threading.Lock()
+        self._fd = None
+        self._pid = None
+        self.stats = {"acquired": 0, "waited_s": 0.0, "throttled": 0}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for key in ("_lock", "_fd", "_pid", "stats"):
+            state.pop(key)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_runtime()
+
+    @contextmanager
+    def _bucket(self):
+        """Bucket state refilled up to now, as a mutable [tokens, updated_at, rate, blocked_until] list."""
+        with self._lock:
+            if self._fd is None or self._pid != os.getpid():
+                # a forked process reopens the file, a shared file description wouldn't exclude the parent
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o666)
+                self._pid = os.getpid()
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                now = self.clock()
+                raw = os.pread(self._fd, _STATE.size, 0)
+                tokens, updated_at, rate, blocked_until = (
+                    _STATE.unpack(raw) if len(raw) == _STATE.size else (self.burst, now, self.max_rate, 0.0)
+                )
+                rate = min(max(rate, self.min_rate), self.max_rate)
+                tokens = min(self.burst, tokens + max(now - updated_at, 0.0) * rate)
+                state = [tokens, now, rate, blocked_until]
+                yield state
+                os.pwrite(self._fd, _STATE.pack(*state), 0)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    @property
+    def rate(self):
+        """Current requests per second of the bucket."""
+        with self._bucket() as state:
+            return state[2]
+
+    def acquire(self):
+        """Reserve one request and sleep until it may be sent. Returns the seconds waited."""
+        with self._bucket() as state:
+            tokens, now, rate, blocked_until = state
+            state[0] = tokens - 1
+            wait_s = max(-state[0] / rate, blocked_until - now, 0.0)
+            self.stats["acquired"] += 1
+            self.stats["waited_s"] += wait_s
+        if wait_s > 0:
+            self.sleep(wait_s)
+        return wait_s
+
+    def on_success(self):
+        with self._bucket() as state:
+            # about state[2] successes per second, each adds its share of the per second increase
+            state[2] = min(self.max_rate, state[2] + self.increase_fraction * self.max_rate / state[2])
+
+    def on_throttled(self, retry_after=None):
+        """Slow the bucket down after a 429, pausing it for retry_after seconds (or one request interval)."""
+        with self._bucket() as state:
+            state[2] = max(self.min_rate, state[2] * self.decrease_factor)
+            state[0] = min(state[0], 0.0)
+            pause_s = retry_after if retry_after is not None else 1 / state[2]
+            state[3] = max(state[3], state[1] + pause_s)
+            self.stats["throttled"] += 1
+
+    def call(self, fn, *args, max_retries=8, **kwargs):
+        """
+        fn(*args, **kwargs) within the rate, retried on 429s.
+
+        Raises:
+            the last error if the call is still rate limited after max_retries retries, or any other error
+        """
+        for attempt in range(max_retries + 1):
+            self.acquire()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                if not is_rate_limited(e) or attempt == max_retries:
+                    raise
+                self.on_throttled(retry_after_s(e))
+                continue
+            self.on_success()
+            return result
+
+
+_LIMITERS = {}
+_LIMITERS_LOCK = threading.Lock()
+
+
+def limiter(family, state_dir=DEFAULT_STATE_DIR):
+    """Rate limiter of an API family of `API_RATES`, one instance per process."""
+    with _LIMITERS_LOCK:
+        if (family, state_dir) not in _LIMITERS:
+            _LIMITERS[(family, state_dir)] = RateLimiter(family, API_RATES[family], state_dir=state_dir)
+        return _LIMITERS[(family, state_dir)]
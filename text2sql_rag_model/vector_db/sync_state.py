@@ -0,0 +1,97 @@
+from datetime import datetime, timezone
+
+
+# Delta operations that never change the rows of a table
+NO_DATA_CHANGE_OPERATIONS = {
+    "OPTIMIZE",
+    "VACUUM START",
+    "VACUUM END",
+    "ANALYZE",
+    "SET TBLPROPERTIES",
+    "UNSET TBLPROPERTIES",
+    "ADD CONSTRAINT",
+    "DROP CONSTRAINT",
+    "SET TABLE COMMENT",
+}
+# operationMetrics counting the rows a commit wrote, updated or deleted
+ROW_CHANGE_METRICS = (
+    "numOutputRows",
+    "numTargetRowsInserted",
+    "numTargetRowsUpdated",
+    "numTargetRowsDeleted",
+    "numUpdatedRows",
+    "numDeletedRows",
+)
+
+
+def default_state_table(index_name):
+    """Sync state table in the catalog and schema of the index."""
+    return index_name.rsplit(".", 1)[0] + ".vector_search_sync_state"
+
+
+def changes_data(commit):
+    """
+    Whether a commit of DESCRIBE HISTORY may have changed the rows of the table.
+
+    Maintenance operations and commits whose row metrics are all zero (e.g. a MERGE that matched nothing) don't,
+    commits without row metrics are assumed to.
+    """
+    if commit["operation"] in NO_DATA_CHANGE_OPERATIONS:
+        return False
+    metrics = commit.get("operationMetrics") or {}
+    counts = [int(metrics[name]) for name in ROW_CHANGE_METRICS if name in metrics]
+    return not counts or any(counts)
+
+
+def needs_sync(history, synced_version):
+    """
+    Whether commits after the last synced version changed the source table.
+
+    Args:
+        history (list): commits of DESCRIBE HISTORY as dicts with version, operation and operationMetrics
+        synced_version (int, optional): source table version of the last sync, None if it never synced
+
+    Returns:
+        bool: True if the index should sync, also when history before the changes was vacuumed
+    """
+    if synced_version is None:
+        return True
+    newer = [commit for commit in history if commit["version"] > synced_version]
+    if not newer:
+        return False
+    if min(commit["version"] for commit in history) > synced_version + 1:
+        return True
+    return any(changes_data(commit) for commit in newer)
+
+
+def source_history(spark, source_table_name):
+    """Commits of the source table, newest first."""
+    return [row.asDict() for row in spark.sql(f"DESCRIBE HISTORY {source_table_name}").collect()]
+
+
+def read_synced_version(spark, state_table, index_name):
+    """Source table version the index last synced, or None."""
+    if not spark.catalog.tableExists(state_table):
+        return None
+    rows = spark.sql(f"SELECT synced_version FROM {state_table} WHERE index_name = '{index_name}'").collect()
+    return rows[0]["synced_version"] if rows else None
+
+
+def record_synced_version(spark, state_table, index_name, source_table_name, version):
+    spark.sql(
+        f"""
+        CREATE TABLE IF NOT EXISTS {state_table}
+        (index_name STRING, source_table STRING, synced_version BIGINT, synced_at TIMESTAMP)
+        """
+    )
+    synced_at = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+    spark.sql(
+        f"""
+        MERGE INTO {state_table} AS t
+        USING (SELECT '{index_name}' AS index_name, '{source_table_name}' AS source_table,
+               {int(version)} AS synced_version, TIMESTAMP '{synced_at}' AS synced_at) AS s
+        ON t.index_name = s.index_name
+        WHEN MATCHED THEN UPDATE SET *
+        WHEN NOT MATCHED THEN INSERT *
+        """
+    )
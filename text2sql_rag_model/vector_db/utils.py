@@ -1,28 +1,18 @@
-
 import time
 
+from text2sql_rag_model.vector_db.rate_limiter import limiter
+
+# endpoint and index management calls of every task on the node share one rate limit, and are retried on 429s
+# instead of giving up, see rate_limiter.RateLimiter
+management_api = limiter("vector_search_management")
+
 def endpoint_exists(vsc, vs_endpoint_name):
-  try:
-    return vs_endpoint_name in [e['name'] for e in vsc.list_endpoints().get('endpoints', [])]
-  except Exception as e:
-    #Temp fix for potential REQUEST_LIMIT_EXCEEDED issue
-    if "REQUEST_LIMIT_EXCEEDED" in str(e):
-      print("WARN: couldn't get endpoint status due to REQUEST_LIMIT_EXCEEDED error. The demo will consider it exists")
-      return True
-    else:
-      raise e
+  endpoints = management_api.call(vsc.list_endpoints).get('endpoints', [])
+  return vs_endpoint_name in [e['name'] for e in endpoints]
 
 def wait_for_vs_endpoint_to_be_ready(vsc, vs_endpoint_name):
   for i in range(180):
-    try:
-      endpoint = vsc.get_endpoint(vs_endpoint_name)
-    except Exception as e:
-      #Temp fix for potential REQUEST_LIMIT_EXCEEDED issue
-      if "REQUEST_LIMIT_EXCEEDED" in str(e):
-        print("WARN: couldn't get endpoint status due to REQUEST_LIMIT_EXCEEDED error. Please manually check your endpoint status")
-        return
-      else:
-        raise e
+    endpoint = management_api.call(vsc.get_endpoint, vs_endpoint_name)
     status = endpoint.get("endpoint_status", endpoint.get("status"))["state"].upper()
     if "ONLINE" in status:
       return endpoint
@@ -32,12 +22,12 @@ def wait_for_vs_endpoint_to_be_ready(vsc, vs_endpoint_name):
       time.sleep(10)
     else:
       raise Exception(f'''Error with the endpoint {vs_endpoint_name}. - this shouldn't happen: {endpoint}.\n Please delete it and re-run the previous cell: vsc.delete_endpoint("{vs_endpoint_name}")''')
-  raise Exception(f"Timeout, your endpoint isn't ready yet: {vsc.get_endpoint(vs_endpoint_name)}")
+  raise Exception(f"Timeout, your endpoint isn't ready yet: {management_api.call(vsc.get_endpoint, vs_endpoint_name)}")
 
 
 def index_exists(vsc, endpoint_name, index_full_name):
     try:
-        dict_vsindex = vsc.get_index(endpoint_name, index_full_name).describe()
+        dict_vsindex = management_api.call(lambda: vsc.get_index(endpoint_name, index_full_name).describe())
         return dict_vsindex.get('status').get('ready', False)
     except Exception as e:
         if 'RESOURCE_DOES_NOT_EXIST' not in str(e):
@@ -47,7 +37,7 @@ def index_exists(vsc, endpoint_name, index_full_name):
     
 def wait_for_index_to_be_ready(vsc, vs_endpoint_name, index_name):
   for i in range(180):
-    idx = vsc.get_index(vs_endpoint_name, index_name).describe()
+    idx = management_api.call(lambda: vsc.get_index(vs_endpoint_name, index_name).describe())
     index_status = idx.get('status', idx.get('index_status', {}))
     status = index_status.get('detailed_state', index_status.get('status', 'UNKNOWN')).upper()
     url = index_status.get('index_url', index_status.get('url', 'UNKNOWN'))